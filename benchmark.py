@@ -0,0 +1,457 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+from block import Bloco, VERSAO_ORIGINAL
+from blockchain import RedeBlockchain
+from transaction import Transacao
+from metrics import configurar_logging
+
+# Uma métrica abaixo de (1 - isto) vezes o valor da base conta como regressão
+TOLERANCIA_REGRESSAO = 0.25
+# Instante fixo das transações e blocos sintéticos (os hashes saem iguais em todas as execuções)
+INICIO_SINTETICO = 1_700_000_000.0
+
+CENARIOS_LOCAIS = ["hash", "minerar", "saldo", "validacao", "restaurar"]
+CENARIOS_REDE = ["mensagens", "tps", "sync"]
+CENARIOS_ARRANQUE = ["arranque"]
+# Métricas com estes sufixos são tempos ou memória: aí menor é que é melhor
+SUFIXOS_MENOR_MELHOR = ("_ms", "_mb")
+# Pasta dos módulos do nó (os processos do cenário de arranque correm a partir daqui)
+PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+# Resultados de referência guardados no repositório (gerados com: python benchmark.py --rede --json benchmark_base.json).
+# Os números dependem da máquina: para comparar a sério, grava-se a base na própria máquina antes da mudança
+BASE_REFERENCIA = os.path.join(PASTA_PROJETO, "benchmark_base.json")
+
+
+def gerar_transacoes(quantidade, enderecos=10, semente=None):
+    """ Cria transações sintéticas entre um grupo de 'enderecos' endereços. """
+    aleatorio = random.Random(semente)
+    resultado = []
+    for i in range(quantidade):
+        de = aleatorio.randrange(enderecos)
+        para = (de + 1 + aleatorio.randrange(max(enderecos - 1, 1))) % enderecos
+        resultado.append(Transacao(f"localhost:{5000 + de}", f"localhost:{5000 + para}",
+                                   round(aleatorio.uniform(0.01, 10), 2), INICIO_SINTETICO + i))
+    return resultado
+
+
+def gerar_corrente(blocos, transacoes_por_bloco, enderecos=100, dificuldade=1, versao=VERSAO_ORIGINAL, semente=0):
+    """ Corrente sintética válida (com o génesis): cada bloco paga uma recompensa a um dos endereços
+    e leva 'transacoes_por_bloco' transações entre eles. É sempre a mesma para a mesma semente. """
+    aleatorio = random.Random(semente)
+    corrente = [RedeBlockchain(dificuldade=dificuldade).obter_ultimo_bloco()]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for altura in range(1, blocos + 1):
+            anterior = corrente[-1]
+            recompensa = Transacao("sistema", f"localhost:{5000 + aleatorio.randrange(enderecos)}", 50.0,
+                                   INICIO_SINTETICO + altura)
+            transacoes = gerar_transacoes(transacoes_por_bloco, enderecos, aleatorio.random())
+            bloco = Bloco(altura, anterior.hash, [recompensa] + transacoes,
+                          timestamp=INICIO_SINTETICO + altura, versao=versao)
+            bloco.minerar(dificuldade)
+            corrente.append(bloco)
+    return corrente
+
+
+def _cronometrar(funcao, repeticoes=1):
+    """ Melhor tempo (segundos) de 'repeticoes' execuções, para filtrar o ruído da máquina. """
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+# --- CENÁRIOS LOCAIS ---
+
+def medir_hash_mineracao(qtd_transacoes, tentativas):
+    """ Compara o gerar_hash() completo com o caminho do prefixo pré-serializado. """
+    bloco = Bloco(1, "0" * 64, gerar_transacoes(qtd_transacoes))
+
+    inicio = time.perf_counter()
+    for nonce in range(tentativas):
+        bloco.nonce = nonce
+        bloco.gerar_hash()
+    tempo_completo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    prefixo, sufixo = bloco.partes_para_mineracao()
+    base = hashlib.sha256(prefixo)
+    for nonce in range(tentativas):
+        Bloco.hash_com_nonce(base, nonce, sufixo)
+    tempo_prefixo = time.perf_counter() - inicio
+
+    # Os dois caminhos têm de produzir exatamente o mesmo hash
+    bloco.nonce = tentativas
+    assert Bloco.hash_com_nonce(base, tentativas, sufixo) == bloco.gerar_hash()
+
+    return tempo_completo, tempo_prefixo
+
+
+def cenario_hash(args):
+    resultados = {}
+    for qtd in args.transacoes:
+        completo, prefixo = medir_hash_mineracao(qtd, args.tentativas)
+        resultados[f"gerar_hash_{qtd}tx_por_s"] = args.tentativas / completo
+        resultados[f"prefixo_{qtd}tx_por_s"] = args.tentativas / prefixo
+    return resultados
+
+
+def cenario_minerar(args):
+    """ Bloco.minerar() numa só thread: tentativas de nonce por segundo até encontrar o alvo. """
+    blocos = [Bloco(1, "0" * 64, gerar_transacoes(args.transacoes_por_bloco, args.enderecos, i),
+                    timestamp=INICIO_SINTETICO + i) for i in range(args.blocos_minerados)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for bloco in blocos:
+            bloco.minerar(args.dificuldade)
+        duracao = time.perf_counter() - inicio
+    tentativas = sum(bloco.nonce + 1 for bloco in blocos)
+    return {"tentativas_por_s": tentativas / duracao, "blocos_por_s": len(blocos) / duracao}
+
+
+def _corrente_carregada(corrente):
+    """ RedeBlockchain com a corrente sintética já aplicada (saldos incluídos). """
+    blockchain = RedeBlockchain(dificuldade=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert blockchain.adotar_ramo(1, corrente[1:])
+    return blockchain
+
+
+def cenario_saldo(args, corrente):
+    blockchain = _corrente_carregada(corrente)
+    enderecos = [f"localhost:{5000 + i}" for i in range(args.enderecos)]
+    consultas = 100_000
+    tempo_indice = _cronometrar(lambda: [blockchain.consultar_saldo(enderecos[i % len(enderecos)])
+                                         for i in range(consultas)], args.repeticoes)
+    recontagens = min(len(enderecos), 20)
+    tempo_completo = _cronometrar(lambda: [blockchain.calcular_saldo_completo(e) for e in enderecos[:recontagens]])
+    blockchain.fechar()
+    return {"consultar_saldo_por_s": consultas / tempo_indice,
+            "recontagem_completa_por_s": recontagens / tempo_completo}
+
+
+def cenario_validacao(args, corrente):
+    """ validar_outra_corrente() de uma corrente inteira recebida por um nó que só tem o génesis. """
+    blockchain = RedeBlockchain(dificuldade=1)
+    try:
+        blockchain.validar_outra_corrente(corrente[:2])  # Arranca o pool de processos fora da medição
+        tempo = _cronometrar(lambda: blockchain.validar_outra_corrente(corrente), args.repeticoes)
+    finally:
+        blockchain.fechar()
+    return {"blocos_por_s": (len(corrente) - 1) / tempo}
+
+
+def cenario_restaurar(args, corrente):
+    dados = json.loads(json.dumps([bloco.formatar_para_dict() for bloco in corrente]))
+    tempo = _cronometrar(lambda: [Bloco.restaurar_de_dict(d) for d in dados], args.repeticoes)
+    transacoes = sum(len(d["transactions"]) for d in dados)
+    return {"blocos_por_s": len(dados) / tempo, "transacoes_por_s": transacoes / tempo}
+
+
+# --- CENÁRIOS DE REDE (localhost) ---
+
+def _criar_nos(portas, vizinhos_de, **opcoes):
+    from node import NoDaRede  # Só aqui: os cenários locais não precisam da rede
+    return [NoDaRede("127.0.0.1", p, nos_iniciais=[("127.0.0.1", q) for q in vizinhos_de(p)],
+                     processos_mineracao=1, minerar_vazios=False, **opcoes) for p in portas]
+
+
+def cenario_mensagens(args):
+    """ Ida e volta de pedidos GET_HEADERS entre dois nós (transporte, despacho e resposta). """
+    pedidos = 2000
+    with contextlib.redirect_stdout(io.StringIO()):
+        a, b = _criar_nos([args.porta_inicial, args.porta_inicial + 1], lambda p: [])
+        try:
+            for no in (a, b):
+                no.iniciar()
+            localizador = a.blockchain.localizador()
+            inicio = time.perf_counter()
+            futuros = [a.enviar_direto(b.host, b.porta, 'GET_HEADERS', {"locator": localizador, "limit": 1},
+                                       esperar_resposta=True) for _ in range(pedidos)]
+            for futuro in futuros:
+                futuro.result(timeout=30)
+            duracao = time.perf_counter() - inicio
+        finally:
+            for no in (a, b):
+                no.parar()
+    return {"pedidos_por_s": pedidos / duracao}
+
+
+def medir_tps_rede(qtd_nos, qtd_transacoes, porta_inicial=7100, limite_segundos=60):
+    """ Monta uma pequena rede local, cria transações em todos os nós e mede quantas por segundo
+    chegam ao mempool de todos eles. Devolve (transações por segundo, segundos, entregues). """
+    portas = [porta_inicial + i for i in range(qtd_nos)]
+    saida = io.StringIO()
+    with contextlib.redirect_stdout(saida):
+        nos = _criar_nos(portas, lambda p: [q for q in portas if q != p])
+        # Cada nó começa com uma recompensa, para ter saldo para as suas transações
+        anterior = nos[0].blockchain.obter_ultimo_bloco()
+        for no in nos:
+            bloco = Bloco(anterior.indice + 1, anterior.hash, [Transacao("sistema", f"{no.host}:{no.porta}", 50.0)])
+            bloco.minerar(nos[0].blockchain.dificuldade)
+            for destino in nos:
+                destino.blockchain.adicionar_bloco(bloco)
+            anterior = bloco
+        for no in nos:
+            no.iniciar()
+        time.sleep(0.5)  # Deixa a sincronização inicial descobrir os vizinhos
+
+        inicio = time.perf_counter()
+        for i in range(qtd_transacoes):
+            no = nos[i % qtd_nos]
+            no.nova_transacao(f"{no.host}:{no.porta}", "127.0.0.1:1", 0.001)
+        while time.perf_counter() - inicio < limite_segundos:
+            if all(len(no.blockchain.mempool) >= qtd_transacoes for no in nos):
+                break
+            time.sleep(0.01)
+        duracao = time.perf_counter() - inicio
+        entregues = min(len(no.blockchain.mempool) for no in nos)
+
+        for no in nos:
+            no.parar()
+    return entregues / duracao, duracao, entregues
+
+
+def cenario_tps(args):
+    tps, _, entregues = medir_tps_rede(args.nos, args.transacoes_rede, args.porta_inicial + 10)
+    if entregues < args.transacoes_rede:
+        print(f"⚠️ Só {entregues}/{args.transacoes_rede} transações chegaram a todos os nós.")
+    return {"transacoes_por_s": tps}
+
+
+def cenario_sync(args, corrente, limite_segundos=120):
+    """ Dois nós com a corrente sintética e um nó vazio que a descarrega deles (cabeçalhos primeiro). """
+    portas = [args.porta_inicial + 20 + i for i in range(3)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        fonte_a, fonte_b, novo = _criar_nos(portas, lambda p: portas[:2] if p == portas[2] else [])
+        try:
+            for no in (fonte_a, fonte_b, novo):
+                no.blockchain.dificuldade = 1
+            for no in (fonte_a, fonte_b):
+                assert no.blockchain.adotar_ramo(1, corrente[1:])
+                no.iniciar()
+            alvo = corrente[-1].hash
+            inicio = time.perf_counter()
+            novo.iniciar()
+            while novo.blockchain.obter_ultimo_bloco().hash != alvo:
+                if time.perf_counter() - inicio > limite_segundos:
+                    raise TimeoutError(f"Sincronização incompleta: {len(novo.blockchain.corrente)}/{len(corrente)}")
+                time.sleep(0.005)
+            duracao = time.perf_counter() - inicio
+        finally:
+            for no in (fonte_a, fonte_b, novo):
+                no.parar()
+    return {"blocos_por_s": (len(corrente) - 1) / duracao}
+
+
+# --- ARRANQUE ---
+
+def _memoria_mb(pid="self"):
+    """ Memória residente (VmRSS) de um processo em MB; None fora do Linux. """
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as ficheiro:
+            for linha in ficheiro:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _importar_em_processo_novo(modulo):
+    """ (milissegundos, MB residentes) de importar o módulo num interpretador acabado de abrir. """
+    codigo = (f"import time; t = time.perf_counter(); import {modulo}; d = time.perf_counter() - t\n"
+              f"from benchmark import _memoria_mb; print(d * 1000, _memoria_mb())")
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=PASTA_PROJETO, capture_output=True, text=True)
+    if saida.returncode != 0:
+        raise RuntimeError(saida.stderr.strip().splitlines()[-1])
+    tempo, memoria = saida.stdout.split()
+    return float(tempo), None if memoria == "None" else float(memoria)
+
+
+def medir_arranque_daemon(porta, limite_segundos=30):
+    """ Lança o daemon.py num processo novo e mede até o socket de controlo responder, a memória
+    nesse momento e o tempo até sair depois de um SIGTERM. Devolve (ms arranque, MB, ms paragem). """
+    from daemon import pedir, endereco_controlo_padrao  # Só aqui: os outros cenários não precisam dele
+    controlo = endereco_controlo_padrao(porta)
+    inicio = time.perf_counter()
+    processo = subprocess.Popen([sys.executable, "daemon.py", "correr", "--porta", str(porta), "--ip", "127.0.0.1",
+                                 "--controlo", controlo, "--log", "ERROR"], cwd=PASTA_PROJETO)
+    try:
+        while True:
+            if processo.poll() is not None:
+                raise RuntimeError(f"O daemon terminou no arranque (código {processo.returncode})")
+            if time.perf_counter() - inicio > limite_segundos:
+                raise TimeoutError("O daemon não respondeu no controlo")
+            try:
+                pedir(controlo, "estado", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.005)
+        arranque = time.perf_counter() - inicio
+        memoria = _memoria_mb(processo.pid)
+
+        inicio = time.perf_counter()
+        processo.send_signal(signal.SIGTERM)
+        processo.wait(limite_segundos)
+        paragem = time.perf_counter() - inicio
+    finally:
+        if processo.poll() is None:
+            processo.kill()
+    return arranque * 1000, memoria, paragem * 1000
+
+
+def cenario_arranque(args):
+    """ Custo de arrancar sem e com interface. O nó sem interface é o daemon inteiro (até responder
+    no controlo); da interface só se mede a importação (customtkinter/Tk), porque abrir a janela
+    precisa de um ecrã. O "nucleo" é a importação do node.py, comum aos dois modos. """
+    resultados = {}
+    resultados["nucleo_importacao_ms"], resultados["nucleo_memoria_mb"] = _importar_em_processo_novo("node")
+    arranque, memoria, paragem = medir_arranque_daemon(args.porta_inicial + 30)
+    resultados["daemon_arranque_ms"] = arranque
+    resultados["daemon_memoria_mb"] = memoria
+    resultados["daemon_paragem_ms"] = paragem
+    try:
+        resultados["interface_importacao_ms"], resultados["interface_memoria_mb"] = \
+            _importar_em_processo_novo("interface")
+    except RuntimeError as e:
+        print(f"⚠️ Interface não medida ({e}).", file=sys.stderr)
+    return {metrica: valor for metrica, valor in resultados.items() if valor is not None}
+
+
+# --- RESULTADOS ---
+
+def executar(args):
+    """ Corre os cenários pedidos e devolve {cenario: {metrica: valor}}. As métricas são "por segundo"
+    (maior é melhor), exceto os tempos e memórias do arranque (_ms, _mb), em que menor é melhor. """
+    corrente = None
+    if set(args.cenarios) & {"saldo", "validacao", "restaurar", "sync"}:
+        corrente = gerar_corrente(args.blocos, args.transacoes_por_bloco, args.enderecos, semente=args.semente)
+
+    funcoes = {
+        "hash": lambda: cenario_hash(args),
+        "minerar": lambda: cenario_minerar(args),
+        "saldo": lambda: cenario_saldo(args, corrente),
+        "validacao": lambda: cenario_validacao(args, corrente),
+        "restaurar": lambda: cenario_restaurar(args, corrente),
+        "mensagens": lambda: cenario_mensagens(args),
+        "tps": lambda: cenario_tps(args),
+        "sync": lambda: cenario_sync(args, corrente),
+        "arranque": lambda: cenario_arranque(args),
+    }
+    resultados = {}
+    for cenario in args.cenarios:
+        print(f"⏱️  {cenario}...", file=sys.stderr)
+        resultados[cenario] = funcoes[cenario]()
+    return resultados
+
+
+def comparar(resultados, base, tolerancia=TOLERANCIA_REGRESSAO):
+    """ Métricas que ficaram piores do que a base por mais do que a tolerância (abaixo dela ou,
+    nas de SUFIXOS_MENOR_MELHOR, acima): [(cenario, metrica, valor_base, valor_atual)].
+    Métricas que não existem nos dois lados são ignoradas. """
+    regressoes = []
+    for cenario, metricas in resultados.items():
+        for metrica, valor in metricas.items():
+            anterior = base.get(cenario, {}).get(metrica)
+            if not anterior:
+                continue
+            if metrica.endswith(SUFIXOS_MENOR_MELHOR):
+                piorou = valor > anterior * (1 + tolerancia)
+            else:
+                piorou = valor < anterior * (1 - tolerancia)
+            if piorou:
+                regressoes.append((cenario, metrica, anterior, valor))
+    return regressoes
+
+
+def _parametros(args):
+    return {chave: getattr(args, chave) for chave in
+            ("blocos", "transacoes_por_bloco", "enderecos", "semente", "dificuldade", "blocos_minerados",
+             "transacoes", "tentativas", "nos", "transacoes_rede")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir o desempenho do nó (mineração, validação, saldos, rede)")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS_LOCAIS + CENARIOS_REDE + CENARIOS_ARRANQUE,
+                        default=None, help="Por omissão só os locais; --rede junta os de rede")
+    parser.add_argument("--rede", action="store_true", help="Correr também os cenários de rede (localhost)")
+    parser.add_argument("--arranque", action="store_true",
+                        help="Medir também o arranque e a memória do daemon e da interface")
+    # Corrente sintética
+    parser.add_argument("--blocos", type=int, default=500)
+    parser.add_argument("--transacoes-por-bloco", type=int, default=20)
+    parser.add_argument("--enderecos", type=int, default=100)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--repeticoes", type=int, default=3, help="Fica o melhor tempo de N execuções")
+    # Hash e mineração
+    parser.add_argument("--transacoes", type=int, nargs="+", default=[0, 10, 100, 500])
+    parser.add_argument("--tentativas", type=int, default=2000)
+    parser.add_argument("--dificuldade", type=int, default=3)
+    parser.add_argument("--blocos-minerados", type=int, default=20)
+    # Rede
+    parser.add_argument("--tps", action="store_true", help="Medir também as transações por segundo numa rede local")
+    parser.add_argument("--nos", type=int, default=3)
+    parser.add_argument("--transacoes-rede", type=int, default=5000)
+    parser.add_argument("--porta-inicial", type=int, default=7100)
+    # Resultados
+    parser.add_argument("--json", help="Gravar os resultados neste ficheiro JSON")
+    parser.add_argument("--base", nargs="?", const=BASE_REFERENCIA,
+                        help="Comparar com os resultados guardados neste ficheiro JSON "
+                             "(sem ficheiro: a referência do repositório, benchmark_base.json; "
+                             "para gerar uma base própria: --json base.json antes da mudança)")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO)
+    args = parser.parse_args()
+    configurar_logging("ERROR")  # Os avisos dos nós durante as medições não interessam
+
+    if args.cenarios is None:
+        args.cenarios = CENARIOS_LOCAIS + (CENARIOS_REDE if args.rede else [])
+        if args.arranque:
+            args.cenarios += CENARIOS_ARRANQUE
+        if args.tps and "tps" not in args.cenarios:
+            args.cenarios.append("tps")
+
+    resultados = executar(args)
+    print(f"{'cenário':<12} | {'métrica':<28} | {'valor':>14}")
+    for cenario, metricas in resultados.items():
+        for metrica, valor in metricas.items():
+            print(f"{cenario:<12} | {metrica:<28} | {valor:>14,.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as ficheiro:
+            json.dump({
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "parametros": _parametros(args),
+                "resultados": resultados,
+            }, ficheiro, indent=2)
+        print(f"\n💾 Resultados gravados em {args.json}")
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as ficheiro:
+            base = json.load(ficheiro)
+        if base.get("parametros") != _parametros(args):
+            print("⚠️ A base foi medida com outros parâmetros; a comparação pode não ser justa.")
+        regressoes = comparar(resultados, base.get("resultados", {}), args.tolerancia)
+        if regressoes:
+            print(f"\n❌ {len(regressoes)} regressão(ões) em relação a {args.base}:")
+            for cenario, metrica, anterior, atual in regressoes:
+                print(f"   {cenario}.{metrica}: {anterior:,.1f} -> {atual:,.1f} ({atual / anterior - 1:+.0%})")
+            sys.exit(1)
+        print(f"\n✅ Sem regressões em relação a {args.base} (tolerância {args.tolerancia:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
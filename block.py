@@ -1,87 +1,177 @@
 import hashlib
 import json
+import logging
 import time
 from transaction import Transacao
+from merkle import calcular_raiz_merkle, gerar_prova_merkle
+
+log = logging.getLogger(__name__)
+
+# Valor provisório usado para descobrir onde o nonce fica no texto serializado
+MARCADOR_NONCE = "__nonce__"
+
+# Formatos de bloco: o original põe as transações inteiras no hash;
+# o "merkle" só põe a raiz de Merkle dos ids, e o cabeçalho fica com tamanho fixo
+VERSAO_ORIGINAL = 1
+VERSAO_MERKLE = 2
+
+# Campos de um bloco que vão no cabeçalho (tudo menos as transações), usado na sincronização
+CHAVES_CABECALHO = ("index", "previous_hash", "hash", "nonce", "timestamp", "version", "merkle_root")
 
 class Bloco:
-    def __init__(self, indice, hash_anterior, transacoes, nonce=0, timestamp=None):
+    # As transações são sempre objetos Transacao (o restaurar_de_dict converte o que vem da rede ou do disco)
+    __slots__ = ('indice', 'hash_anterior', 'transacoes', 'nonce', 'timestamp', 'versao', '_raiz_merkle', 'hash')
+
+    def __init__(self, indice, hash_anterior, transacoes, nonce=0, timestamp=None, versao=VERSAO_ORIGINAL):
         self.indice = indice
         self.hash_anterior = hash_anterior
         self.transacoes = transacoes
         self.nonce = nonce
         self.timestamp = timestamp if timestamp is not None else time.time()
+        self.versao = versao
+        self._raiz_merkle = None  # Calculada uma vez, quando for precisa
         
         # Primeiro calculamos o hash, depois atribuímos ao self.hash
         # Isso evita que o formatar_para_dict tente ler algo que não existe
         self.hash = self.gerar_hash()
 
-    def gerar_hash(self):
-        """ Cria a 'impressão digital' única deste bloco. """
-        # Criamos um dicionário local APENAS com o que compõe o conteúdo
-        # IMPORTANTE: Não incluímos o próprio 'hash' aqui!
+    @property
+    def raiz_merkle(self):
+        """ Raiz de Merkle dos ids das transações (guardada depois do primeiro cálculo). """
+        if self._raiz_merkle is None:
+            self._raiz_merkle = calcular_raiz_merkle([tx.id for tx in self.transacoes])
+        return self._raiz_merkle
 
-        lista_txs_preparada = []
+    def prova_merkle(self, tx_id):
+        """ Prova de que a transação faz parte deste bloco (ver merkle.verificar_prova_merkle). """
+        ids = [tx.id for tx in self.transacoes]
+        return gerar_prova_merkle(ids, ids.index(tx_id))
+
+    def validar_transacoes(self):
+        """ Confere que cada id corresponde ao conteúdo da sua transação (é pelo id que se tiram
+        as confirmadas do mempool e se recusam repetições) e, no formato merkle, em que o hash
+        só cobre a raiz, que a raiz declarada é a destas transações. """
         for tx in self.transacoes:
-            # Se for objeto Transacao, chama o método de formatar
-            if hasattr(tx, 'formatar_para_dict'):
-                lista_txs_preparada.append(tx.formatar_para_dict())
-            elif hasattr(tx, 'to_dict'):
-                lista_txs_preparada.append(tx.to_dict())
-            else:
-                # Se já for dict ou string, usa como está
-                lista_txs_preparada.append(tx)
-
-        conteudo_para_hash = {
+            if tx.id != tx.gerar_identificador():
+                return False
+        if self.versao != VERSAO_MERKLE:
+            return True
+        declarada = self.raiz_merkle
+        self._raiz_merkle = None
+        return declarada == self.raiz_merkle
+
+    def conteudo_para_hash(self):
+        """ Devolve o dicionário que compõe o conteúdo do bloco (sem o próprio hash). """
+        # IMPORTANTE: Não incluímos o próprio 'hash' aqui!
+
+        if self.versao == VERSAO_MERKLE:
+            return {
+                "version": self.versao,
+                "index": self.indice,
+                "previous_hash": self.hash_anterior,
+                "merkle_root": self.raiz_merkle,
+                "nonce": self.nonce,
+                "timestamp": self.timestamp
+            }
+
+        return {
             "index": self.indice,
             "previous_hash": self.hash_anterior,
-            "transactions": lista_txs_preparada,
+            "transactions": [tx.formatar_para_dict() for tx in self.transacoes],
             "nonce": self.nonce,
             "timestamp": self.timestamp
         }
-        
+
+    def gerar_hash(self):
+        """ Cria a 'impressão digital' única deste bloco. """
+        conteudo_para_hash = self.conteudo_para_hash()
         bloco_serializado = json.dumps(conteudo_para_hash, sort_keys=True).encode()
         return hashlib.sha256(bloco_serializado).hexdigest()
 
+    def partes_para_mineracao(self):
+        """ Serializa uma única vez tudo o que não muda durante a mineração.
+        Devolve (prefixo, sufixo): o conteúdo serializado é prefixo + str(nonce) + sufixo. """
+        conteudo = self.conteudo_para_hash()
+        conteudo["nonce"] = MARCADOR_NONCE
+        serializado = json.dumps(conteudo, sort_keys=True)
+        # Com sort_keys só o "index" (um inteiro) e a "merkle_root" (hex) vêm antes do "nonce",
+        # por isso a primeira ocorrência do marcador é sempre a do nonce
+        prefixo, _, sufixo = serializado.partition(json.dumps(MARCADOR_NONCE))
+        return prefixo.encode(), sufixo.encode()
+
+    @staticmethod
+    def hash_com_nonce(base, nonce, sufixo):
+        """ Termina o hash a partir do estado SHA-256 do prefixo (base), sem re-serializar o bloco. """
+        h = base.copy()
+        h.update(str(nonce).encode())
+        h.update(sufixo)
+        return h.hexdigest()
+
     def minerar(self, dificuldade):
         """ Tenta encontrar um hash que comece com o número de zeros definido. """
         alvo = "0" * dificuldade
+        prefixo, sufixo = self.partes_para_mineracao()
+        base = hashlib.sha256(prefixo)
         
         while not self.hash.startswith(alvo):
             self.nonce += 1
-            self.hash = self.gerar_hash()
+            self.hash = Bloco.hash_com_nonce(base, self.nonce, sufixo)
             
-        print(f"✅ Bloco {self.indice} minerado! Hash: {self.hash}")
+        log.debug("✅ Bloco %s minerado! Hash: %s", self.indice, self.hash)
 
     def formatar_para_dict(self):
         """ Converte o objeto completo para dicionário usando o padrão da rede (Inglês). """
-        return {
+        dados = {
             "index": self.indice,
             "previous_hash": self.hash_anterior,
-            "transactions": [tx.formatar_para_dict() if hasattr(tx, 'formatar_para_dict') else tx for tx in self.transacoes],
+            "transactions": [tx.formatar_para_dict() for tx in self.transacoes],
             "nonce": self.nonce,
             "timestamp": self.timestamp,
             "hash": self.hash
         }
+        # O formato original não leva estas chaves, para continuar igual ao que já circula na rede
+        if self.versao != VERSAO_ORIGINAL:
+            dados["version"] = self.versao
+            dados["merkle_root"] = self.raiz_merkle
+        return dados
+
+    def formatar_cabecalho(self):
+        """ Só o cabeçalho do bloco (sem transações), no mesmo padrão do formatar_para_dict. """
+        cabecalho = {
+            "index": self.indice,
+            "previous_hash": self.hash_anterior,
+            "hash": self.hash,
+            "nonce": self.nonce,
+            "timestamp": self.timestamp
+        }
+        if self.versao != VERSAO_ORIGINAL:
+            cabecalho["version"] = self.versao
+            cabecalho["merkle_root"] = self.raiz_merkle
+        return cabecalho
+
+    @staticmethod
+    def cabecalho_de_dict(dados):
+        """ Extrai o cabeçalho de um bloco já em dicionário (ex: lido do armazém). """
+        return {chave: dados[chave] for chave in CHAVES_CABECALHO if chave in dados}
 
     @staticmethod
     def restaurar_de_dict(dados):
-        """ Recria um objeto Bloco a partir de um dicionário de dados. """
-        lista_txs = []
+        """ Recria um objeto Bloco a partir de um dicionário de dados.
+        Levanta ValueError se alguma das transações não for uma transação. """
         # Ajustado para usar as chaves em português que definimos no dicionário
         transacoes_fonte = dados.get("transacoes") or dados.get("transactions") or []
-        
-        for tx in transacoes_fonte:
-            if isinstance(tx, dict):
-                lista_txs.append(Transacao.restaurar_de_dict(tx))
-            else:
-                lista_txs.append(tx)
+        lista_txs = [Transacao.restaurar_de_dict(tx) for tx in transacoes_fonte]
 
         bloco = Bloco(
             indice=dados.get("indice") or dados.get("index"),
             hash_anterior=dados.get("hash_anterior") or dados.get("previous_hash"),
             transacoes=lista_txs,
             nonce=dados["nonce"],
-            timestamp=dados["timestamp"]
+            timestamp=dados["timestamp"],
+            versao=dados.get("version", VERSAO_ORIGINAL)
         )
+        if "merkle_root" in dados:
+            # A raiz declarada é a que entra no hash; validar_transacoes() confere-a com as transações
+            bloco._raiz_merkle = dados["merkle_root"]
         bloco.hash = dados["hash"]
         return bloco
\ No newline at end of file
@@ -0,0 +1,312 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from block import Bloco
+
+log = logging.getLogger(__name__)
+
+# Cada registo: tamanho (4 bytes) + CRC32 (4 bytes) + bloco em JSON
+CABECALHO_REGISTO = struct.Struct(">II")
+# O índice guarda, por altura, a posição (8 bytes, little-endian) do registo no ficheiro de dados
+ENTRADA_INDICE = struct.Struct("<Q")
+TAMANHO_ENTRADA_INDICE = ENTRADA_INDICE.size
+# O índice das transações tem, por transação confirmada, a altura do bloco (4 bytes) e o id (32 bytes)
+ENTRADA_TRANSACAO = struct.Struct("<I32s")
+
+
+class ArmazemBlocos:
+    """ Registo em disco, só de acrescentar, dos blocos da corrente.
+    'blocos.dat' tem os registos; 'blocos.idx' tem a posição de cada um, para abrir sem ler tudo;
+    'transacoes.idx' tem os ids das transações de cada bloco, pela ordem da corrente. """
+
+    def __init__(self, pasta, sincronizar_cada=16):
+        os.makedirs(pasta, exist_ok=True)
+        self.pasta = pasta
+        self.caminho_dados = os.path.join(pasta, "blocos.dat")
+        self.caminho_indice = os.path.join(pasta, "blocos.idx")
+        self.caminho_transacoes = os.path.join(pasta, "transacoes.idx")
+        self.caminho_estado = os.path.join(pasta, "estado.json")
+        self.sincronizar_cada = sincronizar_cada
+
+        self._dados = open(self.caminho_dados, "a+b", buffering=0)
+        self._indice = open(self.caminho_indice, "a+b", buffering=0)
+        self._transacoes = open(self.caminho_transacoes, "a+b", buffering=0)
+        self._mapa = None
+        self._por_sincronizar = 0
+
+        self.posicoes = array("Q")
+        self._recuperar()
+        self._recuperar_transacoes()
+
+    # --- ARRANQUE ---
+
+    def _recuperar(self):
+        """ Lê o índice e repara o fim dos ficheiros se a última escrita ficou a meio (ex: falha de energia). """
+        tamanho_indice = os.fstat(self._indice.fileno()).st_size
+        entradas = tamanho_indice // TAMANHO_ENTRADA_INDICE
+        self._indice.seek(0)
+        self.posicoes.frombytes(self._indice.read(entradas * TAMANHO_ENTRADA_INDICE))
+        if sys.byteorder == "big":
+            self.posicoes.byteswap()
+
+        lidas = len(self.posicoes)
+        tamanho_dados = os.fstat(self._dados.fileno()).st_size
+        # Só o último registo indexado precisa de ser conferido; os anteriores já foram sincronizados
+        while self.posicoes and self._ler_registo(self.posicoes[-1], tamanho_dados) is None:
+            self.posicoes.pop()
+
+        # Registos completos escritos depois da última entrada do índice voltam a ser indexados
+        fim = self._fim_do_ultimo_registo()
+        while True:
+            registo = self._ler_registo(fim, tamanho_dados)
+            if registo is None:
+                break
+            self.posicoes.append(fim)
+            fim += CABECALHO_REGISTO.size + len(registo)
+            lidas = -1
+
+        # O que sobrar (um registo cortado a meio) é descartado
+        if fim != tamanho_dados:
+            log.warning("🩹 Armazém: descartados %d bytes de um registo incompleto.", tamanho_dados - fim)
+            self._dados.truncate(fim)
+        if lidas != len(self.posicoes) or tamanho_indice % TAMANHO_ENTRADA_INDICE:
+            self._reescrever_indice()
+
+    def _recuperar_transacoes(self):
+        """ Acerta o índice das transações com os blocos: tira o que passa da corrente e volta a
+        indexar, a partir dos registos, o último bloco indexado (pode ter ficado a meio) e os seguintes.
+        Um armazém sem este índice (de uma versão anterior) é indexado todo de uma vez. """
+        entradas = os.fstat(self._transacoes.fileno()).st_size // ENTRADA_TRANSACAO.size
+        desde = 0
+        if entradas:
+            ultima_altura = self._altura_transacao(entradas - 1)
+            desde = min(ultima_altura, len(self.posicoes))
+        self._truncar_transacoes(desde)
+        if desde == len(self.posicoes):
+            return
+
+        log.info("🗂️ Armazém: a indexar as transações de %d bloco(s)...", len(self.posicoes) - desde)
+        tamanho_dados = os.fstat(self._dados.fileno()).st_size
+        for altura in range(desde, len(self.posicoes)):
+            dados = json.loads(self._ler_registo(self.posicoes[altura], tamanho_dados))
+            self._indexar_transacoes(altura, dados)
+        os.fsync(self._transacoes.fileno())
+
+    def _altura_transacao(self, entrada):
+        return ENTRADA_TRANSACAO.unpack(os.pread(self._transacoes.fileno(), ENTRADA_TRANSACAO.size,
+                                                 entrada * ENTRADA_TRANSACAO.size))[0]
+
+    def _truncar_transacoes(self, altura):
+        """ Apaga as entradas do índice das transações dos blocos a partir desta altura. """
+        tamanho = os.fstat(self._transacoes.fileno()).st_size
+        # As entradas estão por altura: procura binária pela primeira que fica de fora
+        inicio, fim = 0, tamanho // ENTRADA_TRANSACAO.size
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            if self._altura_transacao(meio) < altura:
+                inicio = meio + 1
+            else:
+                fim = meio
+        if inicio * ENTRADA_TRANSACAO.size != tamanho:
+            self._transacoes.truncate(inicio * ENTRADA_TRANSACAO.size)
+
+    def _indexar_transacoes(self, altura, dados_bloco):
+        entradas = [ENTRADA_TRANSACAO.pack(altura, binario) for binario in
+                    (_id_binario(tx.get("id")) for tx in dados_bloco.get("transactions", [])) if binario]
+        if entradas:
+            self._transacoes.write(b"".join(entradas))
+
+    def _ler_registo(self, posicao, tamanho_dados):
+        """ Devolve o conteúdo do registo na posição, ou None se estiver incompleto/corrompido. """
+        if posicao + CABECALHO_REGISTO.size > tamanho_dados:
+            return None
+        self._dados.seek(posicao)
+        tamanho, crc = CABECALHO_REGISTO.unpack(self._dados.read(CABECALHO_REGISTO.size))
+        if posicao + CABECALHO_REGISTO.size + tamanho > tamanho_dados:
+            return None
+        conteudo = self._dados.read(tamanho)
+        if zlib.crc32(conteudo) != crc:
+            return None
+        return conteudo
+
+    def _fim_do_ultimo_registo(self):
+        if not self.posicoes:
+            return 0
+        self._dados.seek(self.posicoes[-1])
+        tamanho, _ = CABECALHO_REGISTO.unpack(self._dados.read(CABECALHO_REGISTO.size))
+        return self.posicoes[-1] + CABECALHO_REGISTO.size + tamanho
+
+    def _reescrever_indice(self):
+        self._indice.truncate(0)
+        self._indice.write(struct.pack(f"<{len(self.posicoes)}Q", *self.posicoes))
+        os.fsync(self._indice.fileno())
+
+    # --- LEITURA ---
+
+    def __len__(self):
+        return len(self.posicoes)
+
+    def _obter_mapa(self, ate):
+        """ Mapeia o ficheiro de dados em memória (e volta a mapear se entretanto cresceu). """
+        if self._mapa is None or len(self._mapa) < ate:
+            if self._mapa is not None:
+                self._mapa.close()
+            self._mapa = mmap.mmap(self._dados.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mapa
+
+    def ler(self, altura):
+        """ Devolve o dicionário do bloco guardado nessa altura. """
+        posicao = self.posicoes[altura]
+        mapa = self._obter_mapa(posicao + CABECALHO_REGISTO.size)
+        tamanho, _ = CABECALHO_REGISTO.unpack_from(mapa, posicao)
+        inicio = posicao + CABECALHO_REGISTO.size
+        mapa = self._obter_mapa(inicio + tamanho)
+        return json.loads(mapa[inicio:inicio + tamanho])
+
+    def tamanho(self, altura):
+        """ Bytes (em JSON) do bloco guardado nessa altura, sem o ler. """
+        posicao = self.posicoes[altura]
+        return CABECALHO_REGISTO.unpack_from(self._obter_mapa(posicao + CABECALHO_REGISTO.size), posicao)[0]
+
+    def ids_confirmados(self):
+        """ Pares (id, altura) de todas as transações guardadas, lidos do índice sem abrir os blocos. """
+        self._transacoes.seek(0)
+        conteudo = self._transacoes.read()
+        fim = len(conteudo) - len(conteudo) % ENTRADA_TRANSACAO.size
+        return ((tx_id.hex(), altura) for altura, tx_id in ENTRADA_TRANSACAO.iter_unpack(conteudo[:fim]))
+
+    # --- ESCRITA ---
+
+    def acrescentar(self, dados_bloco):
+        """ Acrescenta um bloco (em dicionário) ao fim do registo. """
+        conteudo = json.dumps(dados_bloco).encode("utf-8")
+        posicao = self._dados.seek(0, os.SEEK_END)
+        self._dados.write(CABECALHO_REGISTO.pack(len(conteudo), zlib.crc32(conteudo)) + conteudo)
+        self._indice.write(ENTRADA_INDICE.pack(posicao))
+        self._indexar_transacoes(len(self.posicoes), dados_bloco)
+        self.posicoes.append(posicao)
+
+        # O fsync é feito por lotes: numa falha perdem-se no máximo os últimos blocos, nunca a coerência
+        self._por_sincronizar += 1
+        if self._por_sincronizar >= self.sincronizar_cada:
+            self.sincronizar()
+
+    def truncar(self, altura):
+        """ Apaga os blocos a partir desta altura (usado quando a corrente é reorganizada). """
+        if altura >= len(self.posicoes):
+            return
+        fim = self.posicoes[altura]
+        del self.posicoes[altura:]
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+        self._indice.truncate(altura * TAMANHO_ENTRADA_INDICE)
+        self._dados.truncate(fim)
+        self._truncar_transacoes(altura)
+        self.sincronizar()
+
+    def sincronizar(self):
+        """ Garante que tudo o que foi escrito está mesmo no disco (dados primeiro, índice depois). """
+        os.fsync(self._dados.fileno())
+        os.fsync(self._indice.fileno())
+        os.fsync(self._transacoes.fileno())
+        self._por_sincronizar = 0
+
+    # --- ESTADO DERIVADO ---
+
+    def guardar_estado(self, estado):
+        """ Guarda um instantâneo do estado derivado (ex: saldos) para não ter de reler a corrente. """
+        temporario = self.caminho_estado + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(estado, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho_estado)
+
+    def carregar_estado(self):
+        """ Devolve o último instantâneo guardado, ou None. """
+        try:
+            with open(self.caminho_estado, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fechar(self):
+        self.sincronizar()
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+        self._dados.close()
+        self._indice.close()
+        self._transacoes.close()
+
+
+def _id_binario(tx_id):
+    """ Os 32 bytes de um id em hexadecimal, ou None. Um id que não seja um hash SHA-256 (só possível
+    em blocos gravados antes de os ids serem conferidos) não entra no índice: uma transação assim
+    nunca volta a ser aceite, por isso não tem de ser lembrada como confirmada. """
+    if not isinstance(tx_id, str) or len(tx_id) != 64:
+        return None
+    try:
+        binario = bytes.fromhex(tx_id)
+    except ValueError:
+        return None
+    return binario if binario.hex() == tx_id else None
+
+
+class CorrenteArmazenada(Sequence):
+    """ Corrente que vive no armazém: os blocos só são lidos do disco quando alguém os pede. """
+
+    def __init__(self, armazem, tamanho_cache=512):
+        self.armazem = armazem
+        self.tamanho_cache = tamanho_cache
+        self._cache = OrderedDict()  # altura -> Bloco (os mais recentes usados)
+
+    def __len__(self):
+        return len(self.armazem)
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [self[i] for i in range(*posicao.indices(len(self)))]
+
+        if posicao < 0:
+            posicao += len(self)
+        if not 0 <= posicao < len(self):
+            raise IndexError("altura fora da corrente")
+
+        bloco = self._cache.get(posicao)
+        if bloco is None:
+            bloco = Bloco.restaurar_de_dict(self.armazem.ler(posicao))
+            self._guardar_cache(posicao, bloco)
+        else:
+            self._cache.move_to_end(posicao)
+        return bloco
+
+    def _guardar_cache(self, altura, bloco):
+        self._cache[altura] = bloco
+        if len(self._cache) > self.tamanho_cache:
+            self._cache.popitem(last=False)
+
+    def append(self, bloco):
+        self.armazem.acrescentar(bloco.formatar_para_dict())
+        self._guardar_cache(len(self) - 1, bloco)
+
+    def extend(self, blocos):
+        for bloco in blocos:
+            self.append(bloco)
+
+    def __delitem__(self, posicao):
+        """ Só é possível apagar um sufixo (ex: del corrente[altura:]). """
+        if not isinstance(posicao, slice) or posicao.stop is not None or posicao.step not in (None, 1):
+            raise TypeError("a corrente armazenada só permite apagar a partir de uma altura")
+        inicio = posicao.indices(len(self))[0]
+        self.armazem.truncar(inicio)
+        for altura in [a for a in self._cache if a >= inicio]:
+            del self._cache[altura]
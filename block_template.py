@@ -0,0 +1,97 @@
+import json
+import threading
+
+
+class ModeloBloco:
+    """ Mantém pronto o conteúdo do próximo bloco a minerar.
+    É atualizado aos poucos quando chega uma transação ou quando a ponta da corrente muda,
+    e avisa quem estiver à espera (o ciclo de mineração) em vez de este ter de perguntar. """
+
+    def __init__(self, max_transacoes=500, max_bytes=1_000_000):
+        self.max_transacoes = max_transacoes
+        self.max_bytes = max_bytes
+
+        self.ultimo_bloco = None
+        self.transacoes = []
+        self.bytes_usados = 0
+        self._ids = set()
+
+        # Cada alteração incrementa a versão; o minerador compara-a com a que está a usar
+        self.versao = 0
+        self.mudou = threading.Condition()
+        self.ouvintes = []  # Funções chamadas (sem argumentos) depois de cada alteração
+
+    @staticmethod
+    def tamanho_transacao(tx):
+        """ Quantos bytes a transação ocupa no bloco serializado. """
+        return len(json.dumps(tx.formatar_para_dict()).encode())
+
+    def _cabe(self, tamanho):
+        return len(self.transacoes) < self.max_transacoes and self.bytes_usados + tamanho <= self.max_bytes
+
+    def _incluir(self, tx, tamanho):
+        self.transacoes.append(tx)
+        self._ids.add(tx.id)
+        self.bytes_usados += tamanho
+
+    def _notificar(self):
+        """ Acorda quem espera pelo modelo e chama os ouvintes (fora da trava). """
+        with self.mudou:
+            self.versao += 1
+            self.mudou.notify_all()
+        for ouvinte in list(self.ouvintes):
+            ouvinte()
+
+    def adicionar_transacao(self, tx):
+        """ Acrescenta uma transação nova ao modelo, se ainda houver espaço. """
+        tamanho = self.tamanho_transacao(tx)
+        with self.mudou:
+            if tx.id in self._ids or not self._cabe(tamanho):
+                return False
+            self._incluir(tx, tamanho)
+        self._notificar()
+        return True
+
+    def adicionar_transacoes(self, transacoes):
+        """ Acrescenta várias transações de uma vez, com um único aviso a quem espera. """
+        tamanhos = [self.tamanho_transacao(tx) for tx in transacoes]
+        incluidas = 0
+        with self.mudou:
+            for tx, tamanho in zip(transacoes, tamanhos):
+                if tx.id not in self._ids and self._cabe(tamanho):
+                    self._incluir(tx, tamanho)
+                    incluidas += 1
+        if incluidas:
+            self._notificar()
+        return incluidas
+
+    def atualizar_ponta(self, ultimo_bloco, pendentes):
+        """ Recomeça o modelo sobre a nova ponta com as transações pendentes (por ordem de chegada). """
+        with self.mudou:
+            self.ultimo_bloco = ultimo_bloco
+            self.transacoes = []
+            self.bytes_usados = 0
+            self._ids = set()
+
+            for tx in pendentes:
+                if len(self.transacoes) >= self.max_transacoes or self.bytes_usados >= self.max_bytes:
+                    break
+                tamanho = self.tamanho_transacao(tx)
+                if self._cabe(tamanho):
+                    self._incluir(tx, tamanho)
+        self._notificar()
+
+    def obter(self):
+        """ Devolve (versão, último bloco, transações) de forma consistente. """
+        with self.mudou:
+            return self.versao, self.ultimo_bloco, list(self.transacoes)
+
+    def esperar(self, condicao, timeout=None):
+        """ Bloqueia até 'condicao()' ser verdadeira; é reavaliada a cada alteração do modelo. """
+        with self.mudou:
+            return self.mudou.wait_for(condicao, timeout)
+
+    def acordar(self):
+        """ Acorda quem estiver à espera sem alterar o modelo (ex: ao desligar a mineração). """
+        with self.mudou:
+            self.mudou.notify_all()
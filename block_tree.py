@@ -0,0 +1,45 @@
+class ArvoreBlocos:
+    """ Blocos válidos que ficaram fora da corrente principal (ramos laterais), indexados pelo hash.
+    Cada bloco guarda o trabalho acumulado desde o génesis, para se saber qual é a ponta mais pesada.
+    A corrente principal não é copiada para aqui: é a própria corrente que responde por ela. """
+
+    def __init__(self, profundidade_maxima=100):
+        # Ramos que ficaram mais do que isto para trás da ponta já não vão ganhar: são esquecidos
+        self.profundidade_maxima = profundidade_maxima
+        self.blocos = {}  # hash -> (Bloco, trabalho acumulado)
+
+    def __contains__(self, hash_bloco):
+        return hash_bloco in self.blocos
+
+    def __len__(self):
+        return len(self.blocos)
+
+    def obter(self, hash_bloco):
+        entrada = self.blocos.get(hash_bloco)
+        return entrada[0] if entrada else None
+
+    def trabalho(self, hash_bloco):
+        return self.blocos[hash_bloco][1]
+
+    def adicionar(self, bloco, trabalho):
+        self.blocos[bloco.hash] = (bloco, trabalho)
+
+    def remover(self, hash_bloco):
+        self.blocos.pop(hash_bloco, None)
+
+    def ramo_ate(self, hash_ponta):
+        """ Blocos do ramo lateral que termina em 'hash_ponta', do mais antigo para o mais recente.
+        O pai do primeiro é o bloco da corrente principal onde o ramo se separou. """
+        ramo = []
+        atual = self.obter(hash_ponta)
+        while atual is not None:
+            ramo.append(atual)
+            atual = self.obter(atual.hash_anterior)
+        ramo.reverse()
+        return ramo
+
+    def podar(self, altura_ponta):
+        """ Esquece os blocos demasiado antigos para alguma vez voltarem a ser a ponta. """
+        limite = altura_ponta - self.profundidade_maxima
+        for hash_bloco in [h for h, (bloco, _) in self.blocos.items() if bloco.indice < limite]:
+            del self.blocos[hash_bloco]
@@ -1,156 +1,537 @@
+import json
+import logging
+import math
+import os
 import time
-from block import Bloco # Importamos a classe que criámos antes
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from block import Bloco, VERSAO_ORIGINAL # Importamos a classe que criámos antes
 from transaction import Transacao
+from block_template import ModeloBloco
+from mempool import Mempool
+from block_store import CorrenteArmazenada
+from block_tree import ArvoreBlocos
+from tx_columns import TransacoesConfirmadas
+from tracing import rastreador
+
+log = logging.getLogger(__name__)
+
+# Abaixo deste número de blocos não compensa mandar a validação para o pool de processos
+LIMIAR_VALIDACAO_PARALELA = 64
+# Com armazém, o instantâneo dos saldos é regravado a cada tantos blocos (e não só ao fechar),
+# para um arranque depois de uma falha só ter de reaplicar os blocos mais recentes
+INSTANTANEO_CADA = 256
+
+
+def _bloco_integro(bloco, dificuldade):
+    """ Verificações de um bloco que não dependem dos outros (por isso podem correr em paralelo). """
+    return (bloco.hash == bloco.gerar_hash()
+            and bloco.hash.startswith("0" * dificuldade)
+            and bloco.validar_transacoes())
+
 
 class RedeBlockchain:
-    def __init__(self, dificuldade=3):
-        self.corrente = [self.criar_bloco_genesis()]
-        self.transacoes_pendentes = []
+    def __init__(self, dificuldade=3, max_transacoes_bloco=500, max_bytes_bloco=1_000_000, capacidade_mempool=10_000,
+                 armazem=None, versao_bloco=VERSAO_ORIGINAL, processos_validacao=None, indice_transacoes=False):
+        self.mempool = Mempool(capacidade_mempool)
         self.dificuldade = dificuldade
         self.recompensa_mineracao = 50.0
+        # Formato dos blocos que este nó mina (os recebidos podem vir em qualquer formato conhecido)
+        self.versao_bloco = versao_bloco
+
+        # Validação de correntes recebidas: pool de processos criado só quando for preciso
+        self.processos_validacao = processos_validacao
+        self._executor_validacao = None
+
+        # Ramos laterais já validados (servem para reorganizações e para não revalidar blocos conhecidos)
+        self.arvore = ArvoreBlocos()
+        self.reorganizacoes = 0
+
+        # Índice de saldos: endereço -> saldo confirmado (os débitos pendentes vivem no mempool)
+        self.saldos = {}
+        # Transações já confirmadas na corrente principal: id -> altura do bloco (não podem voltar a entrar);
+        # com armazém é lido do índice das transações dele
+        self.confirmadas = {}
+        self._altura_instantaneo = 0  # Altura coberta pelo último instantâneo gravado
+
+        # Sem armazém a corrente vive só em memória; com ele, é lida do disco à medida que é precisa
+        self.armazem = armazem
+        if armazem is None:
+            self.corrente = [self.criar_bloco_genesis()]
+        else:
+            self.corrente = CorrenteArmazenada(armazem)
+            if len(self.corrente) == 0:
+                self.corrente.append(self.criar_bloco_genesis())
+            self._verificar_ponta_armazenada()
+            self._restaurar_saldos()
+
+        # Opcional: as transações confirmadas em colunas, para procurar por id ou por endereço
+        self.transacoes_confirmadas = None
+        if indice_transacoes:
+            self.transacoes_confirmadas = TransacoesConfirmadas()
+            for altura in range(len(self.corrente)):
+                self.transacoes_confirmadas.acrescentar_bloco(self.corrente[altura])
+
+        # Conteúdo do próximo bloco, limitado em número de transações e em bytes
+        self.modelo = ModeloBloco(max_transacoes_bloco, max_bytes_bloco)
+        self.modelo.atualizar_ponta(self.obter_ultimo_bloco(), self.mempool)
+
+    @property
+    def transacoes_pendentes(self):
+        """ Cópia da fila de espera como lista, pela ordem de chegada. """
+        return list(self.mempool)
 
     def criar_bloco_genesis(self):
         """ Cria o primeiríssimo bloco da rede. """
         # Um bloco com índice 0 e hash anterior fixo
         return Bloco(0, "0"*64, [], nonce=0, timestamp=0)
 
+    def _verificar_ponta_armazenada(self):
+        """ Ao arrancar só se confere o último bloco guardado; os anteriores já foram validados antes de gravados. """
+        while len(self.corrente) > 1:
+            ponta = self.corrente[-1]
+            if ponta.hash == ponta.gerar_hash() and ponta.hash_anterior == self.corrente[-2].hash:
+                return
+            log.warning("🩹 Bloco %s guardado está corrompido. A descartá-lo...", ponta.indice)
+            del self.corrente[len(self.corrente) - 1:]
+
+    def _restaurar_saldos(self):
+        """ Parte do último instantâneo de saldos e aplica só os blocos que vieram depois dele.
+        Os ids confirmados vêm do índice das transações do armazém, que acompanha sempre os blocos. """
+        self.confirmadas = dict(self.armazem.ids_confirmados())
+        estado = self.armazem.carregar_estado()
+        inicio = 0
+        if estado and 0 < estado["altura"] <= len(self.corrente):
+            if self.corrente[estado["altura"] - 1].hash == estado["ultimo_hash"]:
+                self.saldos = estado["saldos"]
+                inicio = estado["altura"]
+        for altura in range(inicio, len(self.corrente)):
+            self._aplicar_bloco(self.corrente[altura])
+        self._altura_instantaneo = inicio
+
+    def _guardar_instantaneo(self):
+        """ Grava os saldos da altura atual; os blocos vão primeiro para o disco, para o instantâneo
+        nunca contar com blocos que uma falha ainda pode apagar. """
+        self.armazem.sincronizar()
+        self.armazem.guardar_estado({
+            "altura": len(self.corrente),
+            "ultimo_hash": self.obter_ultimo_bloco().hash,
+            "saldos": self.saldos
+        })
+        self._altura_instantaneo = len(self.corrente)
+
+    def fechar(self):
+        """ Desliga o pool de validação, grava o instantâneo dos saldos e fecha o armazém (se houver). """
+        if self._executor_validacao is not None:
+            self._executor_validacao.shutdown(wait=False, cancel_futures=True)
+            self._executor_validacao = None
+        if self.armazem is None:
+            return
+        self._guardar_instantaneo()
+        self.armazem.fechar()
+
     def obter_ultimo_bloco(self):
         """ Atalho para pegar o bloco mais recente da lista. """
         return self.corrente[-1]
 
+    @property
+    def trabalho_por_bloco(self):
+        """ Trabalho esperado para minerar um bloco (número médio de hashes à dificuldade atual). """
+        return 16 ** self.dificuldade
+
+    def trabalho_ate(self, altura):
+        """ Trabalho acumulado da corrente principal até ao bloco nessa altura (o génesis não conta). """
+        return altura * self.trabalho_por_bloco
+
+    def _localizar_pai(self, bloco):
+        """ Devolve (altura, trabalho acumulado) do pai do bloco, se o conhecermos; senão None. """
+        if bloco.hash_anterior in self.arvore:
+            pai = self.arvore.obter(bloco.hash_anterior)
+            return pai.indice, self.arvore.trabalho(pai.hash)
+        altura = bloco.indice - 1 if isinstance(bloco.indice, int) else -1
+        if 0 <= altura < len(self.corrente) and self.corrente[altura].hash == bloco.hash_anterior:
+            return altura, self.trabalho_ate(altura)
+        return None
+
+    def esta_na_corrente(self, bloco):
+        """ Diz se este bloco (pelo hash) já faz parte da corrente principal. """
+        altura = bloco.indice if isinstance(bloco.indice, int) else -1
+        return 0 <= altura < len(self.corrente) and self.corrente[altura].hash == bloco.hash
+
+    def conhece_pai(self, bloco):
+        """ Diz se o bloco anterior a este já está na corrente ou num ramo lateral. """
+        return self._localizar_pai(bloco) is not None
+
     def adicionar_bloco(self, novo_bloco):
-        """ Valida e insere um novo bloco na corrente. """
+        """ Valida e insere um novo bloco na corrente.
+        Um bloco válido que não continua a ponta fica guardado num ramo lateral; se esse ramo passar
+        a ter mais trabalho do que a corrente principal, a corrente é reorganizada para ele.
+        Devolve True se a ponta da corrente mudou. """
         ultimo_bloco = self.obter_ultimo_bloco()
         # 1. Verificação de continuidade
         if novo_bloco.hash_anterior != ultimo_bloco.hash:
-            return False
+            return self._adicionar_bloco_lateral(novo_bloco)
         
         # 2. Verificação de integridade
-        if novo_bloco.hash != novo_bloco.gerar_hash():
-            print("❌ Erro: O conteúdo do bloco foi alterado.")
+        with rastreador.span("recalcular_hash", "corrente", indice=novo_bloco.indice):
+            integro = novo_bloco.hash == novo_bloco.gerar_hash()
+        if not integro:
+            log.warning("❌ Erro: O conteúdo do bloco foi alterado.")
             return False
 
         # 3. Verificação de trabalho (Mineração)
         if not novo_bloco.hash.startswith("0" * self.dificuldade):
-            print("❌ Erro: O bloco não foi minerado corretamente.")
+            log.warning("❌ Erro: O bloco não foi minerado corretamente.")
             return False
 
-        self.corrente.append(novo_bloco)
-        
-        # Limpar as transações pendentes que agora já estão no bloco
-        ids_confirmados = {tx.id for tx in novo_bloco.transacoes if hasattr(tx, 'id')}
-        self.transacoes_pendentes = [t for t in self.transacoes_pendentes if t.id not in ids_confirmados]
+        # 4. Os ids têm de corresponder às transações e, no formato merkle, à raiz do cabeçalho
+        with rastreador.span("verificar_merkle", "corrente", transacoes=len(novo_bloco.transacoes)):
+            transacoes_validas = novo_bloco.validar_transacoes()
+        if not transacoes_validas:
+            log.warning("❌ Erro: As transações não correspondem aos ids ou à raiz de Merkle do bloco.")
+            return False
+
+        with rastreador.span("aplicar_bloco", "corrente", indice=novo_bloco.indice):
+            return self._reorganizar(len(self.corrente), [novo_bloco])
+
+    def _adicionar_bloco_lateral(self, novo_bloco):
+        """ Guarda um bloco que se liga a um bloco conhecido que não é a ponta. """
+        if novo_bloco.hash in self.arvore or self.esta_na_corrente(novo_bloco):
+            return False
+        pai = self._localizar_pai(novo_bloco)
+        if pai is None:
+            return False
+        altura_pai, trabalho_pai = pai
+        if novo_bloco.indice != altura_pai + 1 or not _bloco_integro(novo_bloco, self.dificuldade):
+            log.warning("❌ Erro: Bloco de ramo lateral inválido.")
+            return False
+
+        trabalho = trabalho_pai + self.trabalho_por_bloco
+        self.arvore.adicionar(novo_bloco, trabalho)
+        if trabalho <= self.trabalho_ate(len(self.corrente) - 1):
+            log.info("🌿 Bloco %s guardado num ramo lateral.", novo_bloco.indice)
+            return False
+
+        # O ramo lateral passou a ser o mais pesado: só se refazem os blocos depois do antepassado comum
+        ramo = self.arvore.ramo_ate(novo_bloco.hash)
+        if not self._reorganizar(ramo[0].indice, ramo):
+            self.arvore.remover(novo_bloco.hash)
+            return False
         return True
 
-    def verificar_rede_valida(self):
-        """ Percorre toda a corrente para garantir que nada foi alterado. """
-        for i in range(1, len(self.corrente)):
-            atual = self.corrente[i]
-            anterior = self.corrente[i-1]
+    def _repete_confirmadas(self, bifurcacao, ramo):
+        """ Diz se o ramo traz uma transação que já ficaria confirmada antes dele (na corrente até
+        'bifurcacao' ou num bloco anterior do próprio ramo): seria a mesma transferência duas vezes. """
+        vistas = set()
+        for bloco in ramo:
+            for tx in bloco.transacoes:
+                altura = self.confirmadas.get(tx.id)
+                if (altura is not None and altura < bifurcacao) or tx.id in vistas:
+                    return True
+                vistas.add(tx.id)
+        return False
 
-            # Valida o hash do próprio bloco
-            if atual.hash != atual.gerar_hash():
-                return False
+    def _reorganizar(self, bifurcacao, ramo):
+        """ Troca os blocos da corrente a partir da altura 'bifurcacao' pelos do ramo (já validados).
+        Custa O(profundidade da bifurcação): saldos, mempool e árvore são atualizados só nesses blocos.
+        Devolve False (sem mexer em nada) se o ramo repetir uma transação já confirmada. """
+        if self._repete_confirmadas(bifurcacao, ramo):
+            log.warning("❌ Erro: O bloco repete uma transação já confirmada.")
+            return False
+        antigos = self.corrente[bifurcacao:]
+        if antigos:
+            self.reorganizacoes += 1
+            log.info("🔀 Reorganização: %d bloco(s) trocados por %d a partir da altura %d.", len(antigos), len(ramo), bifurcacao)
 
-            # Valida a ligação com o bloco anterior
-            if atual.hash_anterior != anterior.hash:
-                return False
+        for bloco in reversed(antigos):
+            self._aplicar_bloco(bloco, sinal=-1)
+        for bloco in ramo:
+            self._aplicar_bloco(bloco)
+        del self.corrente[bifurcacao:]
+        self.corrente.extend(ramo)
+        if self.transacoes_confirmadas is not None:
+            self.transacoes_confirmadas.truncar(bifurcacao)
+            for bloco in ramo:
+                self.transacoes_confirmadas.acrescentar_bloco(bloco)
+
+        # Os blocos que saíram passam a ser um ramo lateral (ainda podem voltar a ganhar)
+        trabalho = self.trabalho_ate(bifurcacao - 1)
+        for bloco in antigos:
+            trabalho += self.trabalho_por_bloco
+            self.arvore.adicionar(bloco, trabalho)
+        for bloco in ramo:
+            self.arvore.remover(bloco.hash)
+        self.arvore.podar(len(self.corrente) - 1)
+
+        # As transações dos blocos novos saem da fila
+        for bloco in ramo:
+            self.mempool.remover_confirmadas(bloco.transacoes)
+        if antigos:
+            # Os saldos mudaram: as transações dos blocos desfeitos e as que já esperavam na fila são
+            # validadas outra vez, como se chegassem agora, para nenhuma gastar o que já não existe
+            pendentes = [tx for bloco in antigos for tx in bloco.transacoes if tx.remetente != "sistema"]
+            pendentes += [self.mempool.remover(tx.id) for tx in list(self.mempool)]
+            self._admitir_transacoes(pendentes)
+        self.modelo.atualizar_ponta(self.obter_ultimo_bloco(), self.mempool)
+
+        # Um instantâneo que inclua blocos desfeitos já não serve: grava-se logo um novo
+        if self.armazem is not None and (bifurcacao < self._altura_instantaneo
+                                         or len(self.corrente) - self._altura_instantaneo >= INSTANTANEO_CADA):
+            self._guardar_instantaneo()
         return True
 
+    def verificar_rede_valida(self):
+        """ Percorre toda a corrente para garantir que nada foi alterado. """
+        # Aqui não se exige a dificuldade: só interessa se o conteúdo e as ligações batem certo
+        return self._validar_blocos(self.corrente[1:], self.corrente[0], dificuldade=0)
+
     def nova_transacao(self, remetente, destino, valor):
         """ Cria e tenta adicionar uma transação à fila de espera. """
         tx = Transacao(remetente, destino, valor)
-        
+        return self.adicionar_transacao(tx)
+
+    def adicionar_transacao(self, tx):
+        """ Valida uma transação (nova ou vinda da rede) e coloca-a na fila de espera. """
         # Validação básica de assinatura/estrutura
         if not tx.validar():
             return False
 
+        # A mesma transação não entra duas vezes (nem depois de confirmada)
+        if tx.id in self.mempool or tx.id in self.confirmadas:
+            return False
+
         # Impedir gasto duplo (se o saldo é suficiente)
-        if remetente != "sistema": # 'sistema' é quem cria moedas (recompensa)
-            if self.consultar_saldo(remetente) < valor:
-                print(f"⚠️ Saldo insuficiente para {remetente}")
+        if tx.remetente != "sistema": # 'sistema' é quem cria moedas (recompensa)
+            if self.consultar_saldo(tx.remetente) < tx.quantia:
+                log.debug("⚠️ Saldo insuficiente para %s", tx.remetente)
                 return False
-            
-        self.transacoes_pendentes.append(tx)
+
+        expulsas = self.mempool.adicionar(tx)
+        if expulsas:
+            # Alguma das expulsas podia estar no modelo do bloco: refaz-se a partir do mempool
+            self.modelo.atualizar_ponta(self.obter_ultimo_bloco(), self.mempool)
+        else:
+            self.modelo.adicionar_transacao(tx)
         return tx
 
+    def adicionar_transacoes(self, transacoes):
+        """ Versão em lote do adicionar_transacao para transações vindas da rede: cada uma é validada
+        contra os saldos (já contando com as anteriores do lote) e o modelo do bloco só é atualizado
+        uma vez no fim. Devolve a lista das aceites. """
+        aceites, houve_expulsas = self._admitir_transacoes(transacoes)
+        if houve_expulsas:
+            self.modelo.atualizar_ponta(self.obter_ultimo_bloco(), self.mempool)
+        elif aceites:
+            self.modelo.adicionar_transacoes(aceites)
+        return [tx for tx in aceites if tx.id in self.mempool]
+
+    def _admitir_transacoes(self, transacoes):
+        """ Valida e põe no mempool, sem mexer no modelo do bloco. Devolve (aceites, houve_expulsas). """
+        aceites, houve_expulsas = [], False
+        for tx in transacoes:
+            # Da rede nunca se aceitam recompensas soltas, e o id tem de corresponder ao conteúdo
+            if tx.remetente == "sistema" or tx.id in self.mempool or tx.id in self.confirmadas or not tx.validar():
+                continue
+            if tx.id != tx.gerar_identificador():
+                continue
+            if self.consultar_saldo(tx.remetente) < tx.quantia:
+                continue
+            expulsas = self.mempool.adicionar(tx)
+            houve_expulsas = houve_expulsas or bool(expulsas)
+            aceites.append(tx)
+        return aceites, houve_expulsas
+
+    def _aplicar_bloco(self, bloco, sinal=1):
+        """ Soma (sinal=1) ou desfaz (sinal=-1) o efeito de um bloco no índice de saldos
+        e nos ids confirmados. """
+        saldos, confirmadas = self.saldos, self.confirmadas
+        for tx in bloco.transacoes:
+            if sinal > 0:
+                confirmadas[tx.id] = bloco.indice
+            else:
+                confirmadas.pop(tx.id, None)
+            valor = sinal * tx.quantia
+            saldos[tx.remetente] = saldos.get(tx.remetente, 0.0) - valor
+            saldos[tx.destinatario] = saldos.get(tx.destinatario, 0.0) + valor
+
     def consultar_saldo(self, endereco):
-        """ Calcula o saldo total percorrendo todo o histórico. """
+        """ Saldo confirmado (do índice) menos o que já está comprometido na fila de espera. """
+        return self.saldos.get(endereco, 0.0) - self.mempool.debito(endereco)
+
+    def calcular_saldo_completo(self, endereco):
+        """ Calcula o saldo total percorrendo todo o histórico (usado para conferir o índice). """
         saldo = 0.0
         
         # Verificar blocos confirmados na corrente
         for bloco in self.corrente:
             for tx in bloco.transacoes:
-                # Se for um objeto Transacao, usamos getattr para segurança
-                # Se for um dicionário (JSON), usamos o .get()
-                if isinstance(tx, dict):
-                    print(tx)
-                    de = tx.get('origem') or tx.get('remetente')
-                    para = tx.get('destino') or tx.get('destinatario')
-                    valor = tx.get('valor') or tx.get('quantia', 0)
-                else:
-                    de = getattr(tx, 'remetente', None)
-                    para = getattr(tx, 'destinatario', None)
-                    valor = getattr(tx, 'quantia', 0)
-                    print(de, para, valor)
-
-
-                if de == endereco:
-                    saldo -= valor
-                if para == endereco:
-                    saldo += valor
+                if tx.remetente == endereco:
+                    saldo -= tx.quantia
+                if tx.destinatario == endereco:
+                    saldo += tx.quantia
         
         # Também subtraímos o que está na fila de espera (pendentes)
-        for tx in self.transacoes_pendentes:
-            de = getattr(tx, 'remetente', None)
-            if de == endereco:
-                saldo -= getattr(tx, 'quantia', 0)
+        for tx in self.mempool:
+            if tx.remetente == endereco:
+                saldo -= tx.quantia
                 
         return saldo
+
+    def verificar_indice_saldos(self):
+        """ Compara o índice com uma recontagem completa da corrente.
+        Devolve {endereco: (saldo_indice, saldo_recontado)} com as divergências (vazio se estiver tudo certo). """
+        enderecos = set(self.saldos) | set(self.mempool.debitos)
+        for bloco in self.corrente:
+            for tx in bloco.transacoes:
+                enderecos.add(tx.remetente)
+                enderecos.add(tx.destinatario)
+
+        divergencias = {}
+        for endereco in enderecos:
+            no_indice = self.consultar_saldo(endereco)
+            recontado = self.calcular_saldo_completo(endereco)
+            if not math.isclose(no_indice, recontado, rel_tol=1e-9, abs_tol=1e-9):
+                divergencias[endereco] = (no_indice, recontado)
+        return divergencias
     
     def replace_chain(self, nova_corrente):
         """Substitui a corrente local por uma nova se for válida e mais longa."""
         # 1. Verifica se a nova corrente é realmente maior
         if len(nova_corrente) <= len(self.corrente):
             return False
-            
-        # 2. Valida a integridade da nova corrente
-        if not self.validar_outra_corrente(nova_corrente):
+
+        # 2. Só a parte depois da bifurcação é validada e trocada
+        bifurcacao = self.ponto_bifurcacao([bloco.hash for bloco in nova_corrente])
+        return self.adotar_ramo(bifurcacao, nova_corrente[bifurcacao:])
+
+    def adotar_ramo(self, bifurcacao, blocos):
+        """ Adota os blocos recebidos como a nova continuação da corrente a partir da altura 'bifurcacao',
+        se forem válidos e deixarem a corrente com mais trabalho do que a atual. """
+        if not blocos or self.trabalho_ate(bifurcacao + len(blocos) - 1) <= self.trabalho_ate(len(self.corrente) - 1):
             return False
-            
-        # 3. Substitui a corrente
-        self.corrente = nova_corrente
-        
-        # 4. Atualiza as transações pendentes
-        # Removemos da fila o que já foi confirmado na nova corrente
-        ids_confirmados = set()
-        for bloco in self.corrente:
-            for tx in bloco.transacoes:
-                # Tenta pegar o ID seja objeto ou dicionário
-                if hasattr(tx, 'id'):
-                    ids_confirmados.add(tx.id)
-                elif isinstance(tx, dict):
-                    ids_confirmados.add(tx.get('id'))
-                    
-        self.transacoes_pendentes = [
-            tx for tx in self.transacoes_pendentes 
-            if getattr(tx, 'id', None) not in ids_confirmados
-        ]
-        
-        return True
 
-    def validar_outra_corrente(self, corrente_externa):
-        """Método auxiliar para validar correntes recebidas de outros nós."""
-        for i in range(1, len(corrente_externa)):
-            bloco_atual = corrente_externa[i]
-            bloco_anterior = corrente_externa[i-1]
+        if bifurcacao == 0:
+            # Génesis diferente do nosso: tal como antes, aceita-se o deles e valida-se o que vem depois
+            resto = self._validar_ramo(blocos[0], blocos[1:])
+            blocos = None if resto is None else [blocos[0]] + resto
+        else:
+            blocos = self._validar_ramo(self.corrente[bifurcacao - 1], blocos)
+        if blocos is None:
+            return False
 
-            if bloco_atual.hash != bloco_atual.gerar_hash():
-                return False
+        return self._reorganizar(bifurcacao, blocos)
 
-            if bloco_atual.hash_anterior != bloco_anterior.hash:
-                return False
+    def ponto_bifurcacao(self, hashes):
+        """ Quantos blocos iniciais a nossa corrente tem em comum com outra (dada pela lista dos hashes).
+        Como cada hash inclui o anterior, o prefixo comum acaba no primeiro hash diferente: dá para
+        procurar por bissecção, lendo poucos blocos mesmo em correntes muito longas. """
+        baixo, alto = 0, min(len(self.corrente), len(hashes))
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            if self.corrente[meio].hash == hashes[meio]:
+                baixo = meio + 1
+            else:
+                alto = meio
+        return baixo
+
+    # --- SINCRONIZAÇÃO (CABEÇALHOS PRIMEIRO) ---
+
+    def localizador(self):
+        """ Pares [altura, hash] da ponta para trás: os 10 mais recentes e depois com saltos a dobrar,
+        terminando no génesis. Quem o recebe encontra o último bloco em comum com poucas comparações. """
+        pares = []
+        altura, passo = len(self.corrente) - 1, 1
+        while altura > 0:
+            pares.append([altura, self.corrente[altura].hash])
+            if len(pares) >= 10:
+                passo *= 2
+            altura -= passo
+        pares.append([0, self.corrente[0].hash])
+        return pares
+
+    def altura_em_comum(self, localizador):
+        """ Maior altura do localizador cujo bloco também está na nossa corrente (-1 se nenhuma). """
+        for altura, hash_bloco in localizador:
+            if isinstance(altura, int) and 0 <= altura < len(self.corrente) and self.corrente[altura].hash == hash_bloco:
+                return altura
+        return -1
 
-            if not bloco_atual.hash.startswith("0" * self.dificuldade):
+    def cabecalhos_apos(self, localizador, limite):
+        """ Cabeçalhos dos blocos a seguir ao último bloco em comum com o localizador (no máximo 'limite'). """
+        inicio = self.altura_em_comum(localizador) + 1
+        return [Bloco.cabecalho_de_dict(dados) for dados in self.blocos_em_dict(inicio, limite)]
+
+    def procurar_bloco(self, hash_bloco, altura=None):
+        """ Bloco com este hash na corrente principal (na altura indicada) ou num ramo lateral. """
+        if isinstance(altura, int) and 0 <= altura < len(self.corrente) and self.corrente[altura].hash == hash_bloco:
+            return self.corrente[altura]
+        return self.arvore.obter(hash_bloco)
+
+    def blocos_em_dict(self, inicio, quantidade, max_bytes=None):
+        """ Blocos completos da corrente principal a partir da altura 'inicio', já no formato da rede.
+        Com armazém são lidos tal como estão no disco, sem reconstruir os objetos.
+        Com 'max_bytes' param antes de o total em JSON passar desse valor (mas vai sempre pelo menos um). """
+        inicio = max(inicio, 0)
+        fim = min(len(self.corrente), inicio + max(quantidade, 0))
+        blocos, total = [], 0
+        for altura in range(inicio, fim):
+            if self.armazem is not None:
+                dados = self.armazem.ler(altura)
+                tamanho = self.armazem.tamanho(altura) if max_bytes is not None else 0
+            else:
+                dados = self.corrente[altura].formatar_para_dict()
+                tamanho = len(json.dumps(dados)) if max_bytes is not None else 0
+            total += tamanho
+            if blocos and max_bytes is not None and total > max_bytes:
+                break
+            blocos.append(dados)
+        return blocos
+
+    def _obter_executor_validacao(self):
+        """ Cria o pool de processos da validação apenas na primeira utilização. """
+        if self._executor_validacao is None:
+            self._executor_validacao = ProcessPoolExecutor(self.processos_validacao)
+        return self._executor_validacao
+
+    def _validar_blocos(self, blocos, anterior, dificuldade):
+        """ Valida uma sequência de blocos que continua 'anterior'.
+        As ligações (baratas) são vistas em sequência; os hashes (caros) em paralelo. """
+        for bloco in blocos:
+            if bloco.hash_anterior != anterior.hash:
                 return False
-        return True
\ No newline at end of file
+            anterior = bloco
+        return self._blocos_integros(blocos, dificuldade)
+
+    def _blocos_integros(self, blocos, dificuldade):
+        """ Confere o hash, o trabalho e as transações de cada bloco, num pool de processos se forem muitos. """
+        if len(blocos) < LIMIAR_VALIDACAO_PARALELA:
+            return all(_bloco_integro(bloco, dificuldade) for bloco in blocos)
+
+        executor = self._obter_executor_validacao()
+        processos = self.processos_validacao or os.cpu_count() or 1
+        fatia = max(1, len(blocos) // (processos * 4))
+        return all(executor.map(_bloco_integro, blocos, repeat(dificuldade), chunksize=fatia))
+
+    def _validar_ramo(self, anterior, blocos):
+        """ Valida blocos que continuam 'anterior'. Os que já estão num ramo lateral conhecido foram
+        validados antes: são trocados pelo nosso objeto (tem o mesmo hash) e não voltam a ser conferidos.
+        Devolve a lista de blocos a usar, ou None se algum for inválido. """
+        blocos = [self.arvore.obter(bloco.hash) or bloco for bloco in blocos]
+        por_validar = [bloco for bloco in blocos if bloco.hash not in self.arvore]
+
+        # As ligações são conferidas em toda a parte nova (incluindo os blocos já conhecidos)
+        for bloco in blocos:
+            if bloco.hash_anterior != anterior.hash:
+                return None
+            anterior = bloco
+        if not self._blocos_integros(por_validar, self.dificuldade):
+            return None
+        return blocos
+
+    def validar_outra_corrente(self, corrente_externa):
+        """Método auxiliar para validar correntes recebidas de outros nós.
+        Só valida a partir da bifurcação com a nossa corrente."""
+        inicio = max(self.ponto_bifurcacao([bloco.hash for bloco in corrente_externa]), 1)
+        if inicio >= len(corrente_externa):
+            return True
+        return self._validar_ramo(corrente_externa[inicio - 1], corrente_externa[inicio:]) is not None
@@ -0,0 +1,573 @@
+import argparse
+import collections
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import concurrent.futures
+from block import Bloco
+from transaction import Transacao
+from framing import CABECALHO, codificar_mensagem, descodificar_mensagem
+from transport import TransporteAsync, TIMEOUT_RESPOSTA, PESO_LATENCIA
+from metrics import configurar_logging, NIVEIS_LOG
+from tracing import rastreador, AMOSTRAGEM_PERFIL
+
+log = logging.getLogger(__name__)
+
+TOPOLOGIAS = ["completa", "anel", "estrela", "aleatoria"]
+# De quanto em quanto tempo o monitor olha para as pontas de todos os nós (resolução das medições)
+INTERVALO_MONITOR = 0.005
+# Saldo dado a cada nó antes do arranque, para poder criar transações desde o primeiro segundo
+SALDO_INICIAL = 50.0
+VALOR_TRANSACAO = 0.001
+
+
+# --- REDE EM MEMÓRIA ---
+
+class RedeMemoria:
+    """ Rede simulada dentro do processo: os transportes registam-se pelo (host, porta) e as mensagens
+    são entregues diretamente na fila do destino, depois de uma latência configurável.
+    Cada mensagem continua a ser codificada e descodificada (JSON ou binário), por isso os nós
+    nunca partilham objetos e o custo de serialização conta, mas não há sockets nem portas abertas. """
+
+    def __init__(self, latencia=0.0, variacao=0.0, semente=None):
+        self.latencia = latencia    # Segundos de atraso de cada entrega
+        self.variacao = variacao    # Atraso extra aleatório, entre 0 e isto
+        self._aleatorio = random.Random(semente)
+        self._transportes = {}      # (host, porta) -> TransporteMemoria
+        self.entregues = 0
+        self.perdidas = 0           # Mensagens para endereços sem ninguém à escuta
+
+    def fabrica(self, host, porta, ao_receber, **opcoes):
+        """ Usar como fabrica_transporte do NoDaRede. """
+        return TransporteMemoria(self, host, porta, ao_receber, **opcoes)
+
+    def _registar(self, transporte):
+        self._transportes[(transporte.host, transporte.porta)] = transporte
+
+    def _remover(self, transporte):
+        if self._transportes.get((transporte.host, transporte.porta)) is transporte:
+            del self._transportes[(transporte.host, transporte.porta)]
+
+    def entregar(self, origem, destino, trama):
+        """ Põe a trama na fila do destino; devolve False se não há ninguém nesse endereço. """
+        transporte = self._transportes.get(destino)
+        if transporte is None:
+            self.perdidas += 1
+            return False
+        atraso = self.latencia + (self._aleatorio.uniform(0, self.variacao) if self.variacao else 0.0)
+        transporte._chegou(trama, origem, time.monotonic() + atraso)
+        self.entregues += 1
+        return True
+
+
+class TransporteMemoria:
+    """ Mesma interface do TransporteAsync (iniciar, parar, enviar, espalhar, estatisticas_vizinhos),
+    sobre uma RedeMemoria. Uma thread por transporte entrega as mensagens ao nó pela ordem de chegada,
+    tal como o event loop faz: ao_receber nunca corre em duas threads ao mesmo tempo.
+    Um destino que não existe perde a mensagem e um pedido sem resposta expira em TIMEOUT_RESPOSTA.
+    Como no TransporteAsync, os 'tipos_em_thread' e as respostas aos pedidos são tratados por ordem
+    numa thread à parte. """
+
+    def __init__(self, rede, host, porta, ao_receber, codificacao_binaria=True, tipos_em_thread=()):
+        self.rede = rede
+        self.host = host
+        self.porta = porta
+        self.ao_receber = ao_receber
+        self.codificacao_binaria = codificacao_binaria
+        self.tipos_em_thread = frozenset(tipos_em_thread)
+        self._tratamento = None
+
+        self._condicao = threading.Condition()
+        self._chegadas = []             # Heap de (instante de entrega, sequência, trama, origem)
+        self._pedidos = {}              # id -> (Future, destino, instante do envio)
+        self._prazos = collections.deque()  # (prazo, id): o timeout é fixo, por isso já ficam por ordem
+        self._ids = itertools.count(1)
+        self._sequencia = itertools.count()
+        self._vizinhos = {}             # (host, porta) -> contadores de envio
+        self._trava_contadores = threading.Lock()  # Envia-se da thread do nó e das do minerador/carga
+        self.bytes_recebidos = 0
+        self.bytes_enviados = 0
+        self._thread = None
+        self.ativo = False
+
+    # --- CICLO DE VIDA ---
+
+    def iniciar(self):
+        self.ativo = True
+        self._tratamento = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix=f"tratamento-{self.porta}")
+        self.rede._registar(self)
+        self._thread = threading.Thread(target=self._ciclo, name=f"rede-{self.porta}", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        if not self.ativo:
+            return
+        self.rede._remover(self)
+        with self._condicao:
+            self.ativo = False
+            self._condicao.notify()
+        self._thread.join(timeout=2)
+        self._tratamento.shutdown(wait=False, cancel_futures=True)
+
+    # --- RECEÇÃO ---
+
+    def _chegou(self, trama, origem, instante):
+        with self._condicao:
+            heapq.heappush(self._chegadas, (instante, next(self._sequencia), trama, origem))
+            self._condicao.notify()
+
+    def _ciclo(self):
+        with self._condicao:
+            while self.ativo:
+                agora = time.monotonic()
+                while self._prazos and self._prazos[0][0] <= agora:
+                    _, id_pedido = self._prazos.popleft()
+                    pedido = self._pedidos.pop(id_pedido, None)
+                    if pedido is not None and not pedido[0].done():
+                        pedido[0].set_exception(TimeoutError(f"Sem resposta ao pedido {id_pedido}"))
+                        with self._trava_contadores:
+                            self._vizinhos[pedido[1]]["falhas"] += 1
+
+                if self._chegadas and self._chegadas[0][0] <= agora:
+                    _, _, trama, origem = heapq.heappop(self._chegadas)
+                    # O nó é chamado sem a trava, para que os outros possam continuar a entregar
+                    self._condicao.release()
+                    try:
+                        self._despachar(trama, origem)
+                    finally:
+                        self._condicao.acquire()
+                    continue
+
+                proximos = [instante for instante in (self._chegadas[0][0] if self._chegadas else None,
+                                                      self._prazos[0][0] if self._prazos else None)
+                            if instante is not None]
+                self._condicao.wait(min(proximos) - agora if proximos else None)
+
+    def _despachar(self, trama, origem):
+        """ Igual ao TransporteAsync._despachar: respostas vão para o pedido, o resto para o nó. """
+        try:
+            self.bytes_recebidos += len(trama)
+            with rastreador.span("descodificar", "rede", bytes=len(trama)):
+                mensagem = descodificar_mensagem(memoryview(trama)[CABECALHO.size:])
+            with self._condicao:
+                # Só conta como resposta se vier do vizinho a quem o pedido foi feito
+                pedido = self._pedidos.get(mensagem.get('reply_to'))
+                if pedido is not None and pedido[1] == origem:
+                    del self._pedidos[mensagem['reply_to']]
+                else:
+                    pedido = None
+            if pedido is not None:
+                futuro, destino, enviado_em = pedido
+                self._registar_latencia(destino, time.monotonic() - enviado_em)
+                self._tratamento.submit(TransporteAsync._entregar_resposta, futuro, mensagem)
+                return
+            if mensagem.get('type') in self.tipos_em_thread:
+                self._tratamento.submit(self._tratar, mensagem, origem)
+                return
+        except Exception as e:
+            log.warning("⚠️ Erro ao receber/responder dados de %s: %s", origem, e)
+            return
+        self._tratar(mensagem, origem)
+
+    def _tratar(self, mensagem, origem):
+        try:
+            with rastreador.span(str(mensagem.get('type')), "mensagem", perfilar=True):
+                resposta = self.ao_receber(mensagem, origem)
+        except Exception as e:
+            log.warning("⚠️ Erro ao receber/responder dados de %s: %s", origem, e)
+            return
+
+        if resposta:
+            if 'id' in mensagem:
+                resposta = dict(resposta, reply_to=mensagem['id'])
+            self._transmitir([origem], codificar_mensagem(resposta, self.codificacao_binaria))
+
+    def _registar_latencia(self, destino, segundos):
+        with self._trava_contadores:
+            contadores = self._vizinhos[destino]
+            contadores["latencia"] = segundos if contadores["latencia"] is None else \
+                contadores["latencia"] + PESO_LATENCIA * (segundos - contadores["latencia"])
+
+    # --- ENVIO ---
+
+    def _transmitir(self, destinos, trama):
+        origem = (self.host, self.porta)
+        for destino in destinos:
+            # Sem trava durante a entrega: a do destino é apanhada lá dentro
+            entregue = self.rede.entregar(origem, destino, trama)
+            with self._trava_contadores:
+                contadores = self._vizinhos.setdefault(
+                    destino, {"enviadas": 0, "descartadas": 0, "falhas": 0, "latencia": None})
+                contadores["enviadas" if entregue else "descartadas"] += 1
+                if entregue:
+                    self.bytes_enviados += len(trama)
+
+    def enviar(self, host, porta, mensagem, esperar_resposta=False):
+        if not self.ativo:
+            return None
+        id_mensagem = next(self._ids)
+        destino = (host, int(porta))
+        futuro = None
+        if esperar_resposta:
+            futuro = concurrent.futures.Future()
+            agora = time.monotonic()
+            with self._condicao:
+                self._pedidos[id_mensagem] = (futuro, destino, agora)
+                self._prazos.append((agora + TIMEOUT_RESPOSTA, id_mensagem))
+                self._condicao.notify()
+        self._transmitir([destino], codificar_mensagem(dict(mensagem, id=id_mensagem), self.codificacao_binaria))
+        return futuro
+
+    def espalhar(self, destinos, mensagem, coalescer=None):
+        """ Serializa uma vez e entrega a todos; sem filas de saída, não há nada para coalescer. """
+        if not self.ativo:
+            return
+        trama = codificar_mensagem(dict(mensagem, id=next(self._ids)), self.codificacao_binaria)
+        self._transmitir([(host, int(porta)) for host, porta in destinos], trama)
+
+    def estatisticas_vizinhos(self):
+        return {
+            f"{h}:{p}": {
+                "ligado": (h, p) in self.rede._transportes,
+                "na_fila": 0,
+                "enviadas": c["enviadas"],
+                "descartadas": c["descartadas"],
+                "falhas": c["falhas"],
+                "latencia_ms": None if c["latencia"] is None else round(c["latencia"] * 1000, 3),
+            }
+            for (h, p), c in list(self._vizinhos.items())
+        }
+
+
+# --- TOPOLOGIAS ---
+
+def gerar_topologia(qtd_nos, topologia, grau=3, semente=None):
+    """ Lista com os vizinhos iniciais (índices) de cada nó. As ligações são sempre nos dois sentidos.
+    A "aleatoria" parte de um anel (para a rede ficar ligada) e junta arestas ao acaso até cada nó
+    ter, em média, 'grau' vizinhos. """
+    arestas = set()
+    if topologia == "completa":
+        arestas = {(a, b) for a in range(qtd_nos) for b in range(a + 1, qtd_nos)}
+    elif topologia == "estrela":
+        arestas = {(0, b) for b in range(1, qtd_nos)}
+    elif topologia in ("anel", "aleatoria"):
+        if qtd_nos > 1:
+            arestas = {tuple(sorted((i, (i + 1) % qtd_nos))) for i in range(qtd_nos)} - {(0, 0)}
+        if topologia == "aleatoria":
+            aleatorio = random.Random(semente)
+            maximo = qtd_nos * (qtd_nos - 1) // 2
+            alvo = min(maximo, qtd_nos * grau // 2)
+            while len(arestas) < alvo:
+                a, b = aleatorio.sample(range(qtd_nos), 2)
+                arestas.add((min(a, b), max(a, b)))
+    else:
+        raise ValueError(f"Topologia desconhecida: {topologia}")
+
+    vizinhos = [set() for _ in range(qtd_nos)]
+    for a, b in arestas:
+        vizinhos[a].add(b)
+        vizinhos[b].add(a)
+    return [sorted(v) for v in vizinhos]
+
+
+# --- CLUSTER ---
+
+class Cluster:
+    """ N nós NoDaRede no mesmo processo (em portas locais ou numa RedeMemoria), com uma topologia
+    inicial, alguns mineiros e um gerador de carga que cria transações a um ritmo fixo.
+    Um monitor regista quando cada bloco chega a cada nó; no fim, o relatorio() junta a latência
+    de confirmação das transações, o tempo de propagação dos blocos, a taxa de forks e as mensagens. """
+
+    def __init__(self, qtd_nos=4, topologia="completa", mineiros=1, dificuldade=4, memoria=True,
+                 latencia=0.0, variacao=0.0, porta_inicial=7300, grau=3, semente=None, host="127.0.0.1"):
+        from node import NoDaRede  # Só aqui, como no benchmark.py
+        self.rede = RedeMemoria(latencia, variacao, semente) if memoria else None
+        self.topologia = topologia
+        self.vizinhos = gerar_topologia(qtd_nos, topologia, grau, semente)
+        self.mensagens = [collections.Counter() for _ in range(qtd_nos)]  # Um contador por nó
+
+        base = self.rede.fabrica if memoria else TransporteAsync
+        portas = [porta_inicial + i for i in range(qtd_nos)]
+        self.nos = []
+        for i, porta in enumerate(portas):
+            def fabrica(h, p, ao_receber, contador=self.mensagens[i], **opcoes):
+                return base(h, p, _contar_mensagens(ao_receber, contador), **opcoes)
+            self.nos.append(NoDaRede(host, porta, nos_iniciais=[(host, portas[j]) for j in self.vizinhos[i]],
+                                     processos_mineracao=1, minerar_vazios=False, fabrica_transporte=fabrica))
+        for no in self.nos:
+            no.blockchain.dificuldade = dificuldade
+        self.mineiros = self.nos[:mineiros]
+
+        self.chegadas = collections.defaultdict(dict)  # hash -> {índice do nó: instante em que o viu}
+        self.blocos = {}                                # hash -> Bloco (todos os vistos, forks incluídos)
+        self.submetidas = {}                            # id da transação -> instante em que foi criada
+        self.recusadas = 0
+        self._vistos = [set() for _ in self.nos]
+        self._altura_inicial = 0
+        self._monitorando = False
+        self._monitor = None
+        self._inicio = None
+        self._fim_carga = None
+        self._fim = None
+
+    @staticmethod
+    def endereco(no):
+        return f"{no.host}:{no.porta}"
+
+    def _financiar(self):
+        """ Um bloco de recompensa por nó, igual em todos, antes de os ligar à rede. """
+        anterior = self.nos[0].blockchain.obter_ultimo_bloco()
+        for no in self.nos:
+            bloco = Bloco(anterior.indice + 1, anterior.hash, [Transacao("sistema", self.endereco(no), SALDO_INICIAL)])
+            bloco.minerar(no.blockchain.dificuldade)
+            for destino in self.nos:
+                destino.blockchain.adicionar_bloco(bloco)
+            anterior = bloco
+        self._altura_inicial = anterior.indice
+
+    def iniciar(self):
+        self._financiar()
+        for indice, no in enumerate(self.nos):
+            self._vistos[indice].update(bloco.hash for bloco in no.blockchain.corrente)
+        for no in self.nos:
+            no.iniciar()
+        self._monitorando = True
+        self._monitor = threading.Thread(target=self._ciclo_monitor, daemon=True)
+        self._monitor.start()
+        for no in self.mineiros:
+            no.iniciar_mineracao()
+        self._inicio = time.perf_counter()
+
+    def parar(self):
+        """ Desliga o monitor e os nós; as correntes ficam em memória para o relatorio(). """
+        self._fim = time.perf_counter()
+        self._monitorando = False
+        if self._monitor is not None:
+            self._monitor.join(timeout=2)
+        for no in self.nos:
+            no.parar()
+
+    # --- MONITOR ---
+
+    def _ciclo_monitor(self):
+        while self._monitorando:
+            self._observar()
+            time.sleep(INTERVALO_MONITOR)
+
+    def _observar(self):
+        """ Regista os blocos que apareceram em cada nó desde a última volta (na corrente ou em ramos laterais). """
+        for indice, no in enumerate(self.nos):
+            vistos = self._vistos[indice]
+            with no.trava_seguranca:
+                corrente = no.blockchain.corrente
+                novos = []
+                altura = len(corrente) - 1
+                while altura >= 0 and corrente[altura].hash not in vistos:
+                    novos.append(corrente[altura])
+                    altura -= 1
+                novos += [no.blockchain.arvore.obter(h) for h in list(no.blockchain.arvore.blocos) if h not in vistos]
+            agora = time.perf_counter()
+            for bloco in novos:
+                vistos.add(bloco.hash)
+                self.blocos.setdefault(bloco.hash, bloco)
+                self.chegadas[bloco.hash].setdefault(indice, agora)
+
+    # --- CARGA ---
+
+    def gerar_carga(self, taxa, duracao, semente=None):
+        """ Cria 'taxa' transações por segundo durante 'duracao' segundos, cada uma num nó diferente
+        (à vez) e para um destino ao acaso. Se o processo não aguentar o ritmo, as que ficaram para
+        trás não são recuperadas em rajada: a taxa real aparece no relatório. """
+        aleatorio = random.Random(semente)
+        intervalo = 1.0 / taxa
+        inicio = time.perf_counter()
+        proxima = inicio
+        i = 0
+        while True:
+            agora = time.perf_counter()
+            if agora - inicio >= duracao:
+                break
+            if agora < proxima:
+                time.sleep(proxima - agora)
+                continue
+            no = self.nos[i % len(self.nos)]
+            destino = self.nos[aleatorio.randrange(len(self.nos))]
+            tx = no.nova_transacao(self.endereco(no), self.endereco(destino), VALOR_TRANSACAO)
+            if tx is None:
+                self.recusadas += 1
+            else:
+                self.submetidas[tx.id] = time.perf_counter()
+            i += 1
+            proxima = max(proxima + intervalo, time.perf_counter() - intervalo)
+        self._fim_carga = time.perf_counter()
+
+    def esperar_confirmacoes(self, limite_segundos=30.0):
+        """ Depois da carga, espera que todas as transações estejam num bloco que já chegou a todos
+        os nós (ou até ao limite). Devolve True se conseguiu. """
+        limite = time.perf_counter() + limite_segundos
+        while time.perf_counter() < limite:
+            if self._por_confirmar() == 0:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _corrente_final(self):
+        """ Corrente mais comprida entre os nós (com a dificuldade fixa, é a de mais trabalho). """
+        melhor = max(self.nos, key=lambda no: len(no.blockchain.corrente))
+        with melhor.trava_seguranca:
+            return list(melhor.blockchain.corrente)
+
+    def _bloco_de_cada_transacao(self, corrente):
+        return {tx.id: bloco.hash for bloco in corrente[self._altura_inicial + 1:] for tx in bloco.transacoes}
+
+    def _por_confirmar(self):
+        blocos = self._bloco_de_cada_transacao(self._corrente_final())
+        todos = len(self.nos)
+        return sum(1 for tx_id in list(self.submetidas)
+                   if tx_id not in blocos or len(self.chegadas.get(blocos[tx_id], ())) < todos)
+
+    # --- RELATÓRIO ---
+
+    def relatorio(self):
+        """ Métricas da execução (tempos em milissegundos), normalmente depois do parar().
+        Os instantes vêm do monitor, por isso têm a resolução de INTERVALO_MONITOR. """
+        self._observar()
+        fim = self._fim or time.perf_counter()
+        duracao_carga = (self._fim_carga or fim) - self._inicio
+        corrente = self._corrente_final()
+        na_corrente = {bloco.hash for bloco in corrente[self._altura_inicial + 1:]}
+        todos = len(self.nos)
+
+        latencias = []
+        bloco_da_tx = self._bloco_de_cada_transacao(corrente)
+        for tx_id, criada in list(self.submetidas.items()):
+            chegadas = self.chegadas.get(bloco_da_tx.get(tx_id), {})
+            if len(chegadas) == todos:
+                latencias.append(max(max(chegadas.values()) - criada, 0.0))
+
+        propagacao = [max(c.values()) - min(c.values()) for c in self.chegadas.values() if len(c) == todos]
+        novos = [h for h in self.chegadas if h in self.blocos and self.blocos[h].indice > self._altura_inicial]
+        orfaos = len([h for h in novos if h not in na_corrente])
+        mensagens = sum(self.mensagens, collections.Counter())
+
+        return {
+            "nos": todos,
+            "topologia": self.topologia,
+            "mineiros": len(self.mineiros),
+            "duracao_s": round(fim - self._inicio, 3),
+            "transacoes": {
+                "submetidas": len(self.submetidas),
+                "recusadas": self.recusadas,
+                "taxa_real_por_s": round(len(self.submetidas) / duracao_carga, 1) if duracao_carga > 0 else 0.0,
+                "confirmadas": len(latencias),
+                "latencia_confirmacao_ms": _resumo(latencias),
+            },
+            "blocos": {
+                "vistos": len(novos),
+                "na_corrente": len(na_corrente),
+                "orfaos": orfaos,
+                "taxa_forks": round(orfaos / len(novos), 4) if novos else 0.0,
+                "reorganizacoes": sum(no.blockchain.reorganizacoes for no in self.nos),
+                "propagacao_ms": _resumo(propagacao),
+            },
+            "mensagens": {
+                "total": sum(mensagens.values()),
+                "por_s": round(sum(mensagens.values()) / (fim - self._inicio), 1),
+                "por_tipo": dict(mensagens.most_common()),
+            },
+        }
+
+
+def _contar_mensagens(ao_receber, contador):
+    """ Envolve o ao_receber do nó para contar as mensagens que lhe são entregues, por tipo. """
+    trava = threading.Lock()  # As mensagens de um nó chegam pelo loop e pela thread de tratamento
+
+    def contar(mensagem, endereco):
+        with trava:
+            contador[mensagem.get('type')] += 1
+        return ao_receber(mensagem, endereco)
+    return contar
+
+
+def _resumo(segundos):
+    """ Mediana, percentil 90 e máximo em milissegundos (None se não houver amostras). """
+    if not segundos:
+        return None
+    ordenados = sorted(segundos)
+    def percentil(p):
+        return round(ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))] * 1000, 2)
+    return {"mediana": percentil(0.5), "p90": percentil(0.9), "max": round(ordenados[-1] * 1000, 2)}
+
+
+def simular(args):
+    """ Monta o cluster, aplica a carga, espera pelas confirmações e devolve o relatório. """
+    cluster = Cluster(args.nos, args.topologia, args.mineiros, args.dificuldade, memoria=args.memoria,
+                      latencia=args.latencia / 1000, variacao=args.variacao / 1000,
+                      porta_inicial=args.porta_inicial, grau=args.grau, semente=args.semente)
+    if args.rastreio:
+        rastreador.iniciar()
+    try:
+        cluster.iniciar()
+        if args.perfil:
+            rastreador.perfilar(args.perfil, args.duracao, AMOSTRAGEM_PERFIL)
+        cluster.gerar_carga(args.taxa, args.duracao, args.semente)
+        cluster.esperar_confirmacoes(args.espera)
+    finally:
+        cluster.parar()
+    if args.rastreio:
+        rastreador.parar()
+        rastreador.gravar(args.rastreio)
+    return cluster.relatorio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simular vários nós num só processo e medir a rede sob carga")
+    parser.add_argument("--nos", type=int, default=4)
+    parser.add_argument("--topologia", choices=TOPOLOGIAS, default="completa")
+    parser.add_argument("--grau", type=int, default=3, help="Vizinhos médios por nó na topologia aleatória")
+    parser.add_argument("--mineiros", type=int, default=1, help="Os primeiros N nós mineram")
+    parser.add_argument("--dificuldade", type=int, default=4)
+    parser.add_argument("--taxa", type=float, default=20.0, help="Transações por segundo")
+    parser.add_argument("--duracao", type=float, default=10.0, help="Segundos de carga")
+    parser.add_argument("--espera", type=float, default=30.0,
+                        help="Segundos, no fim da carga, à espera que tudo seja confirmado")
+    parser.add_argument("--memoria", action="store_true", help="Usar a rede em memória em vez de portas locais")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latência de cada entrega na rede em memória (ms)")
+    parser.add_argument("--variacao", type=float, default=0.0, help="Latência extra aleatória até este valor (ms)")
+    parser.add_argument("--porta-inicial", type=int, default=7300)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--log", choices=NIVEIS_LOG, default="ERROR", help="Nível das mensagens dos nós")
+    parser.add_argument("--json", help="Gravar o relatório neste ficheiro JSON")
+    parser.add_argument("--rastreio", help="Gravar um trace Chrome (JSON) de toda a simulação neste ficheiro")
+    parser.add_argument("--perfil", help="Gravar uma amostra cProfile do período de carga neste ficheiro (.prof)")
+    args = parser.parse_args()
+    configurar_logging(args.log)
+    if not 0 < args.mineiros <= args.nos:
+        parser.error("--mineiros tem de estar entre 1 e --nos")
+
+    relatorio = simular(args)
+    tx, blocos, mensagens = relatorio["transacoes"], relatorio["blocos"], relatorio["mensagens"]
+    print(f"🖧  {relatorio['nos']} nós ({relatorio['topologia']}), {relatorio['mineiros']} mineiro(s), "
+          f"{relatorio['duracao_s']:.1f} s")
+    print(f"💸 Transações: {tx['submetidas']} criadas ({tx['taxa_real_por_s']}/s), {tx['recusadas']} recusadas, "
+          f"{tx['confirmadas']} confirmadas em todos os nós")
+    print(f"   Latência de confirmação (ms): {tx['latencia_confirmacao_ms']}")
+    print(f"📦 Blocos: {blocos['vistos']} vistos, {blocos['na_corrente']} na corrente, {blocos['orfaos']} órfãos "
+          f"(forks {blocos['taxa_forks']:.1%}), {blocos['reorganizacoes']} reorganizações")
+    print(f"   Propagação (ms): {blocos['propagacao_ms']}")
+    print(f"📨 Mensagens: {mensagens['total']} ({mensagens['por_s']}/s)")
+    for tipo, quantidade in mensagens["por_tipo"].items():
+        print(f"   {tipo:<16} {quantidade:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as ficheiro:
+            json.dump(relatorio, ficheiro, indent=2)
+        print(f"\n💾 Relatório gravado em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
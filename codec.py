@@ -0,0 +1,326 @@
+""" Codificação binária das mensagens da rede, alternativa ao JSON.
+
+Representa a mesma árvore de dicionários/listas que o JSON, mas:
+- hashes (64 caracteres hexadecimais) vão como 32 bytes;
+- inteiros como varints e floats como double de 8 bytes (o tipo e o valor voltam exatamente iguais,
+  por isso os hashes calculados sobre o conteúdo não mudam);
+- cada texto curto (chaves, endereços) é escrito uma vez por mensagem e depois referido por índice;
+- listas de dicionários com as mesmas chaves (blocos, transações, cabeçalhos) vão em colunas, e as
+  colunas só de hashes, floats ou inteiros são lidas de uma vez com bytes.hex() / struct.
+Corpos grandes podem ainda ser comprimidos com zlib. """
+
+import struct
+import zlib
+from itertools import repeat
+
+# Primeiro byte do corpo: o JSON começa sempre por '{', por isso os dois formatos distinguem-se sozinhos
+FORMATO_BINARIO = 0x00
+FORMATO_BINARIO_ZLIB = 0x01
+# Corpos maiores do que isto são comprimidos (se ficarem de facto mais pequenos)
+LIMIAR_COMPRESSAO = 1024
+NIVEL_COMPRESSAO = 1
+# Só os textos até este tamanho entram na tabela de textos repetidos
+MAX_TEXTO_INTERNADO = 100
+
+_NADA, _FALSO, _VERDADEIRO, _INTEIRO, _FLOAT, _TEXTO, _REFERENCIA, _HASH, _LISTA, _DICIONARIO, _TABELA = range(11)
+_COLUNA_GERAL, _COLUNA_HASH, _COLUNA_FLOAT, _COLUNA_INTEIRO, _COLUNA_TEXTO, _COLUNA_TABELAS = range(6)
+
+_DOUBLE = struct.Struct('>d')
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class ErroCodec(ValueError):
+    """ Corpo binário mal formado. """
+
+
+def _e_hash(valor):
+    """ Um hash é exatamente 64 caracteres hexadecimais minúsculos (o que o hexdigest produz). """
+    if len(valor) != 64:
+        return False
+    try:
+        return bytes.fromhex(valor).hex() == valor
+    except ValueError:
+        return False
+
+
+class _Codificador:
+    def __init__(self):
+        self.partes = bytearray()
+        self.textos = {}  # texto -> índice na tabela desta mensagem
+
+    def varint(self, n):
+        partes = self.partes
+        while n > 0x7F:
+            partes.append((n & 0x7F) | 0x80)
+            n >>= 7
+        partes.append(n)
+
+    def inteiro(self, n):
+        # zigzag: negativos pequenos também ficam com poucos bytes
+        self.varint(n * 2 if n >= 0 else -n * 2 - 1)
+
+    def texto(self, valor):
+        indice = self.textos.get(valor)
+        if indice is not None:
+            self.partes.append(_REFERENCIA)
+            self.varint(indice)
+            return
+        if _e_hash(valor):
+            self.partes.append(_HASH)
+            self.partes += bytes.fromhex(valor)
+            return
+        dados = valor.encode('utf-8')
+        self.partes.append(_TEXTO)
+        self.varint(len(dados))
+        self.partes += dados
+        if len(valor) <= MAX_TEXTO_INTERNADO:
+            self.textos[valor] = len(self.textos)
+
+    def valor(self, valor):
+        tipo = type(valor)
+        if tipo is str:
+            self.texto(valor)
+        elif tipo is dict:
+            self.partes.append(_DICIONARIO)
+            self.varint(len(valor))
+            for chave, v in valor.items():
+                self.texto(str(chave))
+                self.valor(v)
+        elif tipo is list or tipo is tuple:
+            if len(valor) > 1 and self.tabela(valor):
+                return
+            self.partes.append(_LISTA)
+            self.varint(len(valor))
+            for v in valor:
+                self.valor(v)
+        elif tipo is bool:
+            self.partes.append(_VERDADEIRO if valor else _FALSO)
+        elif tipo is int:
+            self.partes.append(_INTEIRO)
+            self.inteiro(valor)
+        elif tipo is float:
+            self.partes.append(_FLOAT)
+            self.partes += _DOUBLE.pack(valor)
+        elif valor is None:
+            self.partes.append(_NADA)
+        else:
+            raise ErroCodec(f"Tipo não suportado: {tipo.__name__}")
+
+    def tabela(self, linhas):
+        """ Lista de dicionários: escreve-se coluna a coluna, um troço por cada sequência de
+        dicionários com as mesmas chaves (ex: blocos de versões diferentes na mesma corrente). """
+        trocos = _trocos(linhas)
+        if trocos is None or 2 * len(trocos) > len(linhas):
+            return False
+        self.partes.append(_TABELA)
+        self.trocos(trocos)
+        return True
+
+    def trocos(self, trocos):
+        self.varint(len(trocos))
+        for chaves, linhas in trocos:
+            self.varint(len(linhas))
+            self.varint(len(chaves))
+            for chave in chaves:
+                self.texto(str(chave))
+            for chave in chaves:
+                self.coluna([linha[chave] for linha in linhas])
+
+    def coluna(self, valores):
+        tipos = {type(v) for v in valores}
+        if tipos == {str}:
+            if all(_e_hash(v) for v in valores):
+                self.partes.append(_COLUNA_HASH)
+                self.partes += bytes.fromhex(''.join(valores))
+                return
+            distintos = dict.fromkeys(valores)
+            if len(distintos) <= 0xFFFF and all(len(v) <= MAX_TEXTO_INTERNADO for v in distintos):
+                # Poucos valores diferentes (endereços, "sistema"): cada um uma vez e depois só os índices
+                self.partes.append(_COLUNA_TEXTO)
+                self.varint(len(distintos))
+                for i, v in enumerate(distintos):
+                    self.texto(v)
+                    distintos[v] = i
+                formato = 'B' if len(distintos) <= 0x100 else 'H'
+                self.partes.append(ord(formato))
+                self.partes += struct.pack(f'>{len(valores)}{formato}', *[distintos[v] for v in valores])
+                return
+        elif tipos == {float}:
+            self.partes.append(_COLUNA_FLOAT)
+            self.partes += struct.pack(f'>{len(valores)}d', *valores)
+            return
+        elif tipos == {int} and all(_INT64_MIN <= v <= _INT64_MAX for v in valores):
+            self.partes.append(_COLUNA_INTEIRO)
+            self.partes += struct.pack(f'>{len(valores)}q', *valores)
+            return
+        elif tipos == {list}:
+            # Listas de dicionários dentro de uma tabela (as transações de cada bloco) vão todas
+            # numa única tabela, com o tamanho de cada lista à parte
+            linhas = [linha for lista in valores for linha in lista]
+            trocos = _trocos(linhas) if linhas else None
+            if trocos is not None and 2 * len(trocos) <= len(linhas):
+                self.partes.append(_COLUNA_TABELAS)
+                self.partes += struct.pack(f'>{len(valores)}I', *[len(lista) for lista in valores])
+                self.trocos(trocos)
+                return
+
+        self.partes.append(_COLUNA_GERAL)
+        for v in valores:
+            self.valor(v)
+
+
+def _trocos(linhas):
+    """ Divide a lista em troços seguidos de dicionários com as mesmas chaves (pela mesma ordem):
+    [(chaves, dicionários), ...], ou None se houver elementos que não são dicionários. """
+    trocos = []
+    chaves = None
+    for linha in linhas:
+        if type(linha) is not dict:
+            return None
+        if chaves is None or len(linha) != len(chaves) or list(linha) != chaves:
+            chaves = list(linha)
+            trocos.append((chaves, []))
+        trocos[-1][1].append(linha)
+    return trocos
+
+
+class _Descodificador:
+    def __init__(self, dados):
+        self.dados = dados
+        self.pos = 0
+        self.textos = []
+
+    def byte(self):
+        b = self.dados[self.pos]
+        self.pos += 1
+        return b
+
+    def varint(self):
+        dados, pos = self.dados, self.pos
+        resultado, deslocamento = 0, 0
+        while True:
+            b = dados[pos]
+            pos += 1
+            resultado |= (b & 0x7F) << deslocamento
+            if b < 0x80:
+                self.pos = pos
+                return resultado
+            deslocamento += 7
+
+    def bytes(self, n):
+        inicio = self.pos
+        self.pos += n
+        if self.pos > len(self.dados):
+            raise ErroCodec("Corpo binário truncado")
+        return self.dados[inicio:self.pos]
+
+    def valor(self):
+        tag = self.byte()
+        if tag == _REFERENCIA:
+            return self.textos[self.varint()]
+        if tag == _HASH:
+            return self.bytes(32).hex()
+        if tag == _TEXTO:
+            valor = str(self.bytes(self.varint()), 'utf-8')
+            if len(valor) <= MAX_TEXTO_INTERNADO:
+                self.textos.append(valor)
+            return valor
+        if tag == _INTEIRO:
+            n = self.varint()
+            return n >> 1 if not n & 1 else -(n >> 1) - 1
+        if tag == _FLOAT:
+            return _DOUBLE.unpack(self.bytes(8))[0]
+        if tag == _DICIONARIO:
+            resultado = {}
+            for _ in range(self.varint()):
+                chave = self.valor()
+                resultado[chave] = self.valor()
+            return resultado
+        if tag == _LISTA:
+            return [self.valor() for _ in range(self.varint())]
+        if tag == _TABELA:
+            return self.tabela()
+        if tag == _NADA:
+            return None
+        if tag == _VERDADEIRO:
+            return True
+        if tag == _FALSO:
+            return False
+        raise ErroCodec(f"Etiqueta desconhecida: {tag}")
+
+    def tabela(self):
+        linhas = []
+        for _ in range(self.varint()):
+            n = self.varint()
+            chaves = [self.valor() for _ in range(self.varint())]
+            colunas = [self.coluna(n) for _ in chaves]
+            linhas += map(dict, map(zip, repeat(chaves), zip(*colunas)))
+        return linhas
+
+    def coluna(self, n):
+        tipo = self.byte()
+        if tipo == _COLUNA_HASH:
+            texto = self.bytes(32 * n).hex()
+            return [texto[i:i + 64] for i in range(0, 64 * n, 64)]
+        if tipo == _COLUNA_TEXTO:
+            distintos = [self.valor() for _ in range(self.varint())]
+            formato = chr(self.byte())
+            if formato not in 'BH':
+                raise ErroCodec(f"Índices de texto inválidos: {formato!r}")
+            indices = struct.unpack(f'>{n}{formato}', self.bytes(struct.calcsize(formato) * n))
+            return [distintos[i] for i in indices]
+        if tipo == _COLUNA_FLOAT:
+            return list(struct.unpack(f'>{n}d', self.bytes(8 * n)))
+        if tipo == _COLUNA_INTEIRO:
+            return list(struct.unpack(f'>{n}q', self.bytes(8 * n)))
+        if tipo == _COLUNA_TABELAS:
+            tamanhos = struct.unpack(f'>{n}I', self.bytes(4 * n))
+            linhas = self.tabela()
+            listas, inicio = [], 0
+            for tamanho in tamanhos:
+                listas.append(linhas[inicio:inicio + tamanho])
+                inicio += tamanho
+            return listas
+        if tipo == _COLUNA_GERAL:
+            return [self.valor() for _ in range(n)]
+        raise ErroCodec(f"Tipo de coluna desconhecido: {tipo}")
+
+
+def codificar(mensagem, comprimir=True):
+    """ Corpo binário da mensagem (o primeiro byte diz se vai comprimido). """
+    codificador = _Codificador()
+    codificador.valor(mensagem)
+    corpo = bytes(codificador.partes)
+    if comprimir and len(corpo) > LIMIAR_COMPRESSAO:
+        comprimido = zlib.compress(corpo, NIVEL_COMPRESSAO)
+        if len(comprimido) < len(corpo):
+            return bytes([FORMATO_BINARIO_ZLIB]) + comprimido
+    return bytes([FORMATO_BINARIO]) + corpo
+
+
+def _descomprimir(dados, tamanho_maximo):
+    """ Descomprime sem nunca produzir mais do que 'tamanho_maximo' bytes (None: sem limite);
+    sem isto uma trama pequena podia expandir-se em centenas de MB. """
+    descompressor = zlib.decompressobj()
+    resultado = descompressor.decompress(dados, tamanho_maximo or 0)
+    if descompressor.unconsumed_tail:
+        raise ErroCodec(f"Corpo descomprimido excede o máximo de {tamanho_maximo} bytes")
+    if not descompressor.eof:
+        raise ErroCodec("Corpo comprimido incompleto")
+    return resultado
+
+
+def descodificar(corpo, tamanho_maximo=None):
+    """ Inverso do codificar(); aceita bytes, bytearray ou memoryview.
+    Vindo da rede, 'tamanho_maximo' deve ser o mesmo limite das tramas (ver framing). """
+    formato = corpo[0]
+    try:
+        if formato == FORMATO_BINARIO_ZLIB:
+            dados = _descomprimir(corpo[1:], tamanho_maximo)
+        elif formato == FORMATO_BINARIO:
+            dados = bytes(corpo[1:])
+        else:
+            raise ErroCodec(f"Formato desconhecido: {formato}")
+        return _Descodificador(dados).valor()
+    except (IndexError, TypeError, struct.error, UnicodeDecodeError, zlib.error) as e:
+        raise ErroCodec(f"Corpo binário inválido: {e}") from e
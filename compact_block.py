@@ -0,0 +1,64 @@
+from block import Bloco
+from transaction import Transacao
+
+# Caracteres hexadecimais do id da transação usados como id curto (48 bits)
+TAMANHO_ID_CURTO = 12
+
+
+def id_curto(tx_id):
+    """ Prefixo do id da transação que identifica a transação num bloco compacto. """
+    return tx_id[:TAMANHO_ID_CURTO]
+
+
+def criar_bloco_compacto(bloco):
+    """ Versão compacta de um bloco para espalhar na rede: o cabeçalho, os ids curtos das transações
+    e, por inteiro, só as que os vizinhos não podem ter no mempool (a recompensa do minerador). """
+    ids_curtos, pre_preenchidas = [], []
+    for posicao, tx in enumerate(bloco.transacoes):
+        dados = tx.formatar_para_dict()
+        if dados.get("origem") == "sistema":
+            pre_preenchidas.append([posicao, dados])
+            ids_curtos.append(None)
+        else:
+            ids_curtos.append(id_curto(dados["id"]))
+    return {"header": bloco.formatar_cabecalho(), "short_ids": ids_curtos, "prefilled": pre_preenchidas}
+
+
+class BlocoParcial:
+    """ Bloco compacto a ser reconstruído com as transações do nosso mempool.
+    As posições que não se conseguiram preencher ficam em 'em_falta' até chegar o BLOCK_TXN. """
+
+    def __init__(self, dados, mempool):
+        self.cabecalho = dados.get("header", {})
+        ids_curtos = dados.get("short_ids", [])
+        self.transacoes = [None] * len(ids_curtos)
+
+        for posicao, tx in dados.get("prefilled", []):
+            if 0 <= posicao < len(self.transacoes):
+                self.transacoes[posicao] = Transacao.restaurar_de_dict(tx)
+        for posicao, curto in enumerate(ids_curtos):
+            if self.transacoes[posicao] is None and curto is not None:
+                self.transacoes[posicao] = mempool.procurar_id_curto(curto)
+
+        self.em_falta = [p for p, tx in enumerate(self.transacoes) if tx is None]
+
+    @property
+    def hash(self):
+        return self.cabecalho.get("hash")
+
+    @property
+    def completo(self):
+        return not self.em_falta
+
+    def preencher(self, transacoes):
+        """ Coloca nas posições em falta as transações recebidas (pela mesma ordem em que foram pedidas). """
+        if len(transacoes) != len(self.em_falta):
+            return False
+        for posicao, tx in zip(self.em_falta, transacoes):
+            self.transacoes[posicao] = Transacao.restaurar_de_dict(tx)
+        self.em_falta = []
+        return True
+
+    def montar(self):
+        """ Bloco completo; o hash declarado é conferido depois, pelo adicionar_bloco. """
+        return Bloco.restaurar_de_dict(dict(self.cabecalho, transactions=self.transacoes))
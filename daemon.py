@@ -0,0 +1,336 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from metrics import configurar_logging, NIVEIS_LOG
+from tracing import rastreador, instalar_sinais, SEGUNDOS_PERFIL, AMOSTRAGEM_PERFIL
+
+log = logging.getLogger(__name__)
+
+# Valores por omissão de cada opção; o ficheiro de configuração (JSON) usa as mesmas chaves
+CONFIGURACAO_PADRAO = {
+    "ip": "localhost",
+    "porta": None,
+    "conectar": [],               # ["host:porta", ...] ou "host:porta,host:porta"
+    "dados": None,                # Pasta onde guardar a corrente entre reinícios
+    "minerar": False,
+    "processos_mineracao": None,  # None = um por núcleo
+    "controlo": None,             # Caminho do socket Unix (ou "host:porta" em TCP); None = um na pasta temporária
+    "interface": False,
+    "log": "INFO",
+    "rastreio": None,             # Pasta para os traces/perfis pedidos por sinal ou pelo controlo
+}
+# Tempo máximo à espera de uma resposta no socket de controlo
+TIMEOUT_CONTROLO = 10
+
+
+def ler_configuracao(caminho=None, opcoes=None):
+    """ Junta, por esta ordem de prioridade: as opções da linha de comandos que foram dadas,
+    o ficheiro de configuração e os valores por omissão. Levanta ValueError com chaves desconhecidas. """
+    configuracao = dict(CONFIGURACAO_PADRAO)
+    if caminho:
+        with open(caminho, encoding="utf-8") as ficheiro:
+            do_ficheiro = json.load(ficheiro)
+        desconhecidas = set(do_ficheiro) - set(CONFIGURACAO_PADRAO)
+        if desconhecidas:
+            raise ValueError(f"Opções desconhecidas em {caminho}: {', '.join(sorted(desconhecidas))}")
+        configuracao.update(do_ficheiro)
+    configuracao.update({chave: valor for chave, valor in (opcoes or {}).items() if valor is not None})
+    if configuracao["porta"] is None:
+        raise ValueError("Falta a porta do nó (--porta ou \"porta\" no ficheiro de configuração)")
+    if configuracao["controlo"] is None:
+        configuracao["controlo"] = endereco_controlo_padrao(configuracao["porta"])
+    return configuracao
+
+
+def ler_vizinhos(valor):
+    """ Lista de vizinhos como conjunto de (host, porta); aceita "a:1,b:2" ou ["a:1", "b:2"]. """
+    if isinstance(valor, str):
+        valor = [parte for parte in valor.split(',') if parte.strip()]
+    vizinhos = set()
+    for texto in valor or []:
+        host, porta = texto.strip().rsplit(':', 1)
+        vizinhos.add((host, int(porta)))
+    return vizinhos
+
+
+def endereco_controlo_padrao(porta):
+    if hasattr(socket, "AF_UNIX"):
+        return os.path.join(tempfile.gettempdir(), f"blockchain-{porta}.sock")
+    return f"127.0.0.1:{int(porta) + 1000}"
+
+
+def _endereco_tcp(controlo):
+    """ (host, porta) se o controlo for "host:porta", senão None (é um caminho de socket Unix). """
+    host, separador, porta = controlo.rpartition(':')
+    if separador and porta.isdigit() and os.sep not in controlo:
+        return host, int(porta)
+    return None
+
+
+# --- SOCKET DE CONTROLO ---
+
+class _PedidoControlo(socketserver.StreamRequestHandler):
+    """ Uma linha JSON por comando, uma linha JSON por resposta, enquanto a ligação durar. """
+
+    def handle(self):
+        for linha in self.rfile:
+            if not linha.strip():
+                continue
+            try:
+                pedido = json.loads(linha)
+                resposta = self.server.daemon_no.executar(pedido.pop("comando", None), **pedido)
+            except Exception as e:
+                resposta = {"erro": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(resposta, default=str).encode('utf-8') + b"\n")
+
+
+class _ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ServidorTCP(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class DaemonNo:
+    """ Um NoDaRede sem interface: arranca com a configuração, responde aos comandos do socket de
+    controlo (saldo, enviar, minerar, estado...) e desliga-se com SIGTERM/SIGINT ou com o comando "parar".
+    O socket é local (Unix, só para o dono do processo; ou TCP em 127.0.0.1 onde não há sockets Unix). """
+
+    def __init__(self, configuracao):
+        from node import NoDaRede
+        self.configuracao = configuracao
+        self.no = NoDaRede(configuracao["ip"], configuracao["porta"], ler_vizinhos(configuracao["conectar"]),
+                           processos_mineracao=configuracao["processos_mineracao"], pasta_dados=configuracao["dados"])
+        self.parado = threading.Event()
+        self._servidor = None
+
+    @property
+    def endereco(self):
+        return f"{self.no.host}:{self.no.porta}"
+
+    def iniciar(self):
+        self.no.iniciar()
+        if self.configuracao["minerar"]:
+            self.no.iniciar_mineracao()
+        self._abrir_controlo(self.configuracao["controlo"])
+        log.info("🛰️  Controlo em %s", self.configuracao["controlo"])
+
+    def _abrir_controlo(self, controlo):
+        tcp = _endereco_tcp(controlo)
+        if tcp is not None:
+            self._servidor = _ServidorTCP(tcp, _PedidoControlo)
+        else:
+            if os.path.exists(controlo):
+                os.unlink(controlo)  # Sobra de um arranque anterior que não terminou bem
+            mascara = os.umask(0o177)
+            try:
+                self._servidor = _ServidorUnix(controlo, _PedidoControlo)
+            finally:
+                os.umask(mascara)
+        self._servidor.daemon_no = self
+        # Intervalo curto: no encerramento, o shutdown() espera até ao fim do intervalo em curso
+        threading.Thread(target=self._servidor.serve_forever, args=(0.1,), name="controlo", daemon=True).start()
+
+    def esperar(self):
+        """ Bloqueia até alguém pedir para parar (sinal ou comando). """
+        while not self.parado.wait(1):
+            pass
+
+    def parar(self):
+        self.parado.set()
+
+    def encerrar(self):
+        """ Fecha o controlo e desliga o nó (a corrente fica gravada, se houver pasta de dados). """
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            if _endereco_tcp(self.configuracao["controlo"]) is None:
+                try:
+                    os.unlink(self.configuracao["controlo"])
+                except FileNotFoundError:
+                    pass
+        self.no.parar()
+        log.info("🛑 Nó %s desligado.", self.endereco)
+
+    # --- COMANDOS ---
+
+    def executar(self, comando, **argumentos):
+        funcao = getattr(self, f"_comando_{comando}", None) if isinstance(comando, str) else None
+        if funcao is None:
+            comandos = sorted(nome[len("_comando_"):] for nome in dir(self) if nome.startswith("_comando_"))
+            return {"erro": f"Comando desconhecido: {comando}", "comandos": comandos}
+        return funcao(**argumentos)
+
+    def _comando_estado(self):
+        with self.no.trava_seguranca:
+            ultimo = self.no.blockchain.obter_ultimo_bloco()
+            return {
+                "endereco": self.endereco,
+                "altura": ultimo.indice,
+                "ultimo_hash": ultimo.hash,
+                "mempool": len(self.no.blockchain.mempool),
+                "vizinhos": sorted(f"{h}:{p}" for h, p in self.no.vizinhos),
+                "minerando": self.no.minerando,
+            }
+
+    def _comando_saldo(self, endereco=None):
+        endereco = endereco or self.endereco
+        with self.no.trava_seguranca:
+            return {"endereco": endereco, "saldo": self.no.blockchain.consultar_saldo(endereco)}
+
+    def _comando_enviar(self, destino, valor):
+        tx = self.no.nova_transacao(self.endereco, destino, float(valor))
+        if tx is None:
+            return {"ok": False, "erro": "Saldo insuficiente ou dados inválidos"}
+        return {"ok": True, "id": tx.id}
+
+    def _comando_minerar(self, ligar=True):
+        if ligar:
+            self.no.iniciar_mineracao()
+        else:
+            self.no.parar_mineracao()
+        return {"minerando": self.no.minerando}
+
+    def _comando_estatisticas(self):
+        return self.no.estatisticas()
+
+    def _comando_rastreio(self, ligar=True, ficheiro=None):
+        """ Liga o rastreio; ao desligar, grava os spans em 'ficheiro' (trace Chrome). """
+        if ligar:
+            rastreador.iniciar()
+            return {"rastreio": True}
+        rastreador.parar()
+        resposta = {"rastreio": False}
+        if ficheiro:
+            resposta["spans"] = rastreador.gravar(ficheiro)
+        return resposta
+
+    def _comando_perfil(self, ficheiro, segundos=SEGUNDOS_PERFIL, amostragem=AMOSTRAGEM_PERFIL):
+        rastreador.perfilar(ficheiro, float(segundos), float(amostragem))
+        return {"perfil": ficheiro, "segundos": segundos}
+
+    def _comando_parar(self):
+        self.parar()
+        return {"parando": True}
+
+
+def pedir(controlo, comando, timeout=TIMEOUT_CONTROLO, **argumentos):
+    """ Envia um comando ao socket de controlo de um daemon e devolve a resposta (dicionário). """
+    tcp = _endereco_tcp(controlo)
+    if tcp is not None:
+        sock = socket.create_connection(tcp, timeout=timeout)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(controlo)
+    with sock, sock.makefile('rwb') as canal:
+        canal.write(json.dumps(dict(argumentos, comando=comando)).encode('utf-8') + b"\n")
+        canal.flush()
+        linha = canal.readline()
+    if not linha:
+        raise ConnectionError(f"O daemon em {controlo} fechou a ligação sem responder")
+    return json.loads(linha)
+
+
+# --- LINHA DE COMANDOS ---
+
+def _correr(args):
+    opcoes = {chave: getattr(args, chave) for chave in CONFIGURACAO_PADRAO if hasattr(args, chave)}
+    try:
+        configuracao = ler_configuracao(args.config, opcoes)
+        ler_vizinhos(configuracao["conectar"])
+    except (OSError, ValueError) as e:
+        print(f"❌ Configuração inválida: {e}")
+        sys.exit(1)
+    configurar_logging(configuracao["log"])
+    if configuracao["rastreio"]:
+        instalar_sinais(configuracao["rastreio"])
+
+    daemon = DaemonNo(configuracao)
+    # Os sinais só ativam o evento: o encerramento corre na thread principal, fora do handler
+    signal.signal(signal.SIGTERM, lambda numero, quadro: daemon.parar())
+    signal.signal(signal.SIGINT, lambda numero, quadro: daemon.parar())
+    daemon.iniciar()
+    try:
+        if configuracao["interface"]:
+            # Só aqui se carrega o Tk: sem --interface o nó arranca num servidor sem ecrã
+            from interface import BlockchainGUI
+            app = BlockchainGUI(daemon.no)
+            app.protocol("WM_DELETE_WINDOW", lambda: (daemon.parar(), app.destroy()))
+
+            def _vigiar():
+                # Um sinal ou o comando "parar" também fecham a janela
+                if daemon.parado.is_set():
+                    app.destroy()
+                else:
+                    app.after(500, _vigiar)
+            app.after(500, _vigiar)
+            app.mainloop()
+        else:
+            daemon.esperar()
+    finally:
+        daemon.encerrar()
+
+
+def _valor(texto):
+    """ 'chave=valor' da linha de comandos: números, true/false e null como em JSON, o resto como texto. """
+    chave, _, valor = texto.partition('=')
+    try:
+        return chave, json.loads(valor)
+    except ValueError:
+        return chave, valor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nó da rede blockchain sem interface (daemon)")
+    subcomandos = parser.add_subparsers(dest="acao", required=True)
+
+    correr = subcomandos.add_parser("correr", help="Arrancar o nó")
+    correr.add_argument("--config", help="Ficheiro JSON com as opções (as da linha de comandos têm prioridade)")
+    correr.add_argument("--ip")
+    correr.add_argument("--porta", type=int)
+    correr.add_argument("--conectar", help="Vizinhos iniciais (host:porta,host:porta)")
+    correr.add_argument("--dados", help="Pasta onde guardar a corrente entre reinícios")
+    correr.add_argument("--minerar", action="store_true", default=None, help="Começar já a minerar")
+    correr.add_argument("--processos-mineracao", type=int)
+    correr.add_argument("--controlo", help="Socket de controlo: caminho (Unix) ou host:porta (TCP local)")
+    correr.add_argument("--interface", action="store_true", default=None, help="Abrir também a interface gráfica")
+    correr.add_argument("--log", choices=NIVEIS_LOG)
+    correr.add_argument("--rastreio", metavar="PASTA",
+                        help="Aceitar SIGUSR1 (trace Chrome) e SIGUSR2 (perfil cProfile), gravados nesta pasta")
+
+    comando = subcomandos.add_parser("pedir", help="Enviar um comando a um nó em execução",
+                                     description="Ex: pedir saldo; pedir enviar destino=localhost:5001 valor=2.5")
+    comando.add_argument("comando", help="estado, saldo, enviar, minerar, estatisticas, rastreio, perfil, parar")
+    comando.add_argument("argumentos", nargs="*", type=_valor, help="chave=valor")
+    comando.add_argument("--controlo", help="Socket de controlo do nó")
+    comando.add_argument("--porta", type=int, help="Porta do nó (para usar o socket de controlo por omissão)")
+    args = parser.parse_args()
+
+    if args.acao == "correr":
+        _correr(args)
+        return
+    if not args.controlo and args.porta is None:
+        parser.error("indica --controlo ou --porta")
+    controlo = args.controlo or endereco_controlo_padrao(args.porta)
+    try:
+        resposta = pedir(controlo, args.comando, **dict(args.argumentos))
+    except OSError as e:
+        print(f"❌ Sem ligação ao controlo em {controlo}: {e}")
+        sys.exit(1)
+    print(json.dumps(resposta, indent=2, ensure_ascii=False))
+    if "erro" in resposta:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import json
+import struct
+import codec
+
+# Cada mensagem na rede é uma "trama": 4 bytes com o tamanho (big-endian) seguidos do corpo
+CABECALHO = struct.Struct('>I')
+# Tramas maiores do que isto são recusadas (protege a memória contra tamanhos absurdos).
+# A maior mensagem legítima é uma resposta BLOCKS, cortada a metade disto (ver sync.MAX_BYTES_POR_PEDIDO);
+# um bloco sozinho tem no máximo ~1 MB
+TAMANHO_MAXIMO_TRAMA = 16 * 1024 * 1024
+TAMANHO_INICIAL_BUFFER = 64 * 1024
+# Um corpo JSON começa sempre por '{'; qualquer outro primeiro byte é o formato binário do codec
+_INICIO_JSON = ord('{')
+
+
+class ErroTrama(ValueError):
+    """ A ligação enviou uma trama inválida (ex: maior do que o máximo permitido). """
+
+
+def codificar_mensagem(mensagem, binario=False):
+    """ Formato da rede: 4 bytes com o tamanho (big-endian) seguidos do JSON em UTF-8
+    ou, com 'binario' (só para vizinhos que o anunciaram), do formato binário do codec. """
+    corpo = codec.codificar(mensagem) if binario else json.dumps(mensagem).encode('utf-8')
+    return CABECALHO.pack(len(corpo)) + corpo
+
+
+def descodificar_mensagem(corpo, tamanho_maximo=TAMANHO_MAXIMO_TRAMA):
+    """ Lê a mensagem diretamente do buffer recebido (bytes, bytearray ou memoryview),
+    em JSON ou binário conforme o primeiro byte. Um corpo comprimido também não pode
+    passar de 'tamanho_maximo' depois de descomprimido. """
+    if len(corpo) and corpo[0] != _INICIO_JSON:
+        return codec.descodificar(corpo, tamanho_maximo)
+    return json.loads(str(corpo, 'utf-8'))
+
+
+class LeitorTramas:
+    """ Junta os bytes que chegam de uma ligação e separa-os em tramas completas.
+    Usa um único bytearray pré-alocado: os dados são escritos diretamente no espaço livre
+    (recv_into / BufferedProtocol) e as tramas são lidas como memoryview, sem cópias intermédias.
+    O buffer só cresce quando uma trama não cabe, e no máximo para o dobro de cada vez: o tamanho
+    anunciado no cabeçalho só é reservado à medida que os bytes chegam, e volta ao tamanho inicial
+    quando o que falta ler já lá cabe. Ler N bytes custa O(N). """
+
+    def __init__(self, tamanho_maximo=TAMANHO_MAXIMO_TRAMA, tamanho_inicial=TAMANHO_INICIAL_BUFFER):
+        self.tamanho_maximo = tamanho_maximo
+        self.tamanho_inicial = tamanho_inicial
+        self._buffer = bytearray(tamanho_inicial)
+        self._inicio = 0  # Primeiro byte ainda não consumido
+        self._fim = 0     # Fim dos dados recebidos
+
+    def espaco_livre(self):
+        """ Vista sobre o espaço livre do buffer, para ser preenchida com recv_into.
+        Depois de escrever, chamar avancar() com o número de bytes escritos. """
+        pendentes = self._fim - self._inicio
+        necessario = CABECALHO.size
+        if pendentes >= CABECALHO.size:
+            necessario = CABECALHO.size + CABECALHO.unpack_from(self._buffer, self._inicio)[0]
+
+        necessario = max(necessario, pendentes + 1)
+
+        if len(self._buffer) > self.tamanho_inicial and necessario <= self.tamanho_inicial:
+            # Passada a trama grande, o buffer não fica a ocupar memória enquanto a ligação durar
+            novo = bytearray(self.tamanho_inicial)
+            novo[:pendentes] = memoryview(self._buffer)[self._inicio:self._fim]
+            self._buffer = novo
+            self._inicio, self._fim = 0, pendentes
+
+        livre_no_fim = len(self._buffer) - self._fim
+
+        if self._inicio and livre_no_fim < max(necessario - pendentes, len(self._buffer) // 4):
+            # Traz o que falta consumir para o início; nunca copia mais do que uma trama incompleta
+            self._buffer[:pendentes] = self._buffer[self._inicio:self._fim]
+            self._inicio, self._fim = 0, pendentes
+
+        if len(self._buffer) - self._inicio < necessario:
+            # Um buffer novo (em vez de redimensionar) funciona mesmo com vistas antigas ainda vivas
+            novo = bytearray(max(pendentes + 1, min(necessario, 2 * len(self._buffer))))
+            novo[:pendentes] = memoryview(self._buffer)[self._inicio:self._fim]
+            self._buffer = novo
+            self._inicio, self._fim = 0, pendentes
+
+        return memoryview(self._buffer)[self._fim:]
+
+    def avancar(self, n):
+        self._fim += n
+
+    def alimentar(self, dados):
+        """ Acrescenta bytes já recebidos (para quem não consegue escrever diretamente no buffer). """
+        dados = memoryview(dados)
+        while dados:
+            livre = self.espaco_livre()
+            n = min(len(livre), len(dados))
+            livre[:n] = dados[:n]
+            self.avancar(n)
+            dados = dados[n:]
+
+    def tramas(self):
+        """ Devolve, uma a uma, as tramas completas já recebidas (como memoryview do corpo).
+        Cada vista só é válida até se pedir a seguinte. """
+        while self._fim - self._inicio >= CABECALHO.size:
+            tamanho = CABECALHO.unpack_from(self._buffer, self._inicio)[0]
+            if tamanho > self.tamanho_maximo:
+                raise ErroTrama(f"Trama de {tamanho} bytes excede o máximo de {self.tamanho_maximo}")
+            inicio_corpo = self._inicio + CABECALHO.size
+            if self._fim - inicio_corpo < tamanho:
+                break
+            self._inicio = inicio_corpo + tamanho
+            corpo = memoryview(self._buffer)[inicio_corpo:self._inicio]
+            try:
+                yield corpo
+            finally:
+                corpo.release()
+        if self._inicio == self._fim:
+            self._inicio = self._fim = 0
+
+
+def _receber_exato(sock, vista):
+    """ Preenche a vista inteira a partir do socket (um recv pode devolver só parte dos dados). """
+    while vista:
+        n = sock.recv_into(vista)
+        if n == 0:
+            return False
+        vista = vista[n:]
+    return True
+
+
+def receber_mensagem(sock, tamanho_maximo=TAMANHO_MAXIMO_TRAMA):
+    """ Lê uma mensagem completa de um socket bloqueante; devolve None se a ligação fechar. """
+    cabecalho = bytearray(CABECALHO.size)
+    if not _receber_exato(sock, memoryview(cabecalho)):
+        return None
+    tamanho = CABECALHO.unpack(cabecalho)[0]
+    if tamanho > tamanho_maximo:
+        raise ErroTrama(f"Trama de {tamanho} bytes excede o máximo de {tamanho_maximo}")
+    corpo = bytearray(tamanho)
+    if not _receber_exato(sock, memoryview(corpo)):
+        return None
+    return descodificar_mensagem(corpo, tamanho_maximo)
+
+
+def enviar_mensagem(sock, mensagem):
+    """ Escreve uma mensagem completa num socket bloqueante. """
+    sock.sendall(codificar_mensagem(mensagem))
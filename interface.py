@@ -2,6 +2,7 @@ import customtkinter as ctk
 import sys
 import argparse
 from node import NoDaRede
+from metrics import configurar_logging, NIVEIS_LOG
 
 # --- CONFIGURAÇÃO DO VISUAL ---
 # Define o estilo da janela: "Dark" (Escuro), "Light" (Claro) ou "System"
@@ -146,7 +147,6 @@ class BlockchainGUI(ctk.CTk):
             sucesso = self.meu_no.nova_transacao(meu_endereco, destino, valor)
             if sucesso:
                 self.lbl_status_tx.configure(text="✅ Transação colocada na fila de espera!", text_color="green")
-                self.meu_no.espalhar_mensagem('NEW_TRANSACTION', sucesso.formatar_para_dict())
                 # Limpa as caixas de texto
                 self.entrada_destino.delete(0, 'end')
                 self.entrada_valor.delete(0, 'end')
@@ -158,7 +158,7 @@ class BlockchainGUI(ctk.CTk):
     def alternar_mineracao(self):
         """ Liga ou desliga a mineração, e muda a cor do botão """
         if self.meu_no.minerando:
-            self.meu_no.minerando = False
+            self.meu_no.parar_mineracao()
             self.btn_minerar.configure(text="⛏️ Ligar Mineração", fg_color="green", hover_color="darkgreen")
         else:
             self.meu_no.iniciar_mineracao()
@@ -195,12 +195,15 @@ def iniciar_app():
     parser.add_argument("--ip", default="localhost", help="IP para o servidor")
     parser.add_argument("--porta", type=int, required=True, help="Porta para escutar")
     parser.add_argument("--conectar", help="Lista de vizinhos iniciais")
+    parser.add_argument("--dados", help="Pasta onde guardar a corrente entre reinícios")
+    parser.add_argument("--log", choices=NIVEIS_LOG, default="INFO", help="Nível das mensagens do nó no terminal")
     
     args = parser.parse_args()
+    configurar_logging(args.log)
 
     # 1. Iniciar o Nó (backend)
     vizinhos_iniciais = processar_vizinhos(args.conectar)
-    meu_no = NoDaRede(args.ip, args.porta, vizinhos_iniciais)
+    meu_no = NoDaRede(args.ip, args.porta, vizinhos_iniciais, pasta_dados=args.dados)
     meu_no.iniciar()
 
     # 2. Iniciar a Interface (frontend)
@@ -1,9 +1,8 @@
 import argparse
 import sys
 from node import NoDaRede
-
-# Importamos a classe da interface que criámos no outro ficheiro
-from interface import BlockchainGUI 
+from metrics import configurar_logging, NIVEIS_LOG
+from tracing import instalar_sinais
 
 def processar_vizinhos(texto_vizinhos):
     """ 
@@ -31,17 +30,27 @@ def main():
     parser.add_argument("--ip", default="localhost", help="IP para o servidor")
     parser.add_argument("--porta", type=int, required=True, help="Porta para escutar")
     parser.add_argument("--conectar", help="Lista de vizinhos iniciais (host:porta,host:porta)")
+    parser.add_argument("--dados", help="Pasta onde guardar a corrente entre reinícios")
+    parser.add_argument("--log", choices=NIVEIS_LOG, default="INFO", help="Nível das mensagens do nó no terminal")
+    parser.add_argument("--rastreio", metavar="PASTA",
+                        help="Aceitar SIGUSR1 (trace Chrome) e SIGUSR2 (perfil cProfile), gravados nesta pasta")
     args = parser.parse_args()
+    configurar_logging(args.log)
+    if args.rastreio:
+        instalar_sinais(args.rastreio)
 
     # 2. Preparamos as ligações
     vizinhos_iniciais = processar_vizinhos(args.conectar)
     
     # 3. Criamos e iniciamos o nosso Nó da Rede (o "Motor" da aplicação)
-    meu_no = NoDaRede(args.ip, args.porta, vizinhos_iniciais)
+    meu_no = NoDaRede(args.ip, args.porta, vizinhos_iniciais, pasta_dados=args.dados)
     meu_no.iniciar()
 
     # 4. Criamos e iniciamos a Interface Gráfica (a "Carroçaria" da aplicação)
+    # Importada só agora: carregar o Tk custa tempo e memória e falha num servidor sem ecrã
+    # (para correr o nó sem interface há o daemon.py)
     print("🎨 A iniciar a Interface Gráfica...")
+    from interface import BlockchainGUI
     app = BlockchainGUI(meu_no)
     
     # Garantimos que, se o utilizador fechar a janela no [X], o nó também se desliga em segurança
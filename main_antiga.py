@@ -2,6 +2,7 @@ import argparse
 import sys
 import time
 from node import NoDaRede
+from metrics import configurar_logging, NIVEIS_LOG
 
 def processar_vizinhos(texto_vizinhos):
     """ Transforma a lista de texto 'host:porta' numa lista real para o Python. """
@@ -32,8 +33,10 @@ def main():
     parser.add_argument("--ip", default="localhost", help="IP para o servidor")
     parser.add_argument("--porta", type=int, required=True, help="Porta para escutar")
     parser.add_argument("--conectar", help="Lista de vizinhos iniciais (host:porta,host:porta)")
+    parser.add_argument("--log", choices=NIVEIS_LOG, default="INFO", help="Nível das mensagens do nó no terminal")
     
     args = parser.parse_args()
+    configurar_logging(args.log)
 
     # Criamos e iniciamos o nosso Nó
     vizinhos_iniciais = processar_vizinhos(args.conectar)
@@ -60,17 +63,16 @@ def main():
                 destino = input("Destinatário (host:porta): ")
                 try:
                     valor = float(input("Quantia: "))
-                    # Criamos a transação e espalhamos pela rede
+                    # Criamos a transação (o nó já a espalha pela rede)
                     sucesso = meu_no.nova_transacao(f"{meu_no.host}:{meu_no.porta}", destino, valor)
                     if sucesso:
                         print("✅ Transação enviada para a fila de espera!")
-                        meu_no.espalhar_mensagem('NEW_TRANSACTION', sucesso.formatar_para_dict())
                 except ValueError:
                     print("❌ Valor inválido.")
 
             elif opcao == "4":
                 if meu_no.minerando:
-                    meu_no.minerando = False
+                    meu_no.parar_mineracao()
                     print("🛑 Mineração interrompida.")
                 else:
                     meu_no.iniciar_mineracao()
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from compact_block import id_curto
+
+
+class Mempool:
+    """ Fila de espera das transações pendentes, indexada pelo id.
+    Mantém a ordem de chegada, um índice por remetente e o total que cada remetente já comprometeu. """
+
+    def __init__(self, capacidade=10_000):
+        self.capacidade = capacidade
+        self.transacoes = OrderedDict()  # id -> Transacao, pela ordem de chegada
+        self.por_remetente = {}          # remetente -> {id: Transacao}
+        self.debitos = {}                # remetente -> soma das quantias pendentes
+        self.por_id_curto = {}           # id curto -> ids com esse prefixo (quase sempre só um)
+        self.expulsas = 0                # Quantas saíram por falta de espaço
+
+    def __len__(self):
+        return len(self.transacoes)
+
+    def __iter__(self):
+        return iter(self.transacoes.values())
+
+    def __contains__(self, tx_id):
+        return tx_id in self.transacoes
+
+    def obter(self, tx_id):
+        return self.transacoes.get(tx_id)
+
+    def procurar_id_curto(self, curto):
+        """ Transação com este id curto (ver compact_block), ou None se não houver ou for ambíguo. """
+        ids = self.por_id_curto.get(curto)
+        return self.transacoes[ids[0]] if ids is not None and len(ids) == 1 else None
+
+    def debito(self, endereco):
+        """ Quanto o endereço já tem comprometido em transações por confirmar. """
+        return self.debitos.get(endereco, 0.0)
+
+    def do_remetente(self, endereco):
+        """ Transações pendentes enviadas por um endereço. """
+        return list(self.por_remetente.get(endereco, {}).values())
+
+    def adicionar(self, tx):
+        """ Coloca a transação na fila. Devolve a lista das que foram expulsas para lhe dar espaço,
+        ou None se ela já lá estava. """
+        if tx.id in self.transacoes:
+            return None
+
+        self.transacoes[tx.id] = tx
+        self.por_id_curto.setdefault(id_curto(tx.id), []).append(tx.id)
+        self.por_remetente.setdefault(tx.remetente, {})[tx.id] = tx
+        self.debitos[tx.remetente] = self.debitos.get(tx.remetente, 0.0) + tx.quantia
+
+        # Se passámos do limite, saem as mais antigas
+        expulsas = []
+        while len(self.transacoes) > self.capacidade:
+            tx_id = next(iter(self.transacoes))
+            expulsas.append(self.remover(tx_id))
+        self.expulsas += len(expulsas)
+        return expulsas
+
+    def remover(self, tx_id):
+        """ Retira uma transação da fila (se existir) e devolve-a. """
+        tx = self.transacoes.pop(tx_id, None)
+        if tx is None:
+            return None
+
+        # Se o prefixo era partilhado, volta a identificar a transação que ficou
+        curto = id_curto(tx_id)
+        ids = self.por_id_curto[curto]
+        ids.remove(tx_id)
+        if not ids:
+            del self.por_id_curto[curto]
+
+        do_remetente = self.por_remetente[tx.remetente]
+        del do_remetente[tx_id]
+        if do_remetente:
+            self.debitos[tx.remetente] -= tx.quantia
+        else:
+            # Sem pendentes, o débito volta exatamente a zero (sem restos de arredondamento)
+            del self.por_remetente[tx.remetente]
+            del self.debitos[tx.remetente]
+        return tx
+
+    def remover_confirmadas(self, transacoes):
+        """ Retira da fila as transações de um bloco; custa O(tamanho do bloco). """
+        removidas = []
+        for tx in transacoes:
+            if tx.id in self.transacoes:
+                removidas.append(self.remover(tx.id))
+        return removidas
@@ -0,0 +1,58 @@
+import hashlib
+
+# Raiz usada para um bloco sem transações
+RAIZ_VAZIA = "0" * 64
+
+
+def _folha(tx_id):
+    """ A folha é o hash do id (e não o id em bruto) para nunca se confundir com um nó interno. """
+    return hashlib.sha256(tx_id.encode()).digest()
+
+
+def _juntar(esquerda, direita):
+    return hashlib.sha256(esquerda + direita).digest()
+
+
+def _subir_nivel(nivel):
+    """ Junta os nós dois a dois; um nó sem par sobe sem ser alterado (não é duplicado). """
+    proximo = [_juntar(nivel[i], nivel[i + 1]) for i in range(0, len(nivel) - 1, 2)]
+    if len(nivel) % 2:
+        proximo.append(nivel[-1])
+    return proximo
+
+
+def calcular_raiz_merkle(ids_transacoes):
+    """ Resume a lista de ids das transações num único hash (hex). """
+    nivel = [_folha(tx_id) for tx_id in ids_transacoes]
+    if not nivel:
+        return RAIZ_VAZIA
+    while len(nivel) > 1:
+        nivel = _subir_nivel(nivel)
+    return nivel[0].hex()
+
+
+def gerar_prova_merkle(ids_transacoes, posicao):
+    """ Caminho de hashes que liga a transação nessa posição à raiz.
+    Cada passo é [hash_do_irmão, lado], em que lado diz se o irmão fica à "esquerda" ou à "direita". """
+    nivel = [_folha(tx_id) for tx_id in ids_transacoes]
+    if not 0 <= posicao < len(nivel):
+        raise IndexError("transação fora do bloco")
+
+    prova = []
+    while len(nivel) > 1:
+        irmao = posicao ^ 1
+        if irmao < len(nivel):
+            lado = "esquerda" if irmao < posicao else "direita"
+            prova.append([nivel[irmao].hex(), lado])
+        nivel = _subir_nivel(nivel)
+        posicao //= 2
+    return prova
+
+
+def verificar_prova_merkle(tx_id, prova, raiz):
+    """ Confirma que a transação pertence ao bloco com esta raiz, sem precisar das outras transações. """
+    atual = _folha(tx_id)
+    for irmao_hex, lado in prova:
+        irmao = bytes.fromhex(irmao_hex)
+        atual = _juntar(irmao, atual) if lado == "esquerda" else _juntar(atual, irmao)
+    return atual.hex() == raiz
@@ -0,0 +1,175 @@
+import argparse
+import bisect
+import collections
+import contextlib
+import json
+import logging
+import socket
+import threading
+import time
+from framing import enviar_mensagem, receber_mensagem
+from tracing import rastreador
+
+# Limites (em segundos) dos intervalos dos histogramas: de 50 µs a 30 s, cada um ~2-2.5x o anterior
+LIMITES_HISTOGRAMA = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+NIVEIS_LOG = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+
+class Histograma:
+    """ Distribuição de durações em intervalos fixos: registar custa uma pesquisa binária e uma soma,
+    e a memória não cresce com o número de amostras. Os percentis são o limite superior do intervalo
+    onde caem (o máximo é exato). """
+    __slots__ = ('contagens', 'quantidade', 'soma', 'maximo')
+
+    def __init__(self):
+        self.contagens = [0] * (len(LIMITES_HISTOGRAMA) + 1)  # O último é "acima do maior limite"
+        self.quantidade = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registar(self, segundos):
+        self.contagens[bisect.bisect_left(LIMITES_HISTOGRAMA, segundos)] += 1
+        self.quantidade += 1
+        self.soma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, fracao):
+        if not self.quantidade:
+            return 0.0
+        alvo = fracao * self.quantidade
+        acumulado = 0
+        for posicao, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo and contagem:
+                return min(LIMITES_HISTOGRAMA[posicao], self.maximo) if posicao < len(LIMITES_HISTOGRAMA) else self.maximo
+        return self.maximo
+
+    def resumo(self):
+        """ Em milissegundos, como aparece nas estatísticas do nó. """
+        return {
+            "n": self.quantidade,
+            "media_ms": round(self.soma / self.quantidade * 1000, 3) if self.quantidade else 0.0,
+            "p50_ms": round(self.percentil(0.5) * 1000, 3),
+            "p90_ms": round(self.percentil(0.9) * 1000, 3),
+            "p99_ms": round(self.percentil(0.99) * 1000, 3),
+            "max_ms": round(self.maximo * 1000, 3),
+        }
+
+
+class Metricas:
+    """ Registo das métricas de um nó: contadores (só sobem), medidores (valor atual, guardado ou
+    lido de uma função no momento da consulta) e histogramas de durações.
+    Os nomes são texto com pontos (ex: "mensagens_recebidas.TX_BATCH"); o instantaneo() devolve
+    tudo num dicionário que pode ir tal e qual numa mensagem da rede. """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.contadores = collections.Counter()
+        self.medidores = {}      # nome -> valor
+        self._funcoes = {}       # nome -> função sem argumentos que dá o valor atual
+        self.histogramas = collections.defaultdict(Histograma)
+        self.inicio = time.time()
+
+    def incrementar(self, nome, quantidade=1):
+        with self._trava:
+            self.contadores[nome] += quantidade
+
+    def definir(self, nome, valor):
+        self.medidores[nome] = valor
+
+    def medidor(self, nome, funcao):
+        """ Medidor calculado só quando alguém pede as métricas (ex: tamanho do mempool). """
+        self._funcoes[nome] = funcao
+
+    def registar(self, nome, segundos):
+        with self._trava:
+            self.histogramas[nome].registar(segundos)
+
+    @contextlib.contextmanager
+    def cronometrar(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registar(nome, time.perf_counter() - inicio)
+
+    def instantaneo(self):
+        medidores = dict(self.medidores)
+        for nome, funcao in list(self._funcoes.items()):
+            try:
+                medidores[nome] = funcao()
+            except Exception:
+                medidores[nome] = None
+        with self._trava:
+            return {
+                "desde": self.inicio,
+                "segundos_ativo": round(time.time() - self.inicio, 3),
+                "contadores": dict(self.contadores),
+                "medidores": medidores,
+                "histogramas": {nome: h.resumo() for nome, h in self.histogramas.items()},
+            }
+
+
+class TravaMedida:
+    """ Envolve uma trava (Lock/RLock) e mede quanto tempo se espera por ela.
+    Primeiro tenta apanhá-la sem bloquear: sem concorrência custa o mesmo que a trava sozinha
+    e só as esperas a sério chegam ao histograma. """
+
+    def __init__(self, trava, metricas, nome):
+        self._trava = trava
+        self._metricas = metricas
+        self._nome = nome
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._trava.acquire(False):
+            return True
+        if not blocking:
+            return False
+        inicio = time.perf_counter()
+        obtida = self._trava.acquire(True, timeout)
+        fim = time.perf_counter()
+        self._metricas.registar(self._nome, fim - inicio)
+        rastreador.registar(self._nome, inicio, fim, "trava")
+        return obtida
+
+    def release(self):
+        self._trava.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *erro):
+        self.release()
+
+
+def configurar_logging(nivel="INFO"):
+    """ Mensagens do nó no terminal, só o texto (como os antigos prints). Em DEBUG aparecem também
+    as que se repetem por mensagem ou transação; no INFO ficam só os acontecimentos. """
+    logging.basicConfig(level=getattr(logging, str(nivel).upper(), logging.INFO), format="%(message)s")
+
+
+def consultar_estatisticas(host, porta, timeout=5):
+    """ Pede as estatísticas a um nó em funcionamento (mensagem GET_STATS numa ligação própria). """
+    with socket.create_connection((host, porta), timeout=timeout) as sock:
+        enviar_mensagem(sock, {"type": "GET_STATS", "payload": {}})
+        resposta = receber_mensagem(sock)
+    if resposta is None or resposta.get("type") != "STATS":
+        raise ConnectionError(f"Resposta inesperada de {host}:{porta}: {resposta}")
+    return resposta["payload"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mostrar as métricas de um nó em funcionamento")
+    parser.add_argument("--ip", default="localhost")
+    parser.add_argument("--porta", type=int, required=True)
+    args = parser.parse_args()
+    print(json.dumps(consultar_estatisticas(args.ip, args.porta), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
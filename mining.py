@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from block import Bloco
+
+log = logging.getLogger(__name__)
+
+# Evento partilhado com os processos trabalhadores (definido no arranque de cada um)
+_sinal_paragem = None
+
+# De quantas em quantas tentativas o trabalhador espreita o sinal de paragem
+_INTERVALO_VERIFICACAO = 256
+
+
+def _iniciar_trabalhador(sinal_paragem):
+    """ Corre uma vez em cada processo do pool e guarda o evento de paragem. """
+    global _sinal_paragem
+    _sinal_paragem = sinal_paragem
+
+
+def _procurar_nonce(prefixo, sufixo, inicio, fim, alvo, cancelamento=None):
+    """ Procura no intervalo [inicio, fim) um nonce cujo hash comece pelo alvo.
+    Devolve (nonce, hash, tentativas, duração); nonce e hash são None se não encontrar. """
+    # Nos trabalhadores do pool o sinal vem do arranque; no caminho local é o próprio cancelamento
+    sinal = cancelamento if cancelamento is not None else _sinal_paragem
+    inicio_relogio = time.perf_counter()
+    # O estado do SHA-256 depois do prefixo é calculado uma vez por lote e copiado a cada tentativa
+    base = hashlib.sha256(prefixo)
+    for nonce in range(inicio, fim):
+        if sinal is not None and nonce % _INTERVALO_VERIFICACAO == 0 and sinal.is_set():
+            return None, None, nonce - inicio, time.perf_counter() - inicio_relogio
+
+        hash_atual = Bloco.hash_com_nonce(base, nonce, sufixo)
+        if hash_atual.startswith(alvo):
+            return nonce, hash_atual, nonce - inicio + 1, time.perf_counter() - inicio_relogio
+    return None, None, fim - inicio, time.perf_counter() - inicio_relogio
+
+
+class MotorMineracao:
+    """ Divide o espaço de nonces por um pool de processos (um por núcleo). """
+
+    def __init__(self, processos=None, tamanho_lote=2000, duracao_lote=0.1):
+        self.processos = processos or os.cpu_count() or 1
+        # O tamanho do lote vai sendo ajustado para que cada um dure ~duracao_lote segundos
+        self.tamanho_lote = tamanho_lote
+        self.duracao_lote = duracao_lote
+
+        self.hashes_por_segundo = 0.0
+        self.total_tentativas = 0
+        self.tentativas_ultima = 0
+
+        self._executor = None
+        self._sinal_paragem = None
+
+    def _obter_executor(self):
+        """ Cria o pool de processos apenas na primeira utilização. """
+        if self._executor is None:
+            contexto = multiprocessing.get_context()
+            self._sinal_paragem = contexto.Event()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processos,
+                mp_context=contexto,
+                initializer=_iniciar_trabalhador,
+                initargs=(self._sinal_paragem,)
+            )
+        return self._executor
+
+    def _ajustar_lote(self, tentativas, duracao):
+        """ Aproxima o tamanho do lote da duração pretendida. """
+        if tentativas and duracao > 0:
+            ideal = int(tentativas * self.duracao_lote / duracao)
+            self.tamanho_lote = max(100, min(ideal, 1_000_000))
+
+    def minerar(self, bloco, dificuldade, cancelamento=None):
+        """ Encontra um nonce válido para o bloco, atualiza-o e devolve (nonce, hash).
+        Se o evento 'cancelamento' for ativado pelo caminho, desiste e devolve None. """
+        alvo = "0" * dificuldade
+        prefixo, sufixo = bloco.partes_para_mineracao()
+        inicio_relogio = time.perf_counter()
+
+        if self.processos == 1:
+            resultado, tentativas = self._minerar_local(prefixo, sufixo, bloco.nonce, alvo, cancelamento)
+        else:
+            resultado, tentativas = self._minerar_pool(prefixo, sufixo, bloco.nonce, alvo, cancelamento)
+
+        duracao = time.perf_counter() - inicio_relogio
+        self.total_tentativas += tentativas
+        self.tentativas_ultima = tentativas
+        self.hashes_por_segundo = tentativas / duracao if duracao > 0 else 0.0
+
+        if resultado is None:
+            log.debug("🛑 Mineração do bloco %s cancelada após %d tentativas.", bloco.indice, tentativas)
+            return None
+
+        bloco.nonce, bloco.hash = resultado
+        log.info("✅ Bloco %s minerado! Hash: %s (%.0f H/s)", bloco.indice, bloco.hash, self.hashes_por_segundo)
+        return resultado
+
+    def _minerar_local(self, prefixo, sufixo, proximo, alvo, cancelamento):
+        """ Caminho sem pool, usado quando só há um processo disponível. """
+        tentativas = 0
+        while True:
+            if cancelamento is not None and cancelamento.is_set():
+                return None, tentativas
+            fim = proximo + self.tamanho_lote
+            nonce, hash_atual, feitas, duracao = _procurar_nonce(prefixo, sufixo, proximo, fim, alvo, cancelamento)
+            tentativas += feitas
+            if nonce is not None:
+                return (nonce, hash_atual), tentativas
+            self._ajustar_lote(feitas, duracao)
+            proximo = fim
+
+    def _minerar_pool(self, prefixo, sufixo, proximo, alvo, cancelamento):
+        """ Mantém todos os processos ocupados com lotes consecutivos até surgir um vencedor. """
+        executor = self._obter_executor()
+        self._sinal_paragem.clear()
+
+        pendentes = set()
+        resultado = None
+        tentativas = 0
+        while resultado is None:
+            if cancelamento is not None and cancelamento.is_set():
+                break
+
+            # Dois lotes por processo para que nenhum núcleo fique à espera de trabalho
+            while len(pendentes) < self.processos * 2:
+                fim = proximo + self.tamanho_lote
+                pendentes.add(executor.submit(_procurar_nonce, prefixo, sufixo, proximo, fim, alvo))
+                proximo = fim
+
+            # O timeout curto permite reparar no cancelamento sem esperar pelo fim de um lote
+            feitos, pendentes = wait(pendentes, timeout=0.05, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                nonce, hash_atual, feitas, duracao = futuro.result()
+                tentativas += feitas
+                if nonce is not None and (resultado is None or nonce < resultado[0]):
+                    resultado = (nonce, hash_atual)
+                elif nonce is None:
+                    self._ajustar_lote(feitas, duracao)
+
+        # Avisa os restantes trabalhadores para largarem os lotes em curso
+        self._sinal_paragem.set()
+        for futuro in pendentes:
+            futuro.cancel()
+        for futuro in wait(pendentes).done:
+            if not futuro.cancelled():
+                tentativas += futuro.result()[2]
+        return resultado, tentativas
+
+    def encerrar(self):
+        """ Desliga o pool de processos. """
+        if self._executor is not None:
+            self._sinal_paragem.set()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
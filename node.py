@@ -1,16 +1,34 @@
-import socket
+import logging
 import threading
-import json
-import time
 from blockchain import RedeBlockchain
 from transaction import Transacao
 from block import Bloco
+from mining import MotorMineracao
+from block_store import ArmazemBlocos
+from transport import TransporteAsync
+from seen_cache import CacheVistos
+from sync import SincronizadorCorrente, MAX_CABECALHOS, MAX_BLOCOS_POR_PEDIDO, MAX_BYTES_POR_PEDIDO
+from compact_block import criar_bloco_compacto, BlocoParcial
+from tx_batch import LoteTransacoes
+from metrics import Metricas, TravaMedida
+from tracing import rastreador
+
+log = logging.getLogger(__name__)
+
+# Mensagens que só os nós com sincronização por cabeçalhos conhecem: quem as usa também aceita blocos compactos
+TIPOS_PROTOCOLO_NOVO = ('GET_HEADERS', 'GET_BLOCKS', 'COMPACT_BLOCK', 'GET_BLOCK_TXN', 'TX_BATCH')
+# Mensagens que apanham a trava do nó (validar, reorganizar, ler a corrente): o transporte trata-as fora
+# do event loop. As transações só entram na fila dos lotes e ficam no loop
+TIPOS_PESADOS = ('REQUEST_CHAIN', 'RESPONSE_CHAIN', 'GET_HEADERS', 'GET_BLOCKS', 'NEW_BLOCK', 'COMPACT_BLOCK',
+                 'GET_BLOCK_TXN')
 
 class NoDaRede:
-    def __init__(self, host, porta, nos_iniciais=None):
+    def __init__(self, host, porta, nos_iniciais=None, processos_mineracao=None, minerar_vazios=True, pasta_dados=None,
+                 fabrica_transporte=TransporteAsync):
         self.host = host
         self.porta = porta
         self.vizinhos = set()  # Conjunto de tuplas (host, porta)
+        self.vizinhos_compactos = set()  # Vizinhos a quem os blocos são anunciados em formato compacto
         
         if nos_iniciais:
             self.vizinhos.update(nos_iniciais)
@@ -18,150 +36,195 @@ class NoDaRede:
         self.ativo = False
         self.minerando = False
         self.tarefa_mineracao = None
-        self.socket_servidor = None
-        self.trava_seguranca = threading.RLock() # Para evitar conflitos de escrita na rede
-        self.blockchain = RedeBlockchain()
+        # Todo o tráfego (aceitar, ler, despachar, espalhar) passa por um único event loop;
+        # a fábrica pode ser trocada (ex: pela rede em memória do cluster.py) com a mesma interface
+        self.transporte = fabrica_transporte(host, porta, self._processar_protocolo, tipos_em_thread=TIPOS_PESADOS)
+        # O que já foi recebido ou espalhado: as cópias repetidas do gossip são descartadas logo à chegada
+        self.blocos_vistos = CacheVistos()
+        self.transacoes_vistas = CacheVistos()
+        # Contadores, medidores e histogramas do nó (pedidos pela rede com GET_STATS)
+        self.metricas = Metricas()
+        # Para evitar conflitos de escrita na rede; o tempo à espera dela fica no histograma "espera_trava"
+        self.trava_seguranca = TravaMedida(threading.RLock(), self.metricas, "espera_trava")
+        # Com uma pasta de dados a corrente sobrevive a reinícios (sem voltar a descarregar tudo)
+        armazem = ArmazemBlocos(pasta_dados) if pasta_dados else None
+        self.blockchain = RedeBlockchain(armazem=armazem)
+        # Motor que reparte a procura do nonce por todos os núcleos do computador
+        self.motor_mineracao = MotorMineracao(processos_mineracao)
+        # Evento da tentativa de mineração em curso: ativá-lo faz o motor desistir
+        self.cancelamento_mineracao = threading.Event()
+        self.tentativas_abandonadas = 0  # Procuras interrompidas por já estarem obsoletas
+        self.hashes_abandonados = 0      # Hashes calculados nessas procuras
+        self.tentativas_renovadas = 0    # Procuras recomeçadas só para incluir transações novas
+        self.hashes_renovados = 0        # Hashes calculados nessas procuras (o trabalho não era obsoleto)
+
+        # Se for False, o minerador dorme até haver transações no modelo do próximo bloco
+        self.minerar_vazios = minerar_vazios
+        self._versao_em_mineracao = None
+        self.blockchain.modelo.ouvintes.append(self._ao_mudar_modelo)
+
+        # Sincronização por cabeçalhos: só se descarregam os blocos que faltam
+        self.sincronizador = SincronizadorCorrente(self)
+        self.estatisticas_compactos = {"recebidos": 0, "sem_pedido": 0, "transacoes_pedidas": 0, "blocos_inteiros": 0}
+        # Transações recebidas (e criadas aqui) são validadas e reenviadas em lotes, numa thread própria
+        self.lote_transacoes = LoteTransacoes(self._processar_lote_transacoes, nome=f"lotes-{porta}")
+
+        self.metricas.medidor("altura", lambda: len(self.blockchain.corrente) - 1)
+        self.metricas.medidor("mempool", lambda: len(self.blockchain.mempool))
+        self.metricas.medidor("mempool.expulsas", lambda: self.blockchain.mempool.expulsas)
+        self.metricas.medidor("transacoes.descartadas_fila", lambda: self.lote_transacoes.descartadas)
+        self.metricas.medidor("transacoes.lotes_processados", lambda: self.lote_transacoes.lotes_processados)
+        self.metricas.medidor("vistos.blocos_suprimidos", lambda: self.blocos_vistos.suprimidos)
+        self.metricas.medidor("vistos.transacoes_suprimidas", lambda: self.transacoes_vistas.suprimidos)
+        self.metricas.medidor("vizinhos", lambda: len(self.vizinhos))
+        self.metricas.medidor("reorganizacoes", lambda: self.blockchain.reorganizacoes)
+        self.metricas.medidor("sync.blocos_descarregados", lambda: self.sincronizador.blocos_descarregados)
+        self.metricas.medidor("mineracao.hashes_por_segundo", lambda: self.motor_mineracao.hashes_por_segundo)
+        self.metricas.medidor("rede.bytes_recebidos", lambda: self.transporte.bytes_recebidos)
+        self.metricas.medidor("rede.bytes_enviados", lambda: self.transporte.bytes_enviados)
 
     def iniciar(self):
         """ Liga o servidor do nó e conecta-se aos vizinhos. """
         self.ativo = True
-        self.socket_servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket_servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket_servidor.bind((self.host, self.porta))
-        self.socket_servidor.listen(5)
-        print(f"📡 Estação ligada em {self.host}:{self.porta}")
-
-        # Thread para ficar sempre a ouvir novas ligações
-        ouvinte = threading.Thread(target=self._escutar_conexoes, daemon=True)
-        ouvinte.start()
+        self.lote_transacoes.iniciar()
+        self.transporte.iniciar()
+        log.info("📡 Estação ligada em %s:%s", self.host, self.porta)
 
         # Tentar sincronizar com quem já está na rede
-        self.espalhar_mensagem('REQUEST_CHAIN', {})
+        with self.trava_seguranca:
+            self.sincronizador.sincronizar([v for v in list(self.vizinhos) if v != (self.host, self.porta)])
 
     def iniciar_mineracao(self):
         """ Ativa o processo de mineração em segundo plano. """
         if self.minerando:
-            print("⛏️  A mineração já está a decorrer.")
+            log.info("⛏️  A mineração já está a decorrer.")
             return
 
         self.minerando = True
-        self.tarefa_mineracao = threading.Thread(target=self._ciclo_mineracao, daemon=True)
+        self.tarefa_mineracao = threading.Thread(target=self._ciclo_mineracao, name=f"mineracao-{self.porta}", daemon=True)
         self.tarefa_mineracao.start()
-        print("⛏️  Mineração iniciada com sucesso!")
+        log.info("⛏️  Mineração iniciada com sucesso!")
+
+    def parar_mineracao(self):
+        """ Desliga a mineração e interrompe a procura que estiver em curso. """
+        self.minerando = False
+        self._abortar_mineracao()
+
+    def _abortar_mineracao(self):
+        """ Manda parar a procura atual (ex: a ponta da corrente mudou e o trabalho ficou obsoleto). """
+        self.cancelamento_mineracao.set()
+        self.blockchain.modelo.acordar()
+
+    def _ao_mudar_modelo(self):
+        """ Chamado pelo modelo do bloco: se o que está a ser minerado ficou desatualizado, recomeça. """
+        if self._versao_em_mineracao is not None and self._versao_em_mineracao != self.blockchain.modelo.versao:
+            self.cancelamento_mineracao.set()
+
+    def _ha_trabalho(self):
+        """ Condição de espera do minerador: há algo para minerar ou é para parar. """
+        if not (self.minerando and self.ativo):
+            return True
+        return self.minerar_vazios or bool(self.blockchain.modelo.transacoes)
 
     def _ciclo_mineracao(self):
-        """ Loop contínuo que tenta criar blocos. """
+        """ Loop contínuo que tenta criar blocos; acorda com as mudanças do modelo do bloco. """
         while self.minerando and self.ativo:
-            time.sleep(1)
+            self.blockchain.modelo.esperar(self._ha_trabalho)
+            if not (self.minerando and self.ativo):
+                break
 
-            transacoes_para_bloco = list(self.blockchain.transacoes_pendentes)
-            meu_id = f"{self.host}:{self.porta}"
-            recompensa = Transacao("sistema", meu_id, self.blockchain.recompensa_mineracao)
-            transacoes_para_bloco.insert(0, recompensa)
+            with self.trava_seguranca:
+                # O evento é criado antes de ler o modelo: qualquer mudança depois disto cancela-o
+                cancelamento = threading.Event()
+                self.cancelamento_mineracao = cancelamento
+                versao, ultimo, transacoes_para_bloco = self.blockchain.modelo.obter()
+                self._versao_em_mineracao = versao
+
+                meu_id = f"{self.host}:{self.porta}"
+                recompensa = Transacao("sistema", meu_id, self.blockchain.recompensa_mineracao)
+                transacoes_para_bloco.insert(0, recompensa)
 
-            ultimo = self.blockchain.obter_ultimo_bloco()
-            novo = Bloco(ultimo.indice + 1, ultimo.hash, transacoes_para_bloco)
+                novo = Bloco(ultimo.indice + 1, ultimo.hash, transacoes_para_bloco, versao=self.blockchain.versao_bloco)
 
-            print(f"⚙️  Tentando minerar bloco {novo.indice}...")
-            novo.minerar(self.blockchain.dificuldade)
+            log.debug("⚙️  Tentando minerar bloco %s...", novo.indice)
+            with self.metricas.cronometrar("mineracao.tentativa"), \
+                    rastreador.span("minerar", "mineracao", perfilar=True, indice=novo.indice):
+                resultado = self.motor_mineracao.minerar(novo, self.blockchain.dificuldade, cancelamento)
+            self.metricas.incrementar("mineracao.hashes", self.motor_mineracao.tentativas_ultima)
 
             with self.trava_seguranca:
+                self._versao_em_mineracao = None
                 if ultimo.hash != self.blockchain.obter_ultimo_bloco().hash:
-                    print("🔄 A rede atualizou primeiro. Reiniciando tentativa...")
+                    # A ponta mudou: o trabalho feito já não serve para nada
+                    self.metricas.incrementar("mineracao.abandonadas")
+                    self.tentativas_abandonadas += 1
+                    self.hashes_abandonados += self.motor_mineracao.tentativas_ultima
+                    log.debug("🔄 A rede atualizou primeiro. Reiniciando tentativa...")
+                    continue
+                if resultado is None:
+                    # Mesma ponta, modelo renovado (ou mineração parada): não conta como trabalho perdido
+                    if self.minerando:
+                        self.metricas.incrementar("mineracao.renovadas")
+                        self.tentativas_renovadas += 1
+                        self.hashes_renovados += self.motor_mineracao.tentativas_ultima
+                        log.debug("🔁 Chegaram novas transações. Reiniciando tentativa...")
                     continue
                 resultado = self.blockchain.adicionar_bloco(novo)
                 if resultado:
-                    print(f"💎 Sucesso! Bloco {novo.indice} criado.")
-                    # O outro nó espera que o bloco venha dentro da chave "block"
-                    self.espalhar_mensagem('NEW_BLOCK', {"block": novo.formatar_para_dict()})
+                    self.metricas.incrementar("mineracao.blocos")
+                    log.info("💎 Sucesso! Bloco %s criado.", novo.indice)
+                    self.blocos_vistos.marcar(novo.hash)
+                    self._espalhar_bloco(novo)
 
-    def _escutar_conexoes(self):
-        """ Fica à espera que outros nós enviem dados. """
-        while self.ativo:
-            try:
-                conexao, endereco = self.socket_servidor.accept()
-                threading.Thread(target=self._gerir_cliente, args=(conexao, endereco), daemon=True).start()
-            except:
-                break
-
-    def _gerir_cliente(self, conexao, endereco):
-        """ Processa as mensagens recebidas e devolve a resposta no mesmo socket, se houver. """
-        with conexao:
-            try:
-                cabecalho = conexao.recv(4)
-                if not cabecalho: return
-                tamanho = int.from_bytes(cabecalho, 'big')
-                
-                corpo = conexao.recv(tamanho).decode('utf-8')
-                mensagem = json.loads(corpo)
-                
-                # Pega a resposta gerada pelo protocolo
-                resposta = self._processar_protocolo(mensagem, endereco)
-                
-                # Se houver resposta (ex: RESPONSE_CHAIN), envia de volta na mesma hora
-                if resposta:
-                    pacote_resp = json.dumps(resposta).encode('utf-8')
-                    cab_resp = len(pacote_resp).to_bytes(4, 'big')
-                    conexao.sendall(cab_resp + pacote_resp)
-            except Exception as e:
-                print(f"⚠️ Erro ao receber/responder dados para {endereco}: {e}")
-
-    def enviar_direto(self, host, porta, tipo, conteudo):
-        """ Envia uma mensagem e aguarda para ver se há resposta na mesma conexão. """
-        try:
-            meu_endereco = f"{self.host}:{self.porta}"
-            dicionario_msg = {
-                "type": tipo, 
-                "payload": conteudo, 
-                "sender": meu_endereco
-            }
-            pacote = json.dumps(dicionario_msg).encode('utf-8')
-            cabecalho = len(pacote).to_bytes(4, 'big')
-            
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(5) # Espera no máximo 5 segundos por uma resposta
-                s.connect((host, int(porta)))
-                s.sendall(cabecalho + pacote)
-                
-                # Fica escutando a resposta no mesmo tubo
-                try:
-                    cabecalho_resp = s.recv(4)
-                    if cabecalho_resp:
-                        tamanho_resp = int.from_bytes(cabecalho_resp, 'big')
-                        
-                        corpo_resp = b""
-                        while len(corpo_resp) < tamanho_resp:
-                            chunk = s.recv(min(4096, tamanho_resp - len(corpo_resp)))
-                            if not chunk: break
-                            corpo_resp += chunk
-                            
-                        msg_resp = json.loads(corpo_resp.decode('utf-8'))
-                        self._processar_protocolo(msg_resp, (host, porta))
-                except socket.timeout:
-                    pass # Timeout normal para mensagens que não têm resposta
-                    
-        except Exception as e:
-            pass # Nó offline
+    def enviar_direto(self, host, porta, tipo, conteudo, esperar_resposta=False):
+        """ Entrega a mensagem ao transporte, que a escreve na ligação persistente ao vizinho.
+        Uma eventual resposta chega depois a _processar_protocolo, sem bloquear quem envia;
+        com esperar_resposta, chega antes num Future devolvido aqui. """
+        meu_endereco = f"{self.host}:{self.porta}"
+        dicionario_msg = {
+            "type": tipo, 
+            "payload": conteudo, 
+            "sender": meu_endereco
+        }
+        self.metricas.incrementar(f"mensagens_enviadas.{tipo}")
+        return self.transporte.enviar(host, porta, dicionario_msg, esperar_resposta)
 
     def _processar_protocolo(self, msg, endereco):
         """ Decide o que fazer e retorna a resposta (se necessário). """
         tipo = msg.get('type')
         dados = msg.get('payload', {})
         remetente = msg.get('sender')
+        self.metricas.incrementar(f"mensagens_recebidas.{tipo}")
         
-        print(f"📩 Recebido: {tipo} de {remetente}")
+        # Repetições são descartadas antes de reconstruir/validar o que quer que seja
+        if tipo == 'NEW_BLOCK':
+            if self.blocos_vistos.repetido(dados.get("block", dados).get("hash")):
+                return None
+        elif tipo == 'COMPACT_BLOCK':
+            if self.blocos_vistos.repetido(dados.get("header", {}).get("hash")):
+                return None
+        elif tipo == 'NEW_TRANSACTION':
+            if self.transacoes_vistas.repetido(dados.get("transaction", dados).get("id")):
+                return None
+
+        log.debug("📩 Recebido: %s de %s", tipo, remetente)
 
         # Registra o vizinho dinamicamente usando a string do sender
         if remetente:
             try:
                 host_rem, porta_rem = remetente.split(':')
                 self.vizinhos.add((host_rem, int(porta_rem)))
+                if tipo in TIPOS_PROTOCOLO_NOVO:
+                    self.vizinhos_compactos.add((host_rem, int(porta_rem)))
             except:
                 pass
 
         if tipo == 'REQUEST_CHAIN':
-            print("📤 Respondendo com minha corrente...")
-            corrente_data = [b.formatar_para_dict() for b in self.blockchain.corrente]
+            log.debug("📤 Respondendo com minha corrente...")
+            # Como no GET_BLOCKS: com a trava (a corrente pode ser cortada por uma reorganização)
+            # e limitada em bytes; uma corrente maior do que isso só se obtém por cabeçalhos
+            with self.trava_seguranca:
+                corrente_data = self.blockchain.blocos_em_dict(0, len(self.blockchain.corrente), MAX_BYTES_POR_PEDIDO)
             meu_endereco = f"{self.host}:{self.porta}"
             
             # Retorna o dicionário com a estrutura exata que o outro grupo espera
@@ -175,37 +238,225 @@ class NoDaRede:
                 "sender": meu_endereco
             }
 
+        elif tipo == 'GET_HEADERS':
+            limite = min(int(dados.get("limit", MAX_CABECALHOS)), MAX_CABECALHOS)
+            with self.trava_seguranca:
+                cabecalhos = self.blockchain.cabecalhos_apos(dados.get("locator", []), limite)
+                altura = len(self.blockchain.corrente) - 1
+            return {
+                "type": "HEADERS",
+                "payload": {"headers": cabecalhos, "height": altura},
+                "sender": f"{self.host}:{self.porta}"
+            }
+
+        elif tipo == 'GET_BLOCKS':
+            inicio = int(dados.get("start", 0))
+            quantidade = min(int(dados.get("count", 0)), MAX_BLOCOS_POR_PEDIDO)
+            with self.trava_seguranca:
+                blocos = self.blockchain.blocos_em_dict(inicio, quantidade, MAX_BYTES_POR_PEDIDO)
+            return {
+                "type": "BLOCKS",
+                "payload": {"start": inicio, "blocks": blocos},
+                "sender": f"{self.host}:{self.porta}"
+            }
+
         elif tipo == 'RESPONSE_CHAIN':
             # Lê a lista de blocos de dentro da subchave "chain"
             lista_blocos = dados.get("blockchain", {}).get("chain", [])
-            nova_corrente = [Bloco.restaurar_de_dict(b) for b in lista_blocos]
             with self.trava_seguranca:
-                if self.blockchain.replace_chain(nova_corrente):
-                    print("✅ Minha corrente foi atualizada pela rede.")
+                if len(lista_blocos) <= len(self.blockchain.corrente):
+                    return None
+                # Só se reconstroem os blocos depois da bifurcação; o prefixo comum já é nosso
+                bifurcacao = self.blockchain.ponto_bifurcacao([b.get("hash") for b in lista_blocos])
+                with rastreador.span("restaurar_blocos", "corrente", blocos=len(lista_blocos) - bifurcacao):
+                    novos_blocos = [Bloco.restaurar_de_dict(b) for b in lista_blocos[bifurcacao:]]
+                if self.blockchain.adotar_ramo(bifurcacao, novos_blocos):
+                    self._abortar_mineracao()
+                    log.info("✅ Minha corrente foi atualizada pela rede.")
 
         elif tipo == 'NEW_BLOCK':
             # Extrai o bloco da subchave "block"
             bloco_data = dados.get("block", dados)
-            bloco_recebido = Bloco.restaurar_de_dict(bloco_data)
+            with rastreador.span("restaurar_bloco", "corrente"):
+                bloco = Bloco.restaurar_de_dict(bloco_data)
+            self._receber_bloco(bloco, remetente, bloco_data)
+
+        elif tipo == 'COMPACT_BLOCK':
+            with self.trava_seguranca:
+                self.estatisticas_compactos["recebidos"] += 1
+                with rastreador.span("reconstruir_compacto", "corrente"):
+                    parcial = BlocoParcial(dados, self.blockchain.mempool)
+            if parcial.completo:
+                self.estatisticas_compactos["sem_pedido"] += 1
+                self._receber_bloco_compacto(parcial, remetente)
+            elif remetente:
+                self._pedir_transacoes_em_falta(parcial, remetente)
+
+        elif tipo == 'NEW_TRANSACTION':
+            self.lote_transacoes.adicionar((dados.get("transaction", dados), False))
+
+        elif tipo == 'TX_BATCH':
+            for tx_data in dados.get("transactions", []):
+                if not self.transacoes_vistas.repetido(tx_data.get("id")):
+                    self.lote_transacoes.adicionar((tx_data, False))
+
+        elif tipo == 'GET_STATS':
+            return {"type": "STATS", "payload": self.estatisticas(), "sender": f"{self.host}:{self.porta}"}
+
+        elif tipo == 'GET_BLOCK_TXN':
             with self.trava_seguranca:
-                if self.blockchain.adicionar_bloco(bloco_recebido):
-                    print(f"📦 Novo bloco {bloco_recebido.indice} recebido e aceite!")
-                    self.espalhar_mensagem('NEW_BLOCK', {"block": bloco_data})
+                bloco = self.blockchain.procurar_bloco(dados.get("hash"), dados.get("index"))
+            if bloco is None:
+                return None
+            posicoes = [p for p in dados.get("indexes", []) if isinstance(p, int) and 0 <= p < len(bloco.transacoes)]
+            transacoes = [bloco.transacoes[p] for p in posicoes]
+            return {
+                "type": "BLOCK_TXN",
+                "payload": {
+                    "hash": bloco.hash,
+                    "transactions": [tx.formatar_para_dict() for tx in transacoes]
+                },
+                "sender": f"{self.host}:{self.porta}"
+            }
                     
         return None # Retorna None se não precisar responder na mesma conexão
     
 
-    def espalhar_mensagem(self, tipo, conteudo):
-        """ Envia a mesma informação para todos os vizinhos conhecidos. """
-        for v_host, v_porta in list(self.vizinhos):
-            if (v_host, v_porta) != (self.host, self.porta):
-                threading.Thread(target=self.enviar_direto, args=(v_host, v_porta, tipo, conteudo)).start()
+    def _processar_lote_transacoes(self, lote):
+        """ Valida de uma vez as transações recebidas e reenvia, num só lote, as aceites e as criadas aqui. """
+        locais, recebidas = [], []
+        with rastreador.span("restaurar_transacoes", "transacoes", transacoes=len(lote)):
+            for item, criada_aqui in lote:
+                if criada_aqui:
+                    locais.append(item)
+                    continue
+                try:
+                    recebidas.append(Transacao.restaurar_de_dict(item))
+                except (KeyError, TypeError, AttributeError):
+                    continue  # Transação mal formada
+
+        with self.trava_seguranca, \
+                rastreador.span("validar_transacoes", "transacoes", perfilar=True, transacoes=len(recebidas)):
+            aceites = self.blockchain.adicionar_transacoes(recebidas)
+        if aceites:
+            log.debug("📥 %d de %d transações recebidas entraram no mempool.", len(aceites), len(recebidas))
+
+        # Só se marcam as válidas: um id falso não pode impedir a transação verdadeira de entrar
+        a_espalhar = locais + aceites
+        for tx in a_espalhar:
+            self.transacoes_vistas.marcar(tx.id)
+        if a_espalhar:
+            self._espalhar_transacoes(a_espalhar)
+
+    def _espalhar_transacoes(self, transacoes):
+        """ Um TX_BATCH por vizinho que o entende; aos restantes, um NEW_TRANSACTION por transação. """
+        dados = [tx.formatar_para_dict() for tx in transacoes]
+        destinos = [v for v in list(self.vizinhos) if v != (self.host, self.porta)]
+        em_lote = [v for v in destinos if v in self.vizinhos_compactos]
+        um_a_um = [v for v in destinos if v not in self.vizinhos_compactos]
+        if em_lote:
+            self.espalhar_mensagem('TX_BATCH', {"transactions": dados}, em_lote)
+        if um_a_um:
+            for tx_data in dados:
+                self.espalhar_mensagem('NEW_TRANSACTION', {"transaction": tx_data}, um_a_um)
+
+    def _receber_bloco(self, bloco_recebido, remetente, bloco_data=None):
+        """ Tenta juntar um bloco anunciado por um vizinho; devolve True se foi validado (novo ou já conhecido). """
+        with self.trava_seguranca:
+            with self.metricas.cronometrar("validacao_bloco"), \
+                    rastreador.span("validar_bloco", "corrente", indice=bloco_recebido.indice):
+                aceite = self.blockchain.adicionar_bloco(bloco_recebido)
+            if aceite:
+                self.blocos_vistos.marcar(bloco_recebido.hash)
+                self._abortar_mineracao()
+                log.info("📦 Novo bloco %s recebido e aceite!", bloco_recebido.indice)
+                self._espalhar_bloco(bloco_recebido, bloco_data)
+                return True
+            if self.blockchain.esta_na_corrente(bloco_recebido) or bloco_recebido.hash in self.blockchain.arvore:
+                # Só se marca o que foi validado: um hash falso não pode impedir o bloco verdadeiro de entrar
+                self.blocos_vistos.marcar(bloco_recebido.hash)
+                return True
+            if remetente and not self.blockchain.conhece_pai(bloco_recebido):
+                # Falta-nos pelo menos um bloco antes deste: pedimos os cabeçalhos a quem o enviou
+                log.info("🧩 Bloco %s sem pai conhecido. A sincronizar com %s...", bloco_recebido.indice, remetente)
+                host_rem, porta_rem = remetente.split(':')
+                self.sincronizador.sincronizar([(host_rem, int(porta_rem))])
+                return True
+            return False
+
+    def _receber_bloco_compacto(self, parcial, remetente):
+        """ Junta um bloco compacto já completo; se o resultado não bater certo com o cabeçalho
+        (ex: um id curto que apontou para a transação errada), pede o bloco inteiro. """
+        if not self._receber_bloco(parcial.montar(), remetente) and remetente:
+            self.estatisticas_compactos["blocos_inteiros"] += 1
+            parcial.em_falta = list(range(len(parcial.transacoes)))
+            self._pedir_transacoes_em_falta(parcial, remetente, recurso=False)
+
+    def _pedir_transacoes_em_falta(self, parcial, remetente, recurso=True):
+        """ Pede a quem anunciou o bloco só as transações que não estavam no nosso mempool. """
+        host_rem, porta_rem = remetente.split(':')
+        self.estatisticas_compactos["transacoes_pedidas"] += len(parcial.em_falta)
+        futuro = self.enviar_direto(host_rem, int(porta_rem), 'GET_BLOCK_TXN', {
+            "hash": parcial.hash,
+            "index": parcial.cabecalho.get("index"),
+            "indexes": parcial.em_falta
+        }, esperar_resposta=True)
+        if futuro is None:
+            return
+
+        def _ao_receber(futuro):
+            if futuro.exception() is not None:
+                return  # Sem resposta: o bloco acaba por chegar pela sincronização
+            resposta = futuro.result().get('payload', {})
+            if resposta.get("hash") != parcial.hash or not parcial.preencher(resposta.get("transactions", [])):
+                return
+            if recurso:
+                self._receber_bloco_compacto(parcial, remetente)
+            else:
+                self._receber_bloco(parcial.montar(), remetente)
+
+        futuro.add_done_callback(_ao_receber)
+
+    def _espalhar_bloco(self, bloco, bloco_data=None):
+        """ Anuncia um bloco: em formato compacto a quem o entende, inteiro aos restantes. """
+        destinos = [v for v in list(self.vizinhos) if v != (self.host, self.porta)]
+        compactos = [v for v in destinos if v in self.vizinhos_compactos]
+        inteiros = [v for v in destinos if v not in self.vizinhos_compactos]
+        if compactos:
+            self.espalhar_mensagem('COMPACT_BLOCK', criar_bloco_compacto(bloco), compactos)
+        if inteiros:
+            # O outro nó espera que o bloco venha dentro da chave "block"
+            self.espalhar_mensagem('NEW_BLOCK', {"block": bloco_data or bloco.formatar_para_dict()}, inteiros)
+
+    def espalhar_mensagem(self, tipo, conteudo, destinos=None):
+        """ Envia a mesma informação para todos os vizinhos conhecidos (ou só para 'destinos'). """
+        if destinos is None:
+            destinos = [v for v in list(self.vizinhos) if v != (self.host, self.porta)]
+        meu_endereco = f"{self.host}:{self.porta}"
+        dicionario_msg = {"type": tipo, "payload": conteudo, "sender": meu_endereco}
+        # Numa fila cheia só interessa o anúncio mais recente da ponta
+        coalescer = 'BLOCO' if tipo in ('NEW_BLOCK', 'COMPACT_BLOCK') else None
+        self.metricas.incrementar(f"mensagens_enviadas.{tipo}", len(destinos))
+        self.transporte.espalhar(destinos, dicionario_msg, coalescer)
+
+    def estatisticas(self):
+        """ Métricas do nó mais o estado de cada vizinho, tal como seguem na resposta ao GET_STATS. """
+        dados = self.metricas.instantaneo()
+        dados["vizinhos"] = self.transporte.estatisticas_vizinhos()
+        dados["blocos_compactos"] = dict(self.estatisticas_compactos)
+        return dados
 
     def parar(self):
         self.ativo = False
-        self.minerando = False
-        if self.socket_servidor:
-            self.socket_servidor.close()
+        self.parar_mineracao()
+        if self.tarefa_mineracao is not None:
+            self.tarefa_mineracao.join(timeout=2)
+        # Quem ainda espalha mensagens (lotes, mineração) para antes do transporte
+        self.lote_transacoes.parar()
+        self.transporte.parar()
+        self.motor_mineracao.encerrar()
+        with self.trava_seguranca:
+            self.blockchain.fechar()
     
     def nova_transacao(self, remetente, destino, valor):
         """ 
@@ -213,13 +464,14 @@ class NoDaRede:
         blockchain local e espalha-a para os vizinhos. 
         """
         # Criamos o objeto de transação usando a nossa classe personalizada
-        tx = self.blockchain.nova_transacao(remetente, destino, valor)
+        with self.trava_seguranca:
+            tx = self.blockchain.nova_transacao(remetente, destino, valor)
         
         if tx:
-            print(f"✅ Transação {tx.id[:8]} criada com sucesso!")
-            # Espalhamos a transação para que outros nós a vejam e minerem
-            self.espalhar_mensagem('NEW_TRANSACTION', {"transaction": tx.formatar_para_dict()})
+            log.debug("✅ Transação %s criada com sucesso!", tx.id[:8])
+            # Espalhamos a transação (no próximo lote) para que outros nós a vejam e minerem
+            self.lote_transacoes.adicionar((tx, True), prioritario=True)
             return tx
         else:
-            print("❌ Falha ao criar transação (verifique o saldo ou os dados).")
+            log.warning("❌ Falha ao criar transação (verifique o saldo ou os dados).")
             return None
\ No newline at end of file
@@ -0,0 +1,42 @@
+import time
+from collections import OrderedDict
+
+
+class CacheVistos:
+    """ Hashes de blocos e ids de transações que este nó já recebeu ou espalhou.
+    Serve para descartar em O(1) as cópias repetidas que chegam pelo gossip, antes de se gastar
+    tempo a reconstruir e validar o objeto. Tem tamanho limitado (sai o mais antigo) e cada
+    entrada expira ao fim de 'validade' segundos. """
+
+    def __init__(self, capacidade=50_000, validade=600):
+        self.capacidade = capacidade
+        self.validade = validade
+        self.entradas = OrderedDict()  # chave -> instante em que foi vista (monotonic)
+        self.suprimidos = 0            # Quantas repetições foram descartadas
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def __contains__(self, chave):
+        visto_em = self.entradas.get(chave)
+        return visto_em is not None and time.monotonic() - visto_em < self.validade
+
+    def marcar(self, chave):
+        """ Regista a chave como vista (ex: um bloco minerado ou uma transação criada aqui). """
+        agora = time.monotonic()
+        self.entradas[chave] = agora
+        self.entradas.move_to_end(chave)
+        # As entradas estão por ordem de chegada: as expiradas e as que passam da capacidade estão à frente
+        while self.entradas:
+            mais_antiga = next(iter(self.entradas.values()))
+            if len(self.entradas) <= self.capacidade and agora - mais_antiga < self.validade:
+                break
+            self.entradas.popitem(last=False)
+
+    def repetido(self, chave):
+        """ True se a chave já foi vista (e conta a repetição); não a marca. """
+        if chave in self:
+            self.suprimidos += 1
+            return True
+        return False
+
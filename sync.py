@@ -0,0 +1,254 @@
+import logging
+from collections import deque
+from block import Bloco
+from framing import TAMANHO_MAXIMO_TRAMA
+
+log = logging.getLogger(__name__)
+
+# Cabeçalhos pedidos de cada vez (é também o tamanho da janela de blocos a descarregar)
+MAX_CABECALHOS = 2000
+# Blocos por pedido GET_BLOCKS
+BLOCOS_POR_LOTE = 100
+# Pedidos de blocos em simultâneo a cada vizinho
+MAX_LOTES_POR_VIZINHO = 4
+# Máximo de blocos que se envia numa resposta BLOCKS, seja qual for o pedido
+MAX_BLOCOS_POR_PEDIDO = 500
+# ...e de bytes (em JSON): com blocos grandes a resposta traz menos e o resto é pedido a seguir
+MAX_BYTES_POR_PEDIDO = TAMANHO_MAXIMO_TRAMA // 2
+# Blocos de um ramo que se guardam em memória enquanto ainda não pesa mais do que a nossa corrente:
+# é também a bifurcação mais funda que a sincronização aceita
+MAX_BLOCOS_RAMO = 2 * MAX_CABECALHOS
+
+
+class SincronizadorCorrente:
+    """ Sincronização "cabeçalhos primeiro".
+    1. Pede GET_HEADERS (com o localizador da nossa corrente) aos vizinhos; cada um responde com
+       os cabeçalhos a seguir ao último bloco em comum e com a altura da sua ponta.
+    2. Escolhe o vizinho com a corrente mais pesada e confere os cabeçalhos (ligação e trabalho).
+    3. Descarrega os corpos em lotes (GET_BLOCKS) de vários vizinhos em paralelo, confere cada
+       bloco com o hash do cabeçalho e aplica-os pela ordem, à medida que chegam.
+    Trabalha por janelas de MAX_CABECALHOS blocos e um ramo ainda mais leve do que a nossa corrente
+    nunca passa de MAX_BLOCOS_RAMO blocos, por isso a memória usada não depende do tamanho da
+    corrente, e só se transfere o que falta. Corre nas respostas do transporte, sempre com a trava do nó. """
+
+    def __init__(self, no):
+        self.no = no
+        self.alturas = {}           # vizinho -> altura da ponta anunciada
+        self.lider = None           # Vizinho cuja corrente estamos a seguir
+        self.cabecalhos = []        # Hashes esperados da janela atual
+        self.inicio_janela = 0      # Altura do primeiro cabeçalho da janela
+        self.por_pedir = deque()    # Lotes (inicio, quantidade) ainda não pedidos
+        self.em_voo = {}            # inicio do lote -> vizinho a quem foi pedido
+        self.recebidos = {}         # inicio do lote -> blocos já conferidos, à espera de vez
+        self.proximo = 0            # Próxima altura a aplicar
+        self.ramo = []              # Blocos aplicáveis que ainda não pesam mais do que a nossa corrente
+        self.inicio_ramo = 0
+        self.excluidos = set()      # Vizinhos que falharam nesta sincronização
+        self.blocos_descarregados = 0
+
+    @property
+    def ativo(self):
+        return self.lider is not None
+
+    # --- CABEÇALHOS ---
+
+    def sincronizar(self, vizinhos):
+        """ Pergunta aos vizinhos pelos cabeçalhos que nos faltam. """
+        localizador = self.no.blockchain.localizador()
+        for vizinho in vizinhos:
+            self._pedir_cabecalhos(vizinho, localizador)
+
+    def _pedir_cabecalhos(self, vizinho, localizador):
+        futuro = self.no.enviar_direto(vizinho[0], vizinho[1], 'GET_HEADERS',
+                                       {"locator": localizador, "limit": MAX_CABECALHOS}, esperar_resposta=True)
+        if futuro is not None:
+            futuro.add_done_callback(lambda f: self._ao_receber_cabecalhos(vizinho, f))
+
+    def _ao_receber_cabecalhos(self, vizinho, futuro):
+        with self.no.trava_seguranca:
+            if futuro.exception() is not None:
+                if self.lider == vizinho:
+                    self._terminar("o vizinho deixou de responder")
+                elif vizinho not in self.alturas:
+                    # Não conhece o protocolo novo (ou está offline): fica o pedido da corrente inteira
+                    self.no.enviar_direto(vizinho[0], vizinho[1], 'REQUEST_CHAIN', {})
+                return
+
+            dados = futuro.result().get('payload', {})
+            self.alturas[vizinho] = dados.get("height", -1)
+            self.no.vizinhos_compactos.add(vizinho)
+            cabecalhos = dados.get("headers", [])
+
+            if self.ativo:
+                if vizinho == self.lider:
+                    self._nova_janela(cabecalhos)
+                else:
+                    self._distribuir()  # Mais um vizinho para ajudar a descarregar
+                return
+
+            blockchain = self.no.blockchain
+            # O localizador é esparso: os primeiros cabeçalhos podem ser de blocos que já temos
+            comuns = 0
+            while comuns < len(cabecalhos) and self._ja_temos(cabecalhos[comuns]):
+                comuns += 1
+            cabecalhos = cabecalhos[comuns:]
+            if cabecalhos and self.alturas[vizinho] >= len(blockchain.corrente):
+                self.lider = vizinho
+                self.excluidos.clear()
+                self.ramo, self.inicio_ramo = [], cabecalhos[0].get("index", 0)
+                log.info("🔎 A sincronizar com %s:%s (altura %s)...", vizinho[0], vizinho[1], self.alturas[vizinho])
+                self._nova_janela(cabecalhos)
+
+    def _ja_temos(self, cabecalho):
+        corrente = self.no.blockchain.corrente
+        altura = cabecalho.get("index")
+        return isinstance(altura, int) and 0 <= altura < len(corrente) and corrente[altura].hash == cabecalho.get("hash")
+
+    def _cabecalhos_validos(self, cabecalhos):
+        """ Confere que os cabeçalhos formam uma cadeia, presa à nossa corrente (ou à janela anterior),
+        e que cada hash tem o trabalho exigido. O conteúdo é conferido quando chegarem os corpos. """
+        blockchain = self.no.blockchain
+        primeiro = cabecalhos[0]
+        if self.cabecalhos:
+            anterior_hash, altura = self.cabecalhos[-1], self.inicio_janela + len(self.cabecalhos)
+        else:
+            altura = primeiro.get("index")
+            if not isinstance(altura, int) or not 0 <= altura <= len(blockchain.corrente):
+                return False
+            # Um génesis diferente do nosso é aceite tal como no replace_chain
+            anterior_hash = blockchain.corrente[altura - 1].hash if altura > 0 else primeiro.get("previous_hash")
+
+        alvo = "0" * blockchain.dificuldade
+        for cabecalho in cabecalhos:
+            hash_bloco = cabecalho.get("hash") or ""
+            if (cabecalho.get("index") != altura or cabecalho.get("previous_hash") != anterior_hash
+                    or (altura > 0 and not hash_bloco.startswith(alvo))):
+                return False
+            anterior_hash, altura = hash_bloco, altura + 1
+        return True
+
+    def _nova_janela(self, cabecalhos):
+        if not cabecalhos:
+            self._terminar()
+            return
+        if not self._cabecalhos_validos(cabecalhos):
+            self._terminar("cabeçalhos inválidos")
+            return
+
+        self.inicio_janela = cabecalhos[0]["index"]
+        self.cabecalhos = [c["hash"] for c in cabecalhos]
+        self.proximo = self.inicio_janela
+        self.recebidos.clear()
+        self.por_pedir = deque(
+            (inicio, min(BLOCOS_POR_LOTE, self.inicio_janela + len(cabecalhos) - inicio))
+            for inicio in range(self.inicio_janela, self.inicio_janela + len(cabecalhos), BLOCOS_POR_LOTE)
+        )
+        self._distribuir()
+
+    # --- CORPOS ---
+
+    def _candidatos(self, fim):
+        """ Vizinhos que anunciaram ter pelo menos até 'fim', com espaço para mais um pedido. """
+        ocupacao = {}
+        for vizinho in self.em_voo.values():
+            ocupacao[vizinho] = ocupacao.get(vizinho, 0) + 1
+        return sorted(
+            (v for v, altura in self.alturas.items()
+             if altura >= fim and v not in self.excluidos and ocupacao.get(v, 0) < MAX_LOTES_POR_VIZINHO),
+            key=lambda v: ocupacao.get(v, 0)
+        )
+
+    def _distribuir(self):
+        """ Reparte os lotes que faltam pelos vizinhos disponíveis. """
+        while self.por_pedir:
+            inicio, quantidade = self.por_pedir[0]
+            candidatos = self._candidatos(inicio + quantidade - 1)
+            if not candidatos:
+                if not self.em_voo:
+                    self._terminar("nenhum vizinho tem os blocos em falta")
+                return
+            self.por_pedir.popleft()
+            self._pedir_blocos(candidatos[0], inicio, quantidade)
+
+    def _pedir_blocos(self, vizinho, inicio, quantidade):
+        self.em_voo[inicio] = vizinho
+        futuro = self.no.enviar_direto(vizinho[0], vizinho[1], 'GET_BLOCKS',
+                                       {"start": inicio, "count": quantidade}, esperar_resposta=True)
+        if futuro is None:
+            return
+        futuro.add_done_callback(lambda f: self._ao_receber_blocos(vizinho, inicio, quantidade, f))
+
+    def _ao_receber_blocos(self, vizinho, inicio, quantidade, futuro):
+        with self.no.trava_seguranca:
+            if self.em_voo.get(inicio) != vizinho:
+                return  # Resposta de uma janela ou sincronização que já acabou
+            del self.em_voo[inicio]
+
+            blocos = None
+            if futuro.exception() is None:
+                blocos = self._conferir_lote(inicio, quantidade, futuro.result().get('payload', {}))
+            if blocos is None:
+                # O lote volta para a frente da fila e o vizinho deixa de ser usado nesta sincronização
+                self.excluidos.add(vizinho)
+                self.por_pedir.appendleft((inicio, quantidade))
+                self._distribuir()
+                return
+
+            if len(blocos) < quantidade:
+                # O vizinho cortou a resposta pelo tamanho: o que falta volta para a frente da fila
+                self.por_pedir.appendleft((inicio + len(blocos), quantidade - len(blocos)))
+            self.blocos_descarregados += len(blocos)
+            self.recebidos[inicio] = blocos
+            self._aplicar_prontos()
+            self._distribuir()
+
+    def _conferir_lote(self, inicio, quantidade, dados):
+        """ Reconstrói os blocos do lote e confirma que são os anunciados nos cabeçalhos.
+        A resposta pode trazer só os primeiros blocos do lote (ver MAX_BYTES_POR_PEDIDO). """
+        lista = dados.get("blocks", [])
+        if dados.get("start") != inicio or not 0 < len(lista) <= quantidade:
+            return None
+        esperados = self.cabecalhos[inicio - self.inicio_janela:inicio - self.inicio_janela + len(lista)]
+        if [b.get("hash") for b in lista] != esperados:
+            return None
+        try:
+            return [Bloco.restaurar_de_dict(b) for b in lista]
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _aplicar_prontos(self):
+        """ Junta ao ramo os lotes que já podem ser aplicados por ordem e adota-o quando pesar mais. """
+        blockchain = self.no.blockchain
+        while self.proximo in self.recebidos:
+            lote = self.recebidos.pop(self.proximo)
+            self.ramo.extend(lote)
+            self.proximo += len(lote)
+
+        fim_ramo = self.inicio_ramo + len(self.ramo) - 1
+        if self.ramo and blockchain.trabalho_ate(fim_ramo) > blockchain.trabalho_ate(len(blockchain.corrente) - 1):
+            if not blockchain.adotar_ramo(self.inicio_ramo, self.ramo):
+                self._terminar("blocos inválidos")
+                return
+            self.no._abortar_mineracao()
+            log.info("✅ Corrente sincronizada até ao bloco %s.", fim_ramo)
+            self.ramo, self.inicio_ramo = [], fim_ramo + 1
+        elif len(self.ramo) > MAX_BLOCOS_RAMO:
+            self._terminar("bifurcação mais funda do que %d blocos" % MAX_BLOCOS_RAMO)
+            return
+
+        if self.proximo == self.inicio_janela + len(self.cabecalhos) and not self.em_voo:
+            if self.alturas.get(self.lider, -1) >= self.proximo:
+                # Ainda há mais: pede a janela seguinte a partir do último cabeçalho desta
+                self._pedir_cabecalhos(self.lider, [[self.proximo - 1, self.cabecalhos[-1]]])
+            else:
+                self._terminar()
+
+    def _terminar(self, motivo=None):
+        if motivo:
+            log.warning("⚠️ Sincronização interrompida: %s.", motivo)
+        self.lider = None
+        self.cabecalhos = []
+        self.por_pedir.clear()
+        self.em_voo.clear()
+        self.recebidos.clear()
+        self.ramo = []
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto estão na raiz do repositório (sem pacote)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Bloco  # noqa: E402
+from blockchain import RedeBlockchain  # noqa: E402
+from transaction import Transacao  # noqa: E402
+
+
+@pytest.fixture
+def corrente():
+    """ Corrente em memória com dificuldade 1, para os blocos se minerarem num instante. """
+    blockchain = RedeBlockchain(dificuldade=1)
+    yield blockchain
+    blockchain.fechar()
+
+
+@pytest.fixture
+def minerar():
+    """ minerar(blockchain, transacoes, anterior=None) -> bloco minerado sobre 'anterior' (a ponta, por omissão). """
+    def _minerar(blockchain, transacoes, anterior=None, versao=None):
+        anterior = anterior or blockchain.obter_ultimo_bloco()
+        bloco = Bloco(anterior.indice + 1, anterior.hash, list(transacoes),
+                      versao=versao or blockchain.versao_bloco)
+        bloco.minerar(blockchain.dificuldade)
+        return bloco
+    return _minerar
+
+
+@pytest.fixture
+def financiar(minerar):
+    """ financiar(blockchain, endereco, valor) -> bloco com uma recompensa para o endereço, já na corrente. """
+    def _financiar(blockchain, endereco, valor=50.0):
+        bloco = minerar(blockchain, [Transacao("sistema", endereco, valor)])
+        assert blockchain.adicionar_bloco(bloco)
+        return bloco
+    return _financiar
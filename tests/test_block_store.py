@@ -0,0 +1,210 @@
+import os
+
+import blockchain as modulo_blockchain
+from block_store import ArmazemBlocos, CABECALHO_REGISTO, ENTRADA_TRANSACAO, TAMANHO_ENTRADA_INDICE
+from blockchain import RedeBlockchain
+from transaction import Transacao
+
+
+def _id(altura, posicao):
+    return f"{altura:032x}{posicao:032x}"
+
+
+def _armazem_com(pasta, quantidade):
+    armazem = ArmazemBlocos(pasta)
+    for altura in range(quantidade):
+        transacoes = [{"id": _id(altura, p)} for p in range(altura % 3)]
+        armazem.acrescentar({"index": altura, "dados": "x" * altura, "transactions": transacoes})
+    armazem.fechar()
+
+
+def _ids_ate(altura):
+    return {_id(a, p): a for a in range(altura) for p in range(a % 3)}
+
+
+def _tamanho(pasta, nome):
+    return os.path.getsize(os.path.join(pasta, nome))
+
+
+def _cortar(pasta, nome, tamanho):
+    with open(os.path.join(pasta, nome), "r+b") as f:
+        f.truncate(tamanho)
+
+
+def test_reabrir_le_os_blocos_sem_reparar_nada(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 3)
+    tamanho_dados = _tamanho(pasta, "blocos.dat")
+
+    armazem = ArmazemBlocos(pasta)
+    assert [armazem.ler(a)["index"] for a in range(len(armazem))] == [0, 1, 2]
+    armazem.fechar()
+    assert _tamanho(pasta, "blocos.dat") == tamanho_dados
+    assert _tamanho(pasta, "blocos.idx") == 3 * TAMANHO_ENTRADA_INDICE
+
+
+def test_registo_cortado_a_meio_e_descartado(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 3)
+    armazem = ArmazemBlocos(pasta)
+    fim_do_segundo = armazem.posicoes[2]
+    armazem.fechar()
+    # A falha apanhou a escrita do último registo a meio
+    _cortar(pasta, "blocos.dat", _tamanho(pasta, "blocos.dat") - 5)
+
+    armazem = ArmazemBlocos(pasta)
+    assert len(armazem) == 2
+    assert armazem.ler(1)["index"] == 1
+    armazem.acrescentar({"index": 2, "dados": "novo"})
+    armazem.fechar()
+
+    assert _tamanho(pasta, "blocos.idx") == 3 * TAMANHO_ENTRADA_INDICE
+    armazem = ArmazemBlocos(pasta)
+    assert armazem.posicoes[2] == fim_do_segundo
+    assert armazem.ler(2)["dados"] == "novo"
+    armazem.fechar()
+
+
+def test_so_o_cabecalho_do_registo_chegou_ao_disco(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 2)
+    armazem = ArmazemBlocos(pasta)
+    fim = armazem.posicoes[1]
+    armazem.fechar()
+    _cortar(pasta, "blocos.dat", fim + CABECALHO_REGISTO.size)
+
+    armazem = ArmazemBlocos(pasta)
+    assert len(armazem) == 1
+    armazem.fechar()
+    assert _tamanho(pasta, "blocos.dat") == fim
+
+
+def test_registo_corrompido_e_descartado(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 2)
+    with open(os.path.join(pasta, "blocos.dat"), "r+b") as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b"??")
+
+    armazem = ArmazemBlocos(pasta)
+    assert len(armazem) == 1
+    armazem.fechar()
+
+
+def test_indice_atrasado_ou_cortado_e_refeito(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 4)
+    # Os dados chegaram ao disco mas o índice só tem uma entrada e meia
+    _cortar(pasta, "blocos.idx", TAMANHO_ENTRADA_INDICE + 3)
+
+    armazem = ArmazemBlocos(pasta)
+    assert [armazem.ler(a)["index"] for a in range(len(armazem))] == [0, 1, 2, 3]
+    armazem.fechar()
+    assert _tamanho(pasta, "blocos.idx") == 4 * TAMANHO_ENTRADA_INDICE
+
+
+def test_truncar_apaga_o_sufixo(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 3)
+    armazem = ArmazemBlocos(pasta)
+    inicio_do_segundo = armazem.posicoes[1]
+    armazem.truncar(1)
+    armazem.fechar()
+
+    assert _tamanho(pasta, "blocos.dat") == inicio_do_segundo
+    armazem = ArmazemBlocos(pasta)
+    assert len(armazem) == 1
+    armazem.fechar()
+
+
+def test_corrente_recupera_depois_de_perder_a_ponta(tmp_path, minerar):
+    pasta = str(tmp_path)
+    blockchain = RedeBlockchain(dificuldade=1, armazem=ArmazemBlocos(pasta))
+    for destino in ("alice", "bob"):
+        assert blockchain.adicionar_bloco(minerar(blockchain, [Transacao("sistema", destino, 50.0)]))
+    penultimo = blockchain.corrente[-2].hash
+    blockchain.fechar()
+    # O último bloco perdeu-se, mas o instantâneo dos saldos ainda o conta
+    _cortar(pasta, "blocos.dat", _tamanho(pasta, "blocos.dat") - 1)
+
+    reaberta = RedeBlockchain(dificuldade=1, armazem=ArmazemBlocos(pasta))
+    try:
+        assert len(reaberta.corrente) == 2
+        assert reaberta.obter_ultimo_bloco().hash == penultimo
+        assert reaberta.consultar_saldo("alice") == 50.0
+        assert reaberta.consultar_saldo("bob") == 0.0
+        assert reaberta.verificar_rede_valida()
+        assert reaberta.verificar_indice_saldos() == {}
+    finally:
+        reaberta.fechar()
+
+
+def test_indice_das_transacoes_acompanha_os_blocos(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 6)
+    armazem = ArmazemBlocos(pasta)
+    assert dict(armazem.ids_confirmados()) == _ids_ate(6)
+    armazem.truncar(4)
+    assert dict(armazem.ids_confirmados()) == _ids_ate(4)
+    armazem.fechar()
+
+
+def test_indice_das_transacoes_cortado_ou_em_falta_e_refeito(tmp_path):
+    pasta = str(tmp_path)
+    _armazem_com(pasta, 6)
+    # Uma entrada e meia do último bloco com transações ficou por escrever
+    _cortar(pasta, "transacoes.idx", _tamanho(pasta, "transacoes.idx") - ENTRADA_TRANSACAO.size - 7)
+    armazem = ArmazemBlocos(pasta)
+    assert dict(armazem.ids_confirmados()) == _ids_ate(6)
+    armazem.fechar()
+
+    # Um armazém de antes deste índice é indexado ao abrir
+    os.remove(os.path.join(pasta, "transacoes.idx"))
+    armazem = ArmazemBlocos(pasta)
+    assert dict(armazem.ids_confirmados()) == _ids_ate(6)
+    armazem.fechar()
+
+    # Blocos perdidos levam as entradas deles
+    _cortar(pasta, "blocos.dat", _tamanho(pasta, "blocos.dat") - 1)
+    armazem = ArmazemBlocos(pasta)
+    assert dict(armazem.ids_confirmados()) == _ids_ate(5)
+    armazem.fechar()
+
+
+def test_instantaneo_periodico_encurta_o_arranque_depois_de_uma_falha(tmp_path, minerar, monkeypatch):
+    monkeypatch.setattr(modulo_blockchain, "INSTANTANEO_CADA", 4)
+    pasta = str(tmp_path)
+    blockchain = RedeBlockchain(dificuldade=1, armazem=ArmazemBlocos(pasta))
+    for altura in range(9):
+        assert blockchain.adicionar_bloco(minerar(blockchain, [Transacao("sistema", f"m{altura % 3}", 50.0)]))
+    tx = blockchain.nova_transacao("m0", "bob", 5)
+    assert blockchain.adicionar_bloco(minerar(blockchain, [tx]))
+    saldos = dict(blockchain.saldos)
+    # Falha: o processo morre sem fechar() (os ficheiros ficam como estão)
+
+    aplicados = []
+    aplicar = RedeBlockchain._aplicar_bloco
+    monkeypatch.setattr(RedeBlockchain, "_aplicar_bloco",
+                        lambda self, bloco, sinal=1: (aplicados.append(bloco.indice), aplicar(self, bloco, sinal)))
+    reaberta = RedeBlockchain(dificuldade=1, armazem=ArmazemBlocos(pasta))
+    try:
+        assert len(reaberta.corrente) == 11
+        assert aplicados == [8, 9, 10]
+        assert reaberta.saldos == saldos
+        assert "confirmadas" not in reaberta.armazem.carregar_estado()
+        assert not reaberta.adicionar_transacao(Transacao.restaurar_de_dict(tx.formatar_para_dict()))
+        assert reaberta.verificar_indice_saldos() == {}
+    finally:
+        reaberta.fechar()
+
+
+def test_ids_que_nao_sao_hashes_ficam_fora_do_indice(tmp_path):
+    pasta = str(tmp_path)
+    armazem = ArmazemBlocos(pasta)
+    armazem.acrescentar({"index": 0, "transactions": [{"id": "antigo"}, {"id": _id(0, 1)}, {"id": "AB" * 32}]})
+    armazem.fechar()
+    os.remove(os.path.join(pasta, "transacoes.idx"))
+
+    armazem = ArmazemBlocos(pasta)
+    assert dict(armazem.ids_confirmados()) == {_id(0, 1): 0}
+    armazem.fechar()
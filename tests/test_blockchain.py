@@ -0,0 +1,240 @@
+import json
+
+import blockchain as modulo_blockchain
+from block_store import ArmazemBlocos
+from blockchain import RedeBlockchain
+from transaction import Transacao
+
+
+def _copia(tx):
+    """ A mesma transação tal como chegaria pela rede. """
+    return Transacao.restaurar_de_dict(tx.formatar_para_dict())
+
+
+def test_transacao_confirmada_nao_volta_a_entrar(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    tx = corrente.nova_transacao("alice", "bob", 10)
+    assert corrente.adicionar_bloco(minerar(corrente, corrente.transacoes_pendentes))
+
+    assert not corrente.adicionar_transacao(_copia(tx))
+    assert corrente.adicionar_transacoes([_copia(tx)]) == []
+    assert len(corrente.mempool) == 0
+    assert corrente.consultar_saldo("alice") == 40.0
+    assert corrente.consultar_saldo("bob") == 10.0
+
+
+def test_bloco_com_transacao_ja_confirmada_e_recusado(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    tx = corrente.nova_transacao("alice", "bob", 10)
+    assert corrente.adicionar_bloco(minerar(corrente, [tx]))
+
+    altura = len(corrente.corrente)
+    assert not corrente.adicionar_bloco(minerar(corrente, [_copia(tx)]))
+    assert len(corrente.corrente) == altura
+    assert corrente.consultar_saldo("bob") == 10.0
+
+
+def test_bloco_com_transacao_repetida_e_recusado(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    tx = Transacao("alice", "bob", 10)
+    assert not corrente.adicionar_bloco(minerar(corrente, [tx, _copia(tx)]))
+    assert corrente.consultar_saldo("bob") == 0.0
+
+
+def test_ramo_lateral_com_transacao_ja_confirmada_nao_ganha(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    tx = corrente.nova_transacao("alice", "bob", 10)
+    bloco_tx = minerar(corrente, [tx])
+    assert corrente.adicionar_bloco(bloco_tx)
+    ponta = minerar(corrente, [])
+    assert corrente.adicionar_bloco(ponta)
+
+    # Ramo que parte de depois da transação e a repete: ao ganhar, ela ficaria confirmada duas vezes
+    lateral = minerar(corrente, [Transacao("sistema", "carol", 50)], anterior=bloco_tx)
+    assert not corrente.adicionar_bloco(lateral)
+    repetido = minerar(corrente, [_copia(tx)], anterior=lateral)
+    assert not corrente.adicionar_bloco(repetido)
+    assert repetido.hash not in corrente.arvore
+    assert corrente.obter_ultimo_bloco().hash == ponta.hash
+    assert corrente.consultar_saldo("bob") == 10.0
+
+
+def test_transacao_desfeita_por_reorganizacao_pode_voltar(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    tx = corrente.nova_transacao("alice", "bob", 10)
+    assert corrente.adicionar_bloco(minerar(corrente, [tx]))
+
+    # Um ramo mais pesado sem a transação: ela deixa de estar confirmada e pode ser minerada outra vez
+    base = corrente.corrente[1]
+    primeiro = minerar(corrente, [Transacao("sistema", "carol", 50)], anterior=base)
+    corrente.adicionar_bloco(primeiro)
+    assert corrente.adicionar_bloco(minerar(corrente, [], anterior=primeiro))
+    assert tx.id not in corrente.confirmadas
+    assert corrente.adicionar_bloco(minerar(corrente, [_copia(tx)]))
+    assert corrente.consultar_saldo("bob") == 10.0
+
+
+def test_transacoes_confirmadas_sobrevivem_ao_reinicio(tmp_path, minerar):
+    blockchain = RedeBlockchain(dificuldade=1, armazem=ArmazemBlocos(str(tmp_path)))
+    bloco = minerar(blockchain, [Transacao("sistema", "alice", 50)])
+    assert blockchain.adicionar_bloco(bloco)
+    tx = blockchain.nova_transacao("alice", "bob", 10)
+    assert blockchain.adicionar_bloco(minerar(blockchain, [tx]))
+    blockchain.fechar()
+
+    reaberta = RedeBlockchain(dificuldade=1, armazem=ArmazemBlocos(str(tmp_path)))
+    try:
+        assert not reaberta.adicionar_transacao(_copia(tx))
+        assert reaberta.consultar_saldo("bob") == 10.0
+    finally:
+        reaberta.fechar()
+
+
+def test_resposta_de_blocos_cortada_pelo_tamanho(corrente, minerar):
+    for i in range(5):
+        assert corrente.adicionar_bloco(minerar(corrente, [Transacao("sistema", f"m{i}-{j}", 50) for j in range(20)]))
+    tamanhos = [len(json.dumps(corrente.corrente[altura].formatar_para_dict())) for altura in range(1, 4)]
+
+    assert len(corrente.blocos_em_dict(1, 10)) == 5
+    assert len(corrente.blocos_em_dict(1, 10, max_bytes=sum(tamanhos[:2]) + tamanhos[2] // 2)) == 2
+    # Um bloco maior do que o limite ainda vai, sozinho
+    assert len(corrente.blocos_em_dict(1, 10, max_bytes=1)) == 1
+
+
+def test_resposta_de_blocos_cortada_pelo_tamanho_com_armazem(tmp_path, minerar):
+    blockchain = RedeBlockchain(dificuldade=1, armazem=ArmazemBlocos(str(tmp_path)))
+    try:
+        for i in range(5):
+            assert blockchain.adicionar_bloco(minerar(blockchain, [Transacao("sistema", f"m{i}-{j}", 50) for j in range(20)]))
+        # O limite conta os bytes gravados de cada bloco: cabem os três primeiros e metade do quarto
+        tamanhos = [blockchain.armazem.tamanho(altura) for altura in range(1, 5)]
+        blocos = blockchain.blocos_em_dict(1, 10, max_bytes=sum(tamanhos[:3]) + tamanhos[3] // 2)
+        assert [b["index"] for b in blocos] == [1, 2, 3]
+    finally:
+        blockchain.fechar()
+
+
+# --- REORGANIZAÇÕES ---
+
+def _ramo(minerar, blockchain, anterior, listas):
+    """ Blocos encadeados a partir de 'anterior', um por lista de transações. """
+    blocos = []
+    for transacoes in listas:
+        anterior = minerar(blockchain, transacoes, anterior=anterior)
+        blocos.append(anterior)
+    return blocos
+
+
+def test_ramo_mais_pesado_torna_se_a_corrente(corrente, minerar, financiar):
+    base = financiar(corrente, "alice")
+    principal = _ramo(minerar, corrente, base, [[Transacao("sistema", "m1", 50)]])
+    assert corrente.adicionar_bloco(principal[0])
+
+    lateral = _ramo(minerar, corrente, base, [[Transacao("sistema", "m2", 50)], []])
+    assert not corrente.adicionar_bloco(lateral[0])
+    assert lateral[0].hash in corrente.arvore
+    assert corrente.adicionar_bloco(lateral[1])
+
+    assert [b.hash for b in corrente.corrente[2:]] == [b.hash for b in lateral]
+    assert corrente.reorganizacoes == 1
+    assert corrente.consultar_saldo("m1") == 0.0 and corrente.consultar_saldo("m2") == 50.0
+    assert principal[0].hash in corrente.arvore  # O ramo que perdeu ainda pode voltar a ganhar
+    assert corrente.verificar_indice_saldos() == {}
+
+
+def test_transacao_desfeita_volta_ao_mempool(corrente, minerar, financiar):
+    base = financiar(corrente, "alice")
+    tx = corrente.nova_transacao("alice", "bob", 10)
+    assert corrente.adicionar_bloco(minerar(corrente, [tx]))
+
+    lateral = _ramo(minerar, corrente, base, [[], []])
+    corrente.adicionar_bloco(lateral[0])
+    assert corrente.adicionar_bloco(lateral[1])
+    assert tx.id in corrente.mempool
+    assert tx in corrente.modelo.obter()[2]
+
+
+def test_transacao_desfeita_em_conflito_com_o_novo_ramo_nao_volta(corrente, minerar, financiar):
+    base = financiar(corrente, "alice")
+    para_bob = corrente.nova_transacao("alice", "bob", 40)
+    assert corrente.adicionar_bloco(minerar(corrente, [para_bob]))
+
+    # O outro ramo gasta o mesmo dinheiro noutra transação e fica mais pesado
+    para_carol = Transacao("alice", "carol", 40)
+    lateral = _ramo(minerar, corrente, base, [[para_carol], []])
+    corrente.adicionar_bloco(lateral[0])
+    assert corrente.adicionar_bloco(lateral[1])
+
+    assert para_bob.id not in corrente.mempool
+    assert para_bob not in corrente.modelo.obter()[2]
+    assert corrente.consultar_saldo("alice") == 10.0
+    assert corrente.verificar_indice_saldos() == {}
+
+
+def test_pendente_que_dependia_do_ramo_desfeito_sai_do_mempool(corrente, minerar, financiar):
+    base = financiar(corrente, "alice")
+    assert corrente.adicionar_bloco(minerar(corrente, [Transacao("sistema", "dave", 50)]))
+    gasto = corrente.nova_transacao("dave", "erin", 10)
+    fica = corrente.nova_transacao("alice", "erin", 5)
+
+    lateral = _ramo(minerar, corrente, base, [[], []])
+    corrente.adicionar_bloco(lateral[0])
+    assert corrente.adicionar_bloco(lateral[1])
+
+    assert gasto.id not in corrente.mempool
+    assert fica.id in corrente.mempool
+    assert corrente.consultar_saldo("dave") == 0.0
+
+
+def test_replace_chain_so_troca_a_partir_da_bifurcacao(corrente, minerar, financiar):
+    base = financiar(corrente, "alice")
+    assert corrente.adicionar_bloco(minerar(corrente, []))
+
+    outra = list(corrente.corrente[:2]) + _ramo(minerar, corrente, base, [[], [], []])
+    assert corrente.ponto_bifurcacao([b.hash for b in outra]) == 2
+    assert corrente.replace_chain(outra)
+    assert [b.hash for b in corrente.corrente] == [b.hash for b in outra]
+    assert not corrente.replace_chain(outra[:-1])
+
+
+def test_ramo_invalido_nao_e_adotado(corrente, minerar, financiar):
+    base = financiar(corrente, "alice")
+    lateral = _ramo(minerar, corrente, base, [[], []])
+    lateral[1].nonce += 1  # Conteúdo alterado depois de minerado
+    assert not corrente.adotar_ramo(2, lateral)
+    assert len(corrente.corrente) == 2
+
+
+def test_bloco_com_id_forjado_e_recusado(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    verdadeira = corrente.nova_transacao("alice", "bob", 10)
+    # Outra transação com o id da que está no mempool: tirá-la-ia de lá sem ela ser confirmada
+    forjada = Transacao("alice", "mallory", 10, data_hora=verdadeira.data_hora, id_transacao=verdadeira.id)
+
+    assert not corrente.adicionar_bloco(minerar(corrente, [forjada]))
+    assert verdadeira.id in corrente.mempool
+    assert not corrente.validar_outra_corrente(list(corrente.corrente) + [minerar(corrente, [forjada])])
+    assert corrente.adicionar_bloco(minerar(corrente, [verdadeira]))
+    assert corrente.consultar_saldo("bob") == 10.0
+
+
+def test_validacao_paralela_de_outra_corrente(monkeypatch, minerar):
+    # Com o limiar baixo, os hashes da corrente recebida são conferidos no pool de processos
+    monkeypatch.setattr(modulo_blockchain, "LIMIAR_VALIDACAO_PARALELA", 2)
+    blockchain = RedeBlockchain(dificuldade=1, processos_validacao=2)
+    try:
+        outra = [blockchain.corrente[0]] + _ramo(minerar, blockchain, blockchain.corrente[0],
+                                                 [[Transacao("sistema", f"m{i}", 50)] for i in range(6)])
+        assert blockchain.validar_outra_corrente(outra)
+        assert blockchain._executor_validacao is not None
+
+        alterado = minerar(blockchain, [], anterior=outra[3])
+        alterado.nonce += 1  # Conteúdo alterado depois de minerado
+        assert not blockchain.validar_outra_corrente(outra[:4] + [alterado])
+
+        # Blocos minerados para uma dificuldade menor do que a nossa
+        blockchain.dificuldade = 4
+        assert not blockchain.validar_outra_corrente(outra)
+    finally:
+        blockchain.fechar()
+    assert blockchain._executor_validacao is None
@@ -0,0 +1,70 @@
+import json
+import zlib
+
+import pytest
+
+import codec
+from block import Bloco, VERSAO_MERKLE
+from transaction import Transacao
+
+
+def _bloco(indice, transacoes=3, versao=VERSAO_MERKLE):
+    txs = [Transacao("sistema", "minerador", 50.0)]
+    txs += [Transacao(f"conta{i}", f"conta{i + 1}", 1.5 + i) for i in range(transacoes)]
+    return Bloco(indice, "ab" * 32, txs, nonce=indice, versao=versao)
+
+
+@pytest.mark.parametrize("mensagem", [
+    {},
+    {"type": "PING", "payload": {}, "id": 7},
+    {"a": [1, -1, 0, 2 ** 62, -(2 ** 70)], "b": [1.0, -0.5, 1e300], "c": [None, True, False]},
+    {"texto": "ação ✓", "hash": "0f" * 32, "quase_hash": "0F" * 32, "vazio": ""},
+    {"lista": [{"x": 1}, {"x": 2}, {"y": "a"}, {"y": "b"}, 3]},
+])
+def test_ida_e_volta_igual_ao_json(mensagem):
+    assert codec.descodificar(codec.codificar(mensagem)) == json.loads(json.dumps(mensagem))
+
+
+def test_blocos_voltam_com_os_mesmos_tipos_e_hash():
+    blocos = [_bloco(i).formatar_para_dict() for i in range(1, 40)]
+    blocos.append(_bloco(40, versao=1).formatar_para_dict())
+    corpo = codec.codificar({"type": "BLOCKS", "payload": {"start": 1, "blocks": blocos}})
+    assert corpo[0] == codec.FORMATO_BINARIO_ZLIB
+    assert len(corpo) < len(json.dumps(blocos))
+
+    recebidos = codec.descodificar(corpo)["payload"]["blocks"]
+    assert recebidos == blocos
+    for dados in recebidos:
+        bloco = Bloco.restaurar_de_dict(dados)
+        assert bloco.hash == bloco.gerar_hash()
+        assert bloco.validar_transacoes()
+
+
+def test_aceita_memoryview():
+    corpo = codec.codificar({"n": list(range(1000))})
+    assert codec.descodificar(memoryview(bytearray(corpo)))["n"] == list(range(1000))
+
+
+def test_corpo_descomprimido_acima_do_maximo_e_recusado():
+    # ~200 KB comprimidos que se expandiriam em 200 MB (regressão: passava o limite das tramas)
+    bomba = bytes([codec.FORMATO_BINARIO_ZLIB]) + zlib.compress(b"\x00" * (200 * 1024 * 1024), 9)
+    assert len(bomba) < 1024 * 1024
+    with pytest.raises(ValueError):
+        codec.descodificar(bomba, 1024 * 1024)
+
+
+def test_limite_nao_afeta_mensagens_normais():
+    mensagem = {"blocks": [_bloco(i).formatar_para_dict() for i in range(1, 20)]}
+    corpo = codec.codificar(mensagem)
+    assert codec.descodificar(corpo, len(corpo) * 20) == mensagem
+
+
+@pytest.mark.parametrize("corpo", [
+    bytes([0x7F, 1, 2]),                                              # formato desconhecido
+    bytes([codec.FORMATO_BINARIO, 0xFF]),                             # etiqueta desconhecida
+    codec.codificar({"x": "y" * 50}, comprimir=False)[:-10],          # truncado
+    bytes([codec.FORMATO_BINARIO_ZLIB]) + zlib.compress(b"\x00" * 5000)[:-6],  # zlib incompleto
+])
+def test_corpos_mal_formados_levantam_erro_codec(corpo):
+    with pytest.raises(codec.ErroCodec):
+        codec.descodificar(corpo)
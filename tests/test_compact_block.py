@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from block import VERSAO_MERKLE, VERSAO_ORIGINAL
+from cluster import RedeMemoria
+from compact_block import BlocoParcial, criar_bloco_compacto, id_curto
+from mempool import Mempool
+from node import NoDaRede
+from transaction import Transacao
+
+
+def _copia(tx):
+    """ A mesma transação tal como chegaria pela rede. """
+    return Transacao.restaurar_de_dict(tx.formatar_para_dict())
+
+
+def _bloco_com(corrente, minerar, financiar, versao):
+    financiar(corrente, "alice")
+    transacoes = [Transacao("sistema", "mineiro", 50.0)]
+    transacoes += [corrente.nova_transacao("alice", destino, 1) for destino in ("bob", "carol", "dave")]
+    return minerar(corrente, transacoes, versao=versao)
+
+
+@pytest.mark.parametrize("versao", [VERSAO_ORIGINAL, VERSAO_MERKLE])
+def test_reconstrucao_com_o_mempool_completo(corrente, minerar, financiar, versao):
+    bloco = _bloco_com(corrente, minerar, financiar, versao)
+    compacto = criar_bloco_compacto(bloco)
+    # Só a recompensa vai por inteiro
+    assert [p for p, _ in compacto["prefilled"]] == [0]
+    assert compacto["short_ids"][1:] == [id_curto(tx.id) for tx in bloco.transacoes[1:]]
+
+    parcial = BlocoParcial(compacto, corrente.mempool)
+    assert parcial.completo
+    montado = parcial.montar()
+    assert montado.hash == bloco.hash == montado.gerar_hash()
+    assert corrente.adicionar_bloco(montado)
+    assert len(corrente.mempool) == 0
+
+
+@pytest.mark.parametrize("versao", [VERSAO_ORIGINAL, VERSAO_MERKLE])
+def test_transacoes_em_falta_sao_preenchidas_pela_ordem_pedida(corrente, minerar, financiar, versao):
+    bloco = _bloco_com(corrente, minerar, financiar, versao)
+    mempool = Mempool()
+    mempool.adicionar(_copia(bloco.transacoes[2]))
+
+    parcial = BlocoParcial(criar_bloco_compacto(bloco), mempool)
+    assert parcial.em_falta == [1, 3]
+    assert not parcial.preencher([bloco.transacoes[1].formatar_para_dict()])
+    assert parcial.preencher([bloco.transacoes[p].formatar_para_dict() for p in parcial.em_falta])
+    assert parcial.completo
+    assert parcial.montar().hash == bloco.hash
+
+
+def test_transacao_errada_nao_passa_no_adicionar_bloco(corrente, minerar, financiar):
+    bloco = _bloco_com(corrente, minerar, financiar, VERSAO_MERKLE)
+    parcial = BlocoParcial(criar_bloco_compacto(bloco), Mempool())
+    trocada = Transacao("alice", "eve", 1).formatar_para_dict()
+    assert parcial.preencher([trocada] + [bloco.transacoes[p].formatar_para_dict() for p in parcial.em_falta[1:]])
+
+    assert not corrente.adicionar_bloco(parcial.montar())
+    assert corrente.obter_ultimo_bloco().hash != bloco.hash
+
+
+def test_id_curto_ambiguo_fica_em_falta():
+    tx = Transacao("alice", "bob", 1)
+    gemea = Transacao("alice", "carol", 1, id_transacao=tx.id[:12] + "f" * 52)
+    mempool = Mempool()
+    mempool.adicionar(tx)
+    mempool.adicionar(gemea)
+    assert mempool.procurar_id_curto(id_curto(tx.id)) is None
+
+    parcial = BlocoParcial({"header": {}, "short_ids": [id_curto(tx.id)], "prefilled": []}, mempool)
+    assert parcial.em_falta == [0]
+
+
+def _esperar(condicao, limite=5.0):
+    """ Espera (com limite) até a condição se verificar. """
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "a condição não se verificou a tempo"
+        time.sleep(0.01)
+
+
+def test_bloco_compacto_entre_nos_pede_so_o_que_falta(minerar, financiar):
+    rede = RedeMemoria()
+    mineiro = NoDaRede("no", 1, processos_mineracao=1, fabrica_transporte=rede.fabrica)
+    recetor = NoDaRede("no", 2, nos_iniciais=[("no", 1)], processos_mineracao=1, fabrica_transporte=rede.fabrica)
+    for no in (mineiro, recetor):
+        no.blockchain.dificuldade = 1
+    financiado = financiar(mineiro.blockchain, "alice")
+    assert recetor.blockchain.adicionar_bloco(financiado)
+
+    conhecida = mineiro.blockchain.nova_transacao("alice", "bob", 1)
+    nova = mineiro.blockchain.nova_transacao("alice", "carol", 2)
+    assert recetor.blockchain.adicionar_transacao(_copia(conhecida))
+
+    mineiro.iniciar()
+    recetor.iniciar()
+    try:
+        # O GET_HEADERS do arranque mostra a cada um que o outro entende blocos compactos
+        _esperar(lambda: ("no", 1) in recetor.vizinhos_compactos and ("no", 2) in mineiro.vizinhos_compactos)
+        bloco = minerar(mineiro.blockchain, [Transacao("sistema", "no:1", 50.0), conhecida, nova])
+        with mineiro.trava_seguranca:
+            assert mineiro.blockchain.adicionar_bloco(bloco)
+            mineiro._espalhar_bloco(bloco)
+
+        _esperar(lambda: recetor.blockchain.obter_ultimo_bloco().hash == bloco.hash)
+        assert recetor.estatisticas_compactos == {"recebidos": 1, "sem_pedido": 0,
+                                                  "transacoes_pedidas": 1, "blocos_inteiros": 0}
+        assert len(recetor.blockchain.mempool) == 0
+    finally:
+        recetor.parar()
+        mineiro.parar()
@@ -0,0 +1,92 @@
+import json
+import socket
+import zlib
+
+import pytest
+
+import codec
+from framing import (CABECALHO, TAMANHO_MAXIMO_TRAMA, ErroTrama, LeitorTramas, codificar_mensagem,
+                     descodificar_mensagem, enviar_mensagem, receber_mensagem)
+
+MENSAGENS = [
+    {"type": "PING", "payload": {}},
+    {"type": "TX_BATCH", "payload": {"transactions": [{"id": "ab" * 32, "valor": 1.5}] * 50}},
+    {"type": "GRANDE", "payload": {"dados": "x" * 20_000}},
+]
+
+
+def _ler_tudo(leitor, dados, passo):
+    recebidas = []
+    for i in range(0, len(dados), passo):
+        leitor.alimentar(dados[i:i + passo])
+        recebidas += [descodificar_mensagem(corpo) for corpo in leitor.tramas()]
+    return recebidas
+
+
+@pytest.mark.parametrize("binario", [False, True])
+@pytest.mark.parametrize("passo", [1, 7, 4096, 10 ** 7])
+def test_tramas_sao_separadas_em_qualquer_corte(binario, passo):
+    dados = b"".join(codificar_mensagem(m, binario) for m in MENSAGENS)
+    assert _ler_tudo(LeitorTramas(tamanho_inicial=16), dados, passo) == MENSAGENS
+
+
+def test_espaco_livre_com_recv_into():
+    leitor = LeitorTramas(tamanho_inicial=8)
+    dados = memoryview(codificar_mensagem(MENSAGENS[2]))
+    while dados:
+        livre = leitor.espaco_livre()
+        n = min(len(livre), len(dados), 1000)
+        livre[:n] = dados[:n]
+        leitor.avancar(n)
+        dados = dados[n:]
+    assert [descodificar_mensagem(c) for c in leitor.tramas()] == [MENSAGENS[2]]
+
+
+def test_trama_acima_do_maximo_e_recusada():
+    leitor = LeitorTramas(tamanho_maximo=1024)
+    leitor.alimentar(CABECALHO.pack(1025) + b"{")
+    with pytest.raises(ErroTrama):
+        list(leitor.tramas())
+
+
+def test_tamanho_anunciado_nao_e_reservado_de_uma_vez():
+    leitor = LeitorTramas()
+    leitor.alimentar(CABECALHO.pack(TAMANHO_MAXIMO_TRAMA) + b"{")
+    assert list(leitor.tramas()) == []
+    assert len(leitor.espaco_livre()) < 1024 * 1024
+
+
+def test_buffer_volta_ao_tamanho_inicial_depois_de_uma_trama_grande():
+    leitor = LeitorTramas(tamanho_inicial=1024)
+    grande = {"type": "GRANDE", "payload": {"dados": "x" * 300_000}}
+    pequena = codificar_mensagem(MENSAGENS[0])
+    # A trama grande chega com o início da seguinte atrás dela
+    assert _ler_tudo(leitor, codificar_mensagem(grande) + pequena[:3], 64 * 1024) == [grande]
+    assert len(leitor.espaco_livre()) <= 1024
+    leitor.alimentar(pequena[3:])
+    assert [descodificar_mensagem(c) for c in leitor.tramas()] == [MENSAGENS[0]]
+
+
+def test_corpo_comprimido_nao_passa_do_limite_da_trama():
+    bomba = bytes([codec.FORMATO_BINARIO_ZLIB]) + zlib.compress(b"\x00" * (8 * 1024 * 1024), 9)
+    leitor = LeitorTramas(tamanho_maximo=1024 * 1024)
+    leitor.alimentar(CABECALHO.pack(len(bomba)) + bomba)
+    for corpo in leitor.tramas():
+        with pytest.raises(ValueError):
+            descodificar_mensagem(corpo, leitor.tamanho_maximo)
+
+
+def test_json_continua_igual_ao_protocolo_original():
+    mensagem = {"type": "NEW_BLOCK", "payload": {"block": {}}, "sender": "127.0.0.1:5000"}
+    trama = codificar_mensagem(mensagem)
+    corpo = json.dumps(mensagem).encode("utf-8")
+    assert trama == len(corpo).to_bytes(4, "big") + corpo
+
+
+def test_enviar_e_receber_num_socket():
+    a, b = socket.socketpair()
+    with a, b:
+        enviar_mensagem(a, MENSAGENS[1])
+        assert receber_mensagem(b) == MENSAGENS[1]
+        a.close()
+        assert receber_mensagem(b) is None
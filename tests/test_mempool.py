@@ -0,0 +1,84 @@
+from compact_block import id_curto
+from mempool import Mempool
+from transaction import Transacao
+
+
+def _tx(remetente, destinatario, quantia):
+    return Transacao(remetente, destinatario, quantia)
+
+
+def test_indices_e_debitos_acompanham_as_entradas_e_saidas():
+    mempool = Mempool()
+    a1, a2, b1 = _tx("alice", "bob", 10), _tx("alice", "carol", 5), _tx("bob", "alice", 2)
+    for tx in (a1, a2, b1):
+        assert mempool.adicionar(tx) == []
+
+    assert len(mempool) == 3
+    assert [tx.id for tx in mempool] == [a1.id, a2.id, b1.id]
+    assert mempool.debito("alice") == 15
+    assert mempool.do_remetente("alice") == [a1, a2]
+    assert mempool.procurar_id_curto(id_curto(b1.id)) is b1
+
+    assert mempool.remover(a1.id) is a1
+    assert a1.id not in mempool
+    assert mempool.debito("alice") == 5
+    assert mempool.procurar_id_curto(id_curto(a1.id)) is None
+
+    assert mempool.remover_confirmadas([a2, b1, a1]) == [a2, b1]
+    assert len(mempool) == 0
+    assert mempool.debitos == {} and mempool.por_remetente == {} and mempool.por_id_curto == {}
+
+
+def test_repetida_e_ignorada():
+    mempool = Mempool()
+    tx = _tx("alice", "bob", 1)
+    assert mempool.adicionar(tx) == []
+    assert mempool.adicionar(tx) is None
+    assert len(mempool) == 1
+    assert mempool.debito("alice") == 1
+
+
+def test_id_curto_partilhado_volta_a_resolver_quando_uma_sai():
+    tx = _tx("alice", "bob", 1)
+    gemea = Transacao("alice", "carol", 1, id_transacao=tx.id[:12] + "f" * 52)
+    mempool = Mempool()
+    mempool.adicionar(tx)
+    mempool.adicionar(gemea)
+    assert mempool.procurar_id_curto(id_curto(tx.id)) is None
+
+    mempool.remover(gemea.id)
+    assert mempool.procurar_id_curto(id_curto(tx.id)) is tx
+    mempool.remover(tx.id)
+    assert mempool.por_id_curto == {}
+
+
+def test_debito_volta_exatamente_a_zero():
+    mempool = Mempool()
+    transacoes = [_tx("alice", "bob", 0.1) for _ in range(3)]
+    for tx in transacoes:
+        mempool.adicionar(tx)
+    for tx in transacoes:
+        mempool.remover(tx.id)
+    assert mempool.debito("alice") == 0.0
+
+
+def test_sem_espaco_saem_as_mais_antigas():
+    mempool = Mempool(capacidade=2)
+    t1, t2, t3 = _tx("alice", "bob", 1), _tx("bob", "carol", 2), _tx("carol", "alice", 3)
+    mempool.adicionar(t1)
+    mempool.adicionar(t2)
+
+    assert mempool.adicionar(t3) == [t1]
+    assert [tx.id for tx in mempool] == [t2.id, t3.id]
+    assert mempool.expulsas == 1
+    assert mempool.debito("alice") == 0.0
+
+
+def test_saldo_conta_com_o_que_esta_pendente(corrente, financiar):
+    financiar(corrente, "alice", 10)
+    assert corrente.nova_transacao("alice", "bob", 7)
+    assert corrente.consultar_saldo("alice") == 3
+    # Sem saldo para a segunda: não entra no mempool nem no modelo do bloco
+    assert not corrente.nova_transacao("alice", "carol", 7)
+    assert len(corrente.mempool) == 1
+    assert corrente.modelo.obter()[2] == list(corrente.mempool)
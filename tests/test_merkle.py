@@ -0,0 +1,56 @@
+import hashlib
+
+import pytest
+
+from block import Bloco, VERSAO_MERKLE
+from merkle import RAIZ_VAZIA, calcular_raiz_merkle, gerar_prova_merkle, verificar_prova_merkle
+from transaction import Transacao
+
+
+def _ids(quantidade):
+    return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(quantidade)]
+
+
+def test_raizes_de_casos_pequenos():
+    assert calcular_raiz_merkle([]) == RAIZ_VAZIA
+    a, b, c = _ids(3)
+    assert calcular_raiz_merkle([a]) == hashlib.sha256(a.encode()).hexdigest()
+    assert calcular_raiz_merkle([a, b]) != calcular_raiz_merkle([b, a])
+    # O nó sem par sobe sem ser duplicado: repetir a última transação muda a raiz
+    assert calcular_raiz_merkle([a, b, c]) != calcular_raiz_merkle([a, b, c, c])
+
+
+@pytest.mark.parametrize("quantidade", range(1, 10))
+def test_prova_de_cada_posicao_confere_com_a_raiz(quantidade):
+    ids = _ids(quantidade)
+    raiz = calcular_raiz_merkle(ids)
+    for posicao, tx_id in enumerate(ids):
+        prova = gerar_prova_merkle(ids, posicao)
+        assert verificar_prova_merkle(tx_id, prova, raiz)
+        # A prova de uma posição não serve para outra transação
+        assert not verificar_prova_merkle(_ids(quantidade + 1)[-1], prova, raiz)
+
+
+def test_prova_adulterada_falha():
+    ids = _ids(5)
+    raiz = calcular_raiz_merkle(ids)
+    prova = gerar_prova_merkle(ids, 2)
+    prova[0][1] = "esquerda" if prova[0][1] == "direita" else "direita"
+    assert not verificar_prova_merkle(ids[2], prova, raiz)
+    with pytest.raises(IndexError):
+        gerar_prova_merkle(ids, 5)
+
+
+def test_bloco_merkle_deteta_transacao_trocada():
+    transacoes = [Transacao("sistema", "alice", 50), Transacao("alice", "bob", 10)]
+    bloco = Bloco(1, "0" * 64, transacoes, versao=VERSAO_MERKLE)
+    assert bloco.validar_transacoes()
+    assert verificar_prova_merkle(transacoes[1].id, bloco.prova_merkle(transacoes[1].id), bloco.raiz_merkle)
+
+    # Conteúdo alterado com o id antigo: o id deixa de corresponder
+    transacoes[1].quantia = 1000
+    assert not bloco.validar_transacoes()
+
+    # Transação trocada por outra válida: a raiz declarada já não é a destas transações
+    transacoes[1] = Transacao("alice", "carol", 10)
+    assert not bloco.validar_transacoes()
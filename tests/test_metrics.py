@@ -0,0 +1,56 @@
+import pytest
+
+from cluster import RedeMemoria
+from metrics import Histograma, Metricas
+from node import NoDaRede
+
+
+def test_histograma_percentis_e_maximo():
+    histograma = Histograma()
+    for _ in range(90):
+        histograma.registar(0.0003)
+    for _ in range(10):
+        histograma.registar(0.2)
+
+    resumo = histograma.resumo()
+    assert resumo["n"] == 100
+    assert resumo["p50_ms"] == 0.5    # Limite superior do intervalo onde cai
+    assert resumo["p99_ms"] == 200.0  # Nunca passa do máximo registado
+    assert resumo["max_ms"] == 200.0
+    assert resumo["media_ms"] == pytest.approx(20.27)
+    assert Histograma().resumo()["p90_ms"] == 0.0
+
+
+def test_instantaneo_junta_contadores_medidores_e_histogramas():
+    metricas = Metricas()
+    metricas.incrementar("mensagens")
+    metricas.incrementar("mensagens", 2)
+    metricas.definir("fixo", 7)
+    metricas.medidor("calculado", lambda: 42)
+    metricas.medidor("avariado", lambda: 1 / 0)
+    with metricas.cronometrar("tarefa"):
+        pass
+
+    dados = metricas.instantaneo()
+    assert dados["contadores"] == {"mensagens": 3}
+    assert dados["medidores"] == {"fixo": 7, "calculado": 42, "avariado": None}
+    assert dados["histogramas"]["tarefa"]["n"] == 1
+
+
+def test_get_stats_expoe_os_contadores_do_no():
+    no = NoDaRede("no", 1, processos_mineracao=1, fabrica_transporte=RedeMemoria().fabrica)
+    no.blockchain.mempool.expulsas = 3
+    no.sincronizador.blocos_descarregados = 5
+
+    resposta = no._processar_protocolo({"type": "GET_STATS", "payload": {}, "sender": "outro:2"}, None)
+    assert resposta["type"] == "STATS"
+    dados = resposta["payload"]
+    assert dados["contadores"]["mensagens_recebidas.GET_STATS"] == 1
+    medidores = dados["medidores"]
+    assert medidores["altura"] == 0
+    assert medidores["mempool.expulsas"] == 3
+    assert medidores["sync.blocos_descarregados"] == 5
+    for nome in ("transacoes.descartadas_fila", "transacoes.lotes_processados",
+                 "vistos.blocos_suprimidos", "vistos.transacoes_suprimidas"):
+        assert medidores[nome] == 0
+    no.blockchain.fechar()
@@ -0,0 +1,68 @@
+import copy
+import hashlib
+import threading
+import time
+
+import pytest
+
+from block import VERSAO_MERKLE, VERSAO_ORIGINAL, Bloco
+from mining import MotorMineracao
+from transaction import Transacao
+
+
+def _bloco():
+    transacoes = [Transacao("sistema", "mineiro", 50.0, data_hora=1.0), Transacao("alice", "bob", 2, data_hora=2.0)]
+    return Bloco(1, "0" * 64, transacoes, timestamp=3.0)
+
+
+@pytest.mark.parametrize("processos", [1, 2])
+def test_motor_encontra_um_nonce_valido(processos):
+    motor = MotorMineracao(processos, tamanho_lote=500)
+    bloco = _bloco()
+    try:
+        nonce, hash_bloco = motor.minerar(bloco, 3)
+    finally:
+        motor.encerrar()
+    assert (bloco.nonce, bloco.hash) == (nonce, hash_bloco)
+    assert hash_bloco.startswith("000") and hash_bloco == bloco.gerar_hash()
+    assert motor.tentativas_ultima > 0 and motor.total_tentativas == motor.tentativas_ultima
+
+
+def test_um_processo_da_o_mesmo_nonce_que_o_minerar_do_bloco():
+    referencia = _bloco()
+    referencia.minerar(3)
+    bloco = _bloco()
+    MotorMineracao(1).minerar(bloco, 3)
+    assert (bloco.nonce, bloco.hash) == (referencia.nonce, referencia.hash)
+
+
+@pytest.mark.parametrize("processos", [1, 2])
+def test_cancelamento_desiste_sem_mexer_no_bloco(processos):
+    motor = MotorMineracao(processos, tamanho_lote=500)
+    bloco = _bloco()
+    original = copy.copy(bloco)
+    cancelamento = threading.Event()
+    threading.Timer(0.2, cancelamento.set).start()
+    inicio = time.monotonic()
+    try:
+        # Dificuldade que nunca se atinge no teste
+        assert motor.minerar(bloco, 12, cancelamento) is None
+    finally:
+        motor.encerrar()
+    assert time.monotonic() - inicio < 5
+    assert (bloco.nonce, bloco.hash) == (original.nonce, original.hash)
+    assert motor.tentativas_ultima > 0
+
+
+@pytest.mark.parametrize("versao", [VERSAO_ORIGINAL, VERSAO_MERKLE])
+def test_hash_a_partir_do_prefixo_e_igual_ao_gerar_hash(versao):
+    # Um endereço com o texto do marcador não pode ser confundido com o lugar do nonce
+    transacoes = [Transacao("sistema", "__nonce__", 50.0, data_hora=1.0), Transacao("alice", "bob", 2, data_hora=2.0)]
+    bloco = Bloco(7, "ab" * 32, transacoes, timestamp=3.5, versao=versao)
+    prefixo, sufixo = bloco.partes_para_mineracao()
+    base = hashlib.sha256(prefixo)
+    for nonce in (0, 1, 9, 10, 12345, 10 ** 12):
+        bloco.nonce = nonce
+        assert Bloco.hash_com_nonce(base, nonce, sufixo) == bloco.gerar_hash()
+    # A base não é alterada pelas tentativas (cada uma trabalha numa cópia)
+    assert base.hexdigest() == hashlib.sha256(prefixo).hexdigest()
@@ -0,0 +1,84 @@
+import json
+import time
+
+import node
+from cluster import RedeMemoria
+from node import NoDaRede
+
+
+def _esperar(condicao, limite=5.0):
+    """ Espera (com limite) até a condição se verificar. """
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "a condição não se verificou a tempo"
+        time.sleep(0.01)
+
+
+def test_transacoes_novas_nao_contam_como_trabalho_abandonado(minerar, financiar):
+    no = NoDaRede("no", 1, processos_mineracao=1, fabrica_transporte=RedeMemoria().fabrica)
+    no.blockchain.dificuldade = 1
+    financiar(no.blockchain, "alice")
+    # Dificuldade impossível de atingir no teste: a procura só acaba se for cancelada
+    no.blockchain.dificuldade = 8
+    no.iniciar()
+    try:
+        no.iniciar_mineracao()
+        _esperar(lambda: no._versao_em_mineracao is not None)
+        for valor in (1, 2, 3):
+            no.nova_transacao("alice", "bob", valor)
+            _esperar(lambda: no.tentativas_renovadas >= valor)
+
+        assert no.tentativas_abandonadas == 0
+        assert no.hashes_abandonados == 0
+        assert no.metricas.instantaneo()["contadores"].get("mineracao.renovadas", 0) >= 3
+    finally:
+        no.parar()
+
+
+def test_parar_desliga_lotes_e_mineracao_antes_do_transporte():
+    no = NoDaRede("no", 1, processos_mineracao=1, fabrica_transporte=RedeMemoria().fabrica)
+    no.blockchain.dificuldade = 8
+    no.iniciar()
+    no.iniciar_mineracao()
+    _esperar(lambda: no._versao_em_mineracao is not None)
+
+    parar_transporte = no.transporte.parar
+    vivas = []
+
+    def _parar():
+        vivas.extend(t.name for t in (no.lote_transacoes._thread, no.tarefa_mineracao) if t.is_alive())
+        parar_transporte()
+
+    no.transporte.parar = _parar
+    no.parar()
+    assert vivas == []
+
+
+def test_request_chain_responde_com_um_prefixo_limitado_em_bytes(minerar, financiar, monkeypatch):
+    no = NoDaRede("no", 1, processos_mineracao=1, fabrica_transporte=RedeMemoria().fabrica)
+    no.blockchain.dificuldade = 1
+    for destino in ("alice", "bob", "carol", "dave"):
+        financiar(no.blockchain, destino)
+    tamanho_bloco = len(json.dumps(no.blockchain.corrente[1].formatar_para_dict()))
+    monkeypatch.setattr(node, "MAX_BYTES_POR_PEDIDO", 2 * tamanho_bloco + 10)
+
+    resposta = no._processar_protocolo({"type": "REQUEST_CHAIN", "payload": {}}, None)
+    cadeia = resposta["payload"]["blockchain"]["chain"]
+    assert [b["hash"] for b in cadeia] == [b.hash for b in no.blockchain.corrente[:len(cadeia)]]
+    assert 1 <= len(cadeia) < len(no.blockchain.corrente)
+    no.blockchain.fechar()
+
+
+def test_repeticoes_suprimidas_aparecem_nas_metricas():
+    no = NoDaRede("no", 1, processos_mineracao=1, fabrica_transporte=RedeMemoria().fabrica)
+    no.transacoes_vistas.marcar("tx")
+    no.blocos_vistos.marcar("bloco")
+    for _ in range(2):
+        assert no._processar_protocolo({"type": "NEW_TRANSACTION", "payload": {"transaction": {"id": "tx"}}}, None) is None
+    assert no._processar_protocolo({"type": "NEW_BLOCK", "payload": {"block": {"hash": "bloco"}}}, None) is None
+
+    medidores = no.metricas.instantaneo()["medidores"]
+    assert medidores["vistos.transacoes_suprimidas"] == 2
+    assert medidores["vistos.blocos_suprimidos"] == 1
+    assert len(no.lote_transacoes) == 0
+    no.blockchain.fechar()
@@ -0,0 +1,37 @@
+import seen_cache
+from seen_cache import CacheVistos
+
+
+def test_repetido_so_conta_o_que_foi_marcado():
+    vistos = CacheVistos()
+    assert not vistos.repetido("a")
+    vistos.marcar("a")
+    assert vistos.repetido("a") and vistos.repetido("a")
+    assert vistos.suprimidos == 2
+
+
+def test_capacidade_tira_as_mais_antigas():
+    vistos = CacheVistos(capacidade=3)
+    for chave in "abcd":
+        vistos.marcar(chave)
+    assert len(vistos) == 3
+    assert "a" not in vistos and "d" in vistos
+    # Voltar a marcar põe a chave no fim da fila
+    vistos.marcar("b")
+    vistos.marcar("e")
+    assert "b" in vistos and "c" not in vistos
+
+
+def test_entradas_expiram(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(seen_cache.time, "monotonic", lambda: agora[0])
+    vistos = CacheVistos(validade=10)
+    vistos.marcar("velha")
+    agora[0] += 6
+    vistos.marcar("nova")
+    agora[0] += 5
+    assert "velha" not in vistos and not vistos.repetido("velha")
+    assert "nova" in vistos
+    # A expirada sai da memória na próxima marcação
+    vistos.marcar("outra")
+    assert len(vistos) == 2
@@ -0,0 +1,118 @@
+import time
+
+import node
+import sync
+from cluster import RedeMemoria
+from node import NoDaRede
+from transaction import Transacao
+
+
+def _esperar(condicao, limite=10.0):
+    """ Espera (com limite) até a condição se verificar. """
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "a condição não se verificou a tempo"
+        time.sleep(0.01)
+
+
+def _no(rede, porta, vizinhos=()):
+    no = NoDaRede("no", porta, nos_iniciais=[("no", v) for v in vizinhos], processos_mineracao=1,
+                  fabrica_transporte=rede.fabrica)
+    no.blockchain.dificuldade = 1
+    return no
+
+
+def _crescer(blockchain, minerar, quantidade):
+    for _ in range(quantidade):
+        destino = f"mineiro-{len(blockchain.corrente)}"
+        assert blockchain.adicionar_bloco(minerar(blockchain, [Transacao("sistema", destino, 50.0)]))
+
+
+def _sincronizar(fonte, destino):
+    fonte.iniciar()
+    destino.iniciar()
+    try:
+        _esperar(lambda: destino.blockchain.obter_ultimo_bloco().hash == fonte.blockchain.obter_ultimo_bloco().hash
+                 and not destino.sincronizador.ativo)
+    finally:
+        destino.parar()
+        fonte.parar()
+
+
+def test_so_se_descarregam_os_blocos_que_faltam(minerar):
+    rede = RedeMemoria()
+    fonte, destino = _no(rede, 1), _no(rede, 2, vizinhos=[1])
+    _crescer(fonte.blockchain, minerar, 40)
+    for bloco in fonte.blockchain.corrente[1:31]:
+        assert destino.blockchain.adicionar_bloco(bloco)
+    _crescer(fonte.blockchain, minerar, 150)
+
+    _sincronizar(fonte, destino)
+
+    assert len(destino.blockchain.corrente) == 191
+    assert destino.sincronizador.blocos_descarregados == 160
+    assert destino.blockchain.verificar_indice_saldos() == {}
+    contadores = fonte.metricas.instantaneo()["contadores"]
+    assert contadores.get("mensagens_recebidas.GET_BLOCKS", 0) >= 2
+    assert contadores.get("mensagens_recebidas.REQUEST_CHAIN", 0) == 0
+
+
+def test_corrente_maior_do_que_uma_janela_de_cabecalhos(minerar, monkeypatch):
+    monkeypatch.setattr(sync, "MAX_CABECALHOS", 25)
+    monkeypatch.setattr(node, "MAX_CABECALHOS", 25)
+    monkeypatch.setattr(sync, "BLOCOS_POR_LOTE", 7)
+    rede = RedeMemoria()
+    fonte, destino = _no(rede, 1), _no(rede, 2, vizinhos=[1])
+    _crescer(fonte.blockchain, minerar, 80)
+
+    _sincronizar(fonte, destino)
+
+    assert [b.hash for b in destino.blockchain.corrente] == [b.hash for b in fonte.blockchain.corrente]
+    assert fonte.metricas.instantaneo()["contadores"]["mensagens_recebidas.GET_HEADERS"] >= 4
+
+
+def test_cabecalhos_sem_trabalho_sao_recusados(minerar):
+    rede = RedeMemoria()
+    fonte, destino = _no(rede, 1), _no(rede, 2, vizinhos=[1])
+    _crescer(fonte.blockchain, minerar, 5)
+    # O destino exige mais trabalho do que os blocos da fonte têm
+    destino.blockchain.dificuldade = 6
+    fonte.iniciar()
+    destino.iniciar()
+    try:
+        _esperar(lambda: fonte.metricas.instantaneo()["contadores"].get("mensagens_recebidas.GET_HEADERS"))
+        time.sleep(0.2)
+        assert len(destino.blockchain.corrente) == 1
+        assert not destino.sincronizador.ativo
+        assert fonte.metricas.instantaneo()["contadores"].get("mensagens_recebidas.GET_BLOCKS", 0) == 0
+    finally:
+        destino.parar()
+        fonte.parar()
+
+
+def test_bifurcacao_mais_funda_do_que_o_limite_e_recusada(minerar, monkeypatch):
+    monkeypatch.setattr(sync, "BLOCOS_POR_LOTE", 4)
+    rede = RedeMemoria()
+    fonte, destino = _no(rede, 1), _no(rede, 2, vizinhos=[1])
+    # Dois ramos desde o génesis: o do destino com 10 blocos, o da fonte com 12
+    _crescer(destino.blockchain, minerar, 10)
+    _crescer(fonte.blockchain, minerar, 12)
+    ponta = destino.blockchain.obter_ultimo_bloco().hash
+
+    monkeypatch.setattr(sync, "MAX_BLOCOS_RAMO", 6)
+    fonte.iniciar()
+    destino.iniciar()
+    try:
+        _esperar(lambda: destino.sincronizador.blocos_descarregados > 6 and not destino.sincronizador.ativo)
+        assert destino.blockchain.obter_ultimo_bloco().hash == ponta
+        assert len(destino.sincronizador.ramo) == 0
+    finally:
+        destino.parar()
+        fonte.parar()
+
+    monkeypatch.setattr(sync, "MAX_BLOCOS_RAMO", 20)
+    fonte, destino = _no(rede, 3), _no(rede, 4, vizinhos=[3])
+    _crescer(destino.blockchain, minerar, 10)
+    _crescer(fonte.blockchain, minerar, 12)
+    _sincronizar(fonte, destino)
+    assert len(destino.blockchain.corrente) == 13
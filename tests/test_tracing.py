@@ -0,0 +1,60 @@
+import json
+import pstats
+import threading
+
+from tracing import Rastreador, _SEM_RASTREIO
+
+
+def _trabalho():
+    return sum(i * i for i in range(2000))
+
+
+def test_desligado_nao_mede_nada():
+    rastreador = Rastreador()
+    assert rastreador.span("etapa", perfilar=True) is _SEM_RASTREIO
+    rastreador.registar("trava", 0.0, 1.0)
+    assert len(rastreador.eventos) == 0
+
+
+def test_spans_gravados_no_formato_do_chrome(tmp_path):
+    rastreador = Rastreador()
+    rastreador.iniciar()
+    with rastreador.span("validar", "corrente", blocos=3):
+        _trabalho()
+    rastreador.registar("espera_trava", 1.0, 1.5, "trava")
+    rastreador.parar()
+    with rastreador.span("depois"):
+        pass
+
+    caminho = tmp_path / "trace.json"
+    assert rastreador.gravar(str(caminho)) == 2
+    eventos = json.loads(caminho.read_text())["traceEvents"]
+    spans = {e["name"]: e for e in eventos if e["ph"] == "X"}
+    assert set(spans) == {"validar", "espera_trava"}
+    assert spans["validar"]["args"] == {"blocos": 3} and spans["validar"]["cat"] == "corrente"
+    assert spans["espera_trava"]["dur"] == 500000.0
+    assert any(e["ph"] == "M" and e["args"]["name"] == threading.current_thread().name for e in eventos)
+
+
+def test_so_uma_etapa_perfilada_de_cada_vez(tmp_path):
+    rastreador = Rastreador()
+    caminho = tmp_path / "perfil.prof"
+    rastreador.perfilar(str(caminho), segundos=60, amostragem=1.0)
+
+    na_outra_thread = []
+    with rastreador.span("mineracao", perfilar=True) as span:
+        assert span.perfil is not None
+        # Outra thread, ao mesmo tempo: com um cProfile já ligado no processo, não é sorteada
+        outra = threading.Thread(target=lambda: na_outra_thread.append(rastreador.span("mensagem", perfilar=True)))
+        outra.start()
+        outra.join()
+        _trabalho()
+    assert na_outra_thread == [_SEM_RASTREIO]
+
+    # Acabada a primeira, a seguinte já pode ser perfilada
+    with rastreador.span("mensagem", perfilar=True) as span:
+        assert span.perfil is not None
+        _trabalho()
+
+    rastreador._terminar_perfil()
+    assert pstats.Stats(str(caminho)).total_calls > 0
@@ -0,0 +1,19 @@
+import hashlib
+import json
+
+from transaction import Transacao
+
+
+def _id_original(origem, destino, valor, data):
+    """ O id como o calculava o formato original. """
+    texto = json.dumps({"origem": origem, "destino": destino, "valor": valor, "data": data}, sort_keys=True)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def test_valor_inteiro_mantem_o_id_do_formato_original():
+    tx = Transacao("sistema", "alice", 50, data_hora=1700000000)
+    assert tx.formatar_para_dict()["valor"] == 50 and type(tx.quantia) is int
+    assert tx.id == _id_original("sistema", "alice", 50, 1700000000)
+
+    restaurada = Transacao.restaurar_de_dict(json.loads(json.dumps(tx.formatar_para_dict())))
+    assert restaurada.id == restaurada.gerar_identificador() == tx.id
@@ -0,0 +1,159 @@
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+import transport
+from framing import enviar_mensagem, receber_mensagem
+from transport import TransporteAsync
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _No:
+    """ Um transporte que guarda o que recebe e responde a PING com PONG. """
+
+    def __init__(self, porta=None, **opcoes):
+        self.recebidas = queue.Queue()
+        self.porta = porta or _porta_livre()
+        self.transporte = TransporteAsync("127.0.0.1", self.porta, self._receber, **opcoes)
+
+    def _receber(self, mensagem, endereco):
+        self.recebidas.put(mensagem)
+        if mensagem.get("type") == "LENTO":
+            time.sleep(mensagem["payload"])
+            return {"type": "FEITO", "payload": threading.current_thread().name}
+        if mensagem.get("type") == "PING":
+            return {"type": "PONG", "payload": mensagem.get("payload")}
+        return None
+
+    def __enter__(self):
+        self.transporte.iniciar()
+        return self
+
+    def __exit__(self, *erro):
+        self.transporte.parar()
+
+
+class _NoAntigo:
+    """ Servidor como o do nó original: lê uma mensagem por ligação, responde (sem reply_to) e fecha. """
+
+    def __init__(self):
+        self.recebidas = queue.Queue()
+        self.servidor = socket.create_server(("127.0.0.1", 0))
+        self.porta = self.servidor.getsockname()[1]
+        threading.Thread(target=self._escutar, daemon=True).start()
+
+    def _escutar(self):
+        while True:
+            try:
+                conexao, _ = self.servidor.accept()
+            except OSError:
+                return
+            with conexao:
+                mensagem = receber_mensagem(conexao)
+                self.recebidas.put(mensagem)
+                if mensagem.get("type") == "REQUEST_CHAIN":
+                    enviar_mensagem(conexao, {"type": "RESPONSE_CHAIN", "payload": {}})
+
+    def fechar(self):
+        self.servidor.close()
+
+
+def _esperar(fila, quantidade, timeout=5):
+    recebidas = []
+    limite = time.monotonic() + timeout
+    while len(recebidas) < quantidade and time.monotonic() < limite:
+        try:
+            recebidas.append(fila.get(timeout=0.05))
+        except queue.Empty:
+            pass
+    return recebidas
+
+
+def test_pedido_e_resposta_em_binario():
+    with _No() as a, _No() as b:
+        futuro = a.transporte.enviar("127.0.0.1", b.porta, {"type": "PING", "payload": {"x": 1.5}}, True)
+        resposta = futuro.result(timeout=5)
+        assert resposta["type"] == "PONG" and resposta["payload"] == {"x": 1.5}
+        # Depois do HELLO, as duas pontas passaram ao formato binário
+        for i in range(20):
+            a.transporte.enviar("127.0.0.1", b.porta, {"type": "N", "payload": i})
+        assert [m["payload"] for m in _esperar(b.recebidas, 21)[1:]] == list(range(20))
+        assert all(l.binaria for l in list(a.transporte._ligacoes))
+
+
+def test_resposta_de_outro_vizinho_nao_completa_o_pedido(monkeypatch):
+    monkeypatch.setattr(transport, "TIMEOUT_RESPOSTA", 0.5)
+    calado = socket.create_server(("127.0.0.1", 0))  # Aceita a ligação mas nunca responde
+    with calado, _No() as a:
+        futuro = a.transporte.enviar("127.0.0.1", calado.getsockname()[1], {"type": "GET_HEADERS"}, True)
+        id_pedido = 1  # Os ids são sequenciais, a começar em 1
+        while id_pedido not in a.transporte._pedidos:
+            time.sleep(0.01)
+
+        # Outro nó tenta fazer-se passar pela resposta (o id é fácil de adivinhar)
+        with socket.create_connection(("127.0.0.1", a.porta)) as intruso:
+            enviar_mensagem(intruso, {"type": "HEADERS", "payload": {"headers": ["falso"]}, "reply_to": id_pedido})
+            assert _esperar(a.recebidas, 1)[0]["type"] == "HEADERS"
+        with pytest.raises(TimeoutError):
+            futuro.result(timeout=5)
+
+
+def test_no_antigo_recebe_todas_as_mensagens():
+    antigo = _NoAntigo()
+    try:
+        with _No() as a:
+            destino = [("127.0.0.1", antigo.porta)]
+            for i in range(30):
+                a.transporte.espalhar(destino, {"type": "NEW_BLOCK", "payload": {"n": i}})
+            recebidas = _esperar(antigo.recebidas, 30)
+            assert [m["payload"]["n"] for m in recebidas] == list(range(30))
+            assert a.transporte.estatisticas_vizinhos()[f"127.0.0.1:{antigo.porta}"]["legado"] is True
+
+            # A resposta de um nó antigo (sem reply_to) chega como uma mensagem qualquer
+            a.transporte.enviar("127.0.0.1", antigo.porta, {"type": "REQUEST_CHAIN", "payload": {}})
+            assert _esperar(a.recebidas, 1)[0]["type"] == "RESPONSE_CHAIN"
+    finally:
+        antigo.fechar()
+
+
+def test_mensagens_esperam_enquanto_o_vizinho_esta_em_espera():
+    porta = _porta_livre()
+    with _No() as a:
+        for i in range(5):
+            a.transporte.enviar("127.0.0.1", porta, {"type": "N", "payload": i})
+        time.sleep(0.2)  # A primeira tentativa falhou: o vizinho fica em espera com as mensagens na fila
+        estado = a.transporte.estatisticas_vizinhos()[f"127.0.0.1:{porta}"]
+        assert estado["falhas"] == 1 and estado["na_fila"] == 5 and estado["descartadas"] == 0
+
+        with _No(porta) as b:
+            assert [m["payload"] for m in _esperar(b.recebidas, 5)] == list(range(5))
+
+
+def test_mensagens_pesadas_nao_param_o_event_loop():
+    with _No(tipos_em_thread=("LENTO",)) as b, _No() as a, _No() as c:
+        lento = a.transporte.enviar("127.0.0.1", b.porta, {"type": "LENTO", "payload": 1.0}, True)
+        time.sleep(0.1)
+        inicio = time.monotonic()
+        c.transporte.enviar("127.0.0.1", b.porta, {"type": "PING", "payload": 1}, True).result(timeout=5)
+        assert time.monotonic() - inicio < 0.5
+        assert lento.result(timeout=5)["payload"].startswith(f"tratamento-{b.porta}")
+
+
+def test_enviar_durante_o_fecho_nao_rebenta():
+    with _No() as no:
+        loop = no.transporte.loop
+    # O loop fecha entre a verificação e o envio (outra thread ainda o via aberto)
+    loop.is_closed = lambda: False
+    try:
+        assert no.transporte.enviar("127.0.0.1", no.porta, {"type": "PING"}, esperar_resposta=True) is None
+        no.transporte.espalhar([("127.0.0.1", no.porta)], {"type": "PING"})
+    finally:
+        del loop.is_closed
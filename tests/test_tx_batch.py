@@ -0,0 +1,34 @@
+import threading
+
+from tx_batch import LoteTransacoes
+
+
+def test_lotes_respeitam_o_tamanho_maximo():
+    lotes, fim = [], threading.Event()
+
+    def _processar(lote):
+        lotes.append(lote)
+        if sum(len(l) for l in lotes) == 7:
+            fim.set()
+
+    lote = LoteTransacoes(_processar, intervalo=0.01, tamanho_maximo=3)
+    for item in range(7):
+        lote.adicionar(item)
+    lote.iniciar()
+    try:
+        assert fim.wait(2)
+    finally:
+        lote.parar()
+    assert [item for l in lotes for item in l] == list(range(7))
+    assert max(len(l) for l in lotes) <= 3
+
+
+def test_fila_cheia_descarta_e_conta():
+    lote = LoteTransacoes(lambda lote: None, max_pendentes=3)
+    aceites = [lote.adicionar(item) for item in range(5)]
+
+    assert aceites == [True, True, True, False, False]
+    assert lote.descartadas == 2
+    # As criadas aqui entram sempre
+    assert lote.adicionar("local", prioritario=True)
+    assert len(lote) == 4
@@ -0,0 +1,93 @@
+import pytest
+
+from blockchain import RedeBlockchain
+from transaction import Transacao
+from tx_columns import TransacoesConfirmadas
+
+
+def _indexar(corrente):
+    indice = TransacoesConfirmadas()
+    for bloco in corrente.corrente:
+        indice.acrescentar_bloco(bloco)
+    return indice
+
+
+def test_procurar_e_historico(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    tx = corrente.nova_transacao("alice", "bob", 10)
+    assert corrente.adicionar_bloco(minerar(corrente, [tx]))
+    indice = _indexar(corrente)
+
+    assert indice.altura == 3 and len(indice) == 2
+    altura, encontrada = indice.procurar(tx.id)
+    assert altura == 2
+    assert encontrada.formatar_para_dict() == tx.formatar_para_dict()
+    assert indice.procurar("00" * 32) is None
+    assert [t.id for t in indice.historico("alice")] == [corrente.corrente[1].transacoes[0].id, tx.id]
+    assert [t.id for t in indice.historico("bob")] == [tx.id]
+    assert indice.historico("carol") == []
+
+
+def test_bloco_fora_de_ordem_e_recusado(corrente, financiar):
+    bloco = financiar(corrente, "alice")
+    indice = TransacoesConfirmadas()
+    with pytest.raises(ValueError):
+        indice.acrescentar_bloco(bloco)
+
+
+def test_tipos_originais_mantem_o_id(corrente, minerar):
+    inteira = Transacao("sistema", "alice", 50, data_hora=1_700_000_000)
+    decimal = Transacao("sistema", "bob", 50.0, data_hora=1_700_000_000.5)
+    assert corrente.adicionar_bloco(minerar(corrente, [inteira, decimal]))
+    indice = _indexar(corrente)
+
+    for original in (inteira, decimal):
+        _, reconstruida = indice.procurar(original.id)
+        assert type(reconstruida.quantia) is type(original.quantia)
+        assert type(reconstruida.data_hora) is type(original.data_hora)
+        assert reconstruida.gerar_identificador() == original.id
+
+
+def test_irregulares_e_truncar(corrente, minerar, financiar):
+    financiar(corrente, "alice")
+    indice = _indexar(corrente)
+    # Uma transação que não cabe nas colunas (como as de blocos antigos) fica guardada tal como veio
+    estranha = Transacao("sistema", "carol", "muito", id_transacao="antigo")
+    bloco = minerar(corrente, [estranha, Transacao("sistema", "bob", 5)])
+    bloco.indice = indice.altura
+    indice.acrescentar_bloco(bloco)
+
+    assert indice.procurar("antigo") == (2, estranha)
+    assert [t.id for t in indice.historico("carol")] == ["antigo"]
+    assert indice.procurar(bloco.transacoes[1].id)[0] == 2
+
+    indice.truncar(2)
+    assert indice.altura == 2 and len(indice) == 1
+    assert indice.irregulares == {}
+    assert indice.procurar("antigo") is None
+    assert indice.procurar(bloco.transacoes[1].id) is None
+    assert [t.id for t in indice.historico("alice")] == [corrente.corrente[1].transacoes[0].id]
+
+
+def test_indice_da_corrente_acompanha_a_reorganizacao(minerar, financiar):
+    corrente = RedeBlockchain(dificuldade=1, indice_transacoes=True)
+    try:
+        financiar(corrente, "alice")
+        tx = corrente.nova_transacao("alice", "bob", 10)
+        assert corrente.adicionar_bloco(minerar(corrente, [tx]))
+        assert corrente.transacoes_confirmadas.procurar(tx.id)[0] == 2
+
+        # Um ramo mais pesado a partir do bloco 1, sem a transação
+        base = corrente.corrente[1]
+        primeiro = minerar(corrente, [Transacao("sistema", "carol", 50)], anterior=base)
+        corrente.adicionar_bloco(primeiro)
+        assert corrente.adicionar_bloco(minerar(corrente, [], anterior=primeiro))
+
+        indice = corrente.transacoes_confirmadas
+        assert indice.altura == len(corrente.corrente) == 4
+        assert indice.procurar(tx.id) is None
+        assert indice.procurar(primeiro.transacoes[0].id)[0] == 2
+        assert [t.id for t in indice.historico("carol")] == [primeiro.transacoes[0].id]
+        assert indice.historico("bob") == []
+    finally:
+        corrente.fechar()
@@ -0,0 +1,226 @@
+import collections
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import signal
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Eventos guardados no máximo (os mais antigos saem primeiro); ~100 bytes cada
+CAPACIDADE_EVENTOS = 200_000
+# Duração e fração de amostragem por omissão de uma captura com cProfile
+SEGUNDOS_PERFIL = 30
+AMOSTRAGEM_PERFIL = 0.1
+
+
+class _SemRastreio:
+    """ O que span() devolve com tudo desligado: um único objeto partilhado, sem medições. """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+
+_SEM_RASTREIO = _SemRastreio()
+
+
+class _Span:
+    __slots__ = ('rastreador', 'nome', 'categoria', 'argumentos', 'perfil', 'inicio')
+
+    def __init__(self, rastreador, nome, categoria, argumentos, perfil):
+        self.rastreador = rastreador
+        self.nome = nome
+        self.categoria = categoria
+        self.argumentos = argumentos
+        self.perfil = perfil
+
+    def __enter__(self):
+        if self.perfil is not None:
+            try:
+                self.perfil.enable()
+            except ValueError:
+                # Já há outro perfilador ligado fora do rastreador (ex: alguém a correr com cProfile)
+                self.rastreador._libertar_perfil()
+                self.perfil = None
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *erro):
+        fim = time.perf_counter()
+        if self.perfil is not None:
+            self.perfil.disable()
+            self.rastreador._juntar_perfil(self.perfil)
+        if self.rastreador.ativo:
+            self.rastreador.registar(self.nome, self.inicio, fim, self.categoria, **self.argumentos)
+        return False
+
+
+class Rastreador:
+    """ Rastreio opcional das etapas do nó (descodificar, restaurar, validar, minerar, esperar pela trava...).
+    Cada etapa é um "span" com início e duração, por thread; gravar() escreve-os no formato de trace do
+    Chrome (JSON), que abre em chrome://tracing, no Perfetto ou no speedscope.
+
+    Também faz capturas com cProfile durante um intervalo: só uma fração das etapas marcadas com
+    perfilar=True (o tratamento de uma mensagem, uma tentativa de mineração, um lote de transações)
+    corre com o perfilador ligado, e no fim as estatísticas juntas vão para um ficheiro .prof.
+
+    Desligado, span() só consulta um atributo e devolve sempre o mesmo objeto vazio. """
+
+    def __init__(self, capacidade=CAPACIDADE_EVENTOS):
+        self.ativo = False
+        self.eventos = collections.deque(maxlen=capacidade)  # (nome, categoria, início, duração, thread, args)
+        self._ligado = False         # ativo ou a perfilar: a única coisa que span() olha quando está tudo desligado
+        self._origem = time.perf_counter()
+        self._nomes_threads = {}
+        # Captura com cProfile em curso
+        self._trava_perfil = threading.Lock()
+        self._perfil_ligado = False  # Há uma etapa a ser perfilada (em qualquer thread)
+        self._amostragem = 0.0
+        self._perfil_ate = 0.0
+        self._estatisticas = None
+        self._destino_perfil = None
+
+    # --- RASTREIO ---
+
+    def iniciar(self):
+        """ Começa a guardar spans (descarta os de uma gravação anterior). """
+        self.eventos.clear()
+        self.ativo = True
+        self._ligado = True
+
+    def parar(self):
+        self.ativo = False
+        self._ligado = self._perfil_ate > time.perf_counter()
+
+    def span(self, nome, categoria="no", perfilar=False, **argumentos):
+        """ Mede o bloco 'with'; 'argumentos' aparecem no visualizador junto ao span. """
+        if not self._ligado:
+            return _SEM_RASTREIO
+        perfil = self._sortear_perfil() if perfilar else None
+        if perfil is None and not self.ativo:
+            return _SEM_RASTREIO
+        return _Span(self, nome, categoria, argumentos, perfil)
+
+    def registar(self, nome, inicio, fim, categoria="no", **argumentos):
+        """ Guarda um span já medido (instantes de time.perf_counter), ex: a espera por uma trava. """
+        if not self.ativo:
+            return
+        thread = threading.get_ident()
+        if thread not in self._nomes_threads:
+            self._nomes_threads[thread] = threading.current_thread().name
+        self.eventos.append((nome, categoria, inicio, fim - inicio, thread, argumentos))
+
+    def gravar(self, caminho):
+        """ Escreve os spans guardados no formato de trace do Chrome; devolve quantos foram. """
+        pid = os.getpid()
+        eventos = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": nome}}
+            for thread, nome in list(self._nomes_threads.items())
+        ]
+        spans = list(self.eventos)
+        for nome, categoria, inicio, duracao, thread, argumentos in spans:
+            evento = {
+                "name": nome, "cat": categoria, "ph": "X", "pid": pid, "tid": thread,
+                "ts": round((inicio - self._origem) * 1e6, 3), "dur": round(duracao * 1e6, 3),
+            }
+            if argumentos:
+                evento["args"] = argumentos
+            eventos.append(evento)
+        with open(caminho, "w", encoding="utf-8") as ficheiro:
+            json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, ficheiro, default=str)
+        return len(spans)
+
+    # --- PERFIL (cProfile) ---
+
+    def perfilar(self, caminho, segundos=SEGUNDOS_PERFIL, amostragem=AMOSTRAGEM_PERFIL):
+        """ Liga a captura com cProfile durante 'segundos'; no fim grava as estatísticas em 'caminho'
+        (ler com pstats, snakeviz...). Pode ser chamado de qualquer thread, com o nó a correr. """
+        with self._trava_perfil:
+            self._estatisticas = None
+            self._destino_perfil = caminho
+            self._amostragem = amostragem
+            self._perfil_ate = time.perf_counter() + segundos
+        self._ligado = True
+        temporizador = threading.Timer(segundos, self._terminar_perfil)
+        temporizador.daemon = True
+        temporizador.start()
+
+    def _sortear_perfil(self):
+        """ Perfilador para esta etapa, se calhar na amostra e nenhuma outra estiver a ser perfilada:
+        desde o Python 3.12 só pode haver um cProfile ligado de cada vez em todo o processo, por isso
+        a etapa da mineração e a do tratamento de uma mensagem nunca são perfiladas ao mesmo tempo. """
+        if time.perf_counter() >= self._perfil_ate or self._perfil_ligado:
+            return None
+        if random.random() >= self._amostragem:
+            return None
+        with self._trava_perfil:
+            if self._perfil_ligado:
+                return None
+            self._perfil_ligado = True
+        return cProfile.Profile()
+
+    def _libertar_perfil(self):
+        with self._trava_perfil:
+            self._perfil_ligado = False
+
+    def _juntar_perfil(self, perfil):
+        with self._trava_perfil:
+            self._perfil_ligado = False
+            if self._destino_perfil is None:
+                return  # A captura já terminou
+            if self._estatisticas is None:
+                self._estatisticas = pstats.Stats(perfil)
+            else:
+                self._estatisticas.add(perfil)
+
+    def _terminar_perfil(self):
+        with self._trava_perfil:
+            estatisticas, caminho = self._estatisticas, self._destino_perfil
+            self._estatisticas = self._destino_perfil = None
+            self._perfil_ate = 0.0
+        self._ligado = self.ativo
+        if estatisticas is None:
+            log.warning("⚠️ Captura de perfil sem amostras (nenhuma etapa foi sorteada).")
+            return
+        estatisticas.dump_stats(caminho)
+        log.info("🔬 Perfil gravado em %s", caminho)
+
+
+# Um rastreador por processo: as etapas são marcadas em vários módulos (rede, corrente, mineração)
+rastreador = Rastreador()
+
+
+def instalar_sinais(pasta, segundos_perfil=SEGUNDOS_PERFIL):
+    """ Controlo em execução, sem parar o nó (só em sistemas com SIGUSR1/SIGUSR2):
+    SIGUSR1 liga o rastreio e, da vez seguinte, desliga-o e grava trace-<pid>-<instante>.json;
+    SIGUSR2 faz uma captura com cProfile de 'segundos_perfil' para perfil-<pid>-<instante>.prof. """
+    if not hasattr(signal, "SIGUSR1"):
+        log.warning("⚠️ Este sistema não tem SIGUSR1/SIGUSR2: o rastreio só se liga pelo código.")
+        return False
+    os.makedirs(pasta, exist_ok=True)
+
+    def _alternar_rastreio(numero, quadro):
+        if not rastreador.ativo:
+            rastreador.iniciar()
+            log.info("🔬 Rastreio ligado (SIGUSR1 de novo para gravar).")
+            return
+        rastreador.parar()
+        caminho = os.path.join(pasta, f"trace-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        log.info("🔬 %d spans gravados em %s", rastreador.gravar(caminho), caminho)
+
+    def _capturar_perfil(numero, quadro):
+        caminho = os.path.join(pasta, f"perfil-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        rastreador.perfilar(caminho, segundos_perfil)
+        log.info("🔬 Captura de perfil durante %d s...", segundos_perfil)
+
+    signal.signal(signal.SIGUSR1, _alternar_rastreio)
+    signal.signal(signal.SIGUSR2, _capturar_perfil)
+    return True
@@ -1,18 +1,26 @@
+import logging
 import time
 import json
 import hashlib
 
+log = logging.getLogger(__name__)
+
 class Transacao:
+    # Sem __dict__ por objeto: numa corrente com milhões de transações a diferença conta
+    __slots__ = ('remetente', 'destinatario', 'quantia', 'data_hora', 'id')
+
     def __init__(self, remetente, destinatario, quantia, data_hora=None, id_transacao=None):
         # Detalhes da transferência
         self.remetente = remetente
         self.destinatario = destinatario
         self.quantia = quantia
-        
+
         # Se não houver data, usamos a hora exata do computador
         self.data_hora = data_hora or time.time()
-        
-        # Se não houver um ID pronto (ex: carregado de um ficheiro), geramos um novo
+
+        # Se não houver um ID pronto (ex: carregado de um ficheiro), geramos um novo.
+        # O valor e a data ficam com o tipo que trazem (int ou float), como no formato original:
+        # o id (e o hash dos blocos) depende do texto JSON deles
         self.id = id_transacao or self.gerar_identificador()
 
     def gerar_identificador(self):
@@ -41,7 +49,11 @@ class Transacao:
 
     @staticmethod
     def restaurar_de_dict(dados):
-        """ Recria uma transação a partir de um dicionário guardado. """
+        """ Recria uma transação a partir de um dicionário guardado (uma Transacao passa tal como está). """
+        if isinstance(dados, Transacao):
+            return dados
+        if not isinstance(dados, dict):
+            raise ValueError(f"Transação inválida: {dados!r}")
         return Transacao(
             remetente=dados["origem"],
             destinatario=dados["destino"],
@@ -53,11 +65,11 @@ class Transacao:
     def validar(self):
         """ Verifica se a transação faz sentido (valores positivos e endereços preenchidos). """
         if not self.remetente or not self.destinatario:
-            print("⚠️ Erro: Remetente ou destinatário ausente.")
+            log.debug("⚠️ Erro: Remetente ou destinatário ausente.")
             return False
             
         if self.quantia <= 0:
-            print(f"⚠️ Erro: Valor inválido ({self.quantia}). Deve ser maior que zero.")
+            log.debug("⚠️ Erro: Valor inválido (%s). Deve ser maior que zero.", self.quantia)
             return False
             
         return True
\ No newline at end of file
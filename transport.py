@@ -0,0 +1,583 @@
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import logging
+import threading
+import time
+from framing import LeitorTramas, ErroTrama, codificar_mensagem, descodificar_mensagem, TAMANHO_MAXIMO_TRAMA
+from tracing import rastreador
+
+log = logging.getLogger(__name__)
+
+# Tempo máximo (segundos) que um pedido fica à espera da resposta
+TIMEOUT_RESPOSTA = 5
+# Tempo máximo (segundos) para estabelecer uma ligação a um vizinho
+TIMEOUT_LIGACAO = 5
+# Uma ligação sem tráfego há mais do que isto é fechada
+TEMPO_INATIVIDADE = 60
+# Espera antes de voltar a tentar ligar a um vizinho que falhou (duplica a cada falha)
+ESPERA_INICIAL = 0.5
+ESPERA_MAXIMA = 30
+# Mensagens à espera de envio por vizinho; com a fila cheia as mais antigas são descartadas
+MAX_FILA_VIZINHO = 1000
+# Número fixo de tarefas que escrevem para os vizinhos (um vizinho lento só ocupa uma delas)
+TRABALHADORES_ENVIO = 16
+# Peso de cada nova medição na média móvel da latência de um vizinho
+PESO_LATENCIA = 0.2
+# Codificações que este nó sabe ler; anunciadas na primeira mensagem de cada ligação nova
+CODIFICACOES = ["json", "binary"]
+# Mensagens de uma ligação à espera da thread de tratamento; acima disto deixa-se de ler dessa ligação
+MAX_EM_TRATAMENTO = 64
+
+
+class _Envio:
+    """ Mensagem à espera de envio, partilhada por todos os destinos de um espalhar.
+    Cada formato (JSON ou binário) é codificado no máximo uma vez, quando for preciso. """
+
+    __slots__ = ('mensagem', '_tramas')
+
+    def __init__(self, mensagem, binario=False):
+        self.mensagem = mensagem
+        self._tramas = {}
+        self.dados(binario)  # O formato mais provável fica já pronto, fora do event loop
+
+    def dados(self, binario):
+        trama = self._tramas.get(binario)
+        if trama is None:
+            trama = self._tramas[binario] = codificar_mensagem(self.mensagem, binario)
+        return trama
+
+
+class _Pedido:
+    """ Pedido à espera de resposta: só a aceita se chegar pela ligação onde foi escrito. """
+
+    __slots__ = ('futuro', 'destino', 'enviado_em', 'ligacao')
+
+    def __init__(self, futuro, destino):
+        self.futuro = futuro
+        self.destino = destino
+        self.enviado_em = time.monotonic()
+        self.ligacao = None  # Preenchida quando o pedido é escrito
+
+
+class _Ligacao(asyncio.BufferedProtocol):
+    """ Uma ligação TCP, recebida ou iniciada por nós, que troca mensagens no formato da rede.
+    Fica aberta e pode levar qualquer número de mensagens nos dois sentidos.
+    Os bytes são lidos diretamente para o buffer do LeitorTramas (sem cópias por cada recv). """
+
+    def __init__(self, transporte, endereco=None):
+        self.transporte = transporte
+        self.endereco = endereco
+        self.canal = None
+        self.leitor = LeitorTramas(transporte.tamanho_maximo_trama)
+        self.ultimo_uso = time.monotonic()
+        self.binaria = False     # O outro lado lê o formato binário
+        self.anunciada = False   # Já se trocaram as codificações nesta ligação
+        self.negociada = False   # O outro lado respondeu com as suas codificações (é um nó novo)
+        # Ativado quando o outro lado anuncia as codificações ou quando a ligação fecha
+        self.negociacao = asyncio.Event()
+        self.fechada = asyncio.Event()
+        self.em_tratamento = 0   # Mensagens desta ligação entregues à thread de tratamento e ainda por acabar
+        # Limpo enquanto o buffer de escrita do sistema está cheio (o vizinho não está a ler)
+        self._pode_escrever = asyncio.Event()
+        self._pode_escrever.set()
+
+    def connection_made(self, canal):
+        self.canal = canal
+        if self.endereco is None:
+            self.endereco = canal.get_extra_info('peername')
+        self.transporte._ligacoes.add(self)
+
+    def get_buffer(self, tamanho_sugerido):
+        return self.leitor.espaco_livre()
+
+    def buffer_updated(self, n):
+        self.ultimo_uso = time.monotonic()
+        self.transporte.bytes_recebidos += n
+        self.leitor.avancar(n)
+        try:
+            for corpo in self.leitor.tramas():
+                self.transporte._despachar(corpo, self)
+        except ErroTrama as e:
+            log.warning("⚠️ Ligação com %s fechada: %s", self.endereco, e)
+            self.fechar()
+
+    def connection_lost(self, erro):
+        self._pode_escrever.set()
+        self.negociacao.set()
+        self.fechada.set()
+        self.transporte._ao_perder_ligacao(self)
+
+    def pause_writing(self):
+        self._pode_escrever.clear()
+
+    def resume_writing(self):
+        self._pode_escrever.set()
+
+    @property
+    def aberta(self):
+        return self.canal is not None and not self.canal.is_closing()
+
+    def enviar(self, mensagem):
+        self.escrever(codificar_mensagem(mensagem, self.binaria))
+
+    def escrever(self, dados):
+        if self.aberta:
+            self.ultimo_uso = time.monotonic()
+            self.transporte.bytes_enviados += len(dados)
+            self.canal.write(dados)
+
+    async def escoar(self):
+        """ Espera até o vizinho ter lido o suficiente para se poder voltar a escrever. """
+        await self._pode_escrever.wait()
+
+    def fechar(self):
+        if self.canal is not None:
+            self.canal.close()
+
+    def tratamento_iniciado(self):
+        self.em_tratamento += 1
+        if self.em_tratamento == MAX_EM_TRATAMENTO and self.aberta:
+            # O nó não está a dar vazão ao que este vizinho manda: o TCP trava-o até recuperar
+            self.canal.pause_reading()
+
+    def tratamento_terminado(self):
+        self.em_tratamento -= 1
+        if self.em_tratamento == MAX_EM_TRATAMENTO - 1 and self.aberta:
+            self.canal.resume_reading()
+
+
+class _Vizinho:
+    """ Estado de saída de um vizinho: a ligação, a fila limitada de mensagens por enviar
+    e as medições (latência, falhas) que decidem a sua prioridade. """
+
+    def __init__(self):
+        self.ligacao = None
+        self.fila = collections.deque()  # (_Envio, chave de coalescência ou None)
+        self.agendado = False            # Já está na fila de trabalho (ou a ser servido)
+        self.adiado = False              # Há um temporizador para o agendar quando acabar a espera
+        self.legado = None               # Nó antigo (uma mensagem por ligação)? None enquanto não se sabe
+        self.falhas = 0
+        self.proxima_tentativa = 0.0     # Instante (monotonic) a partir do qual se pode voltar a ligar
+        self.latencia = None             # Média móvel, em segundos
+        self.enviadas = 0
+        self.descartadas = 0
+
+    def enfileirar(self, envio, chave=None):
+        """ Com a fila cheia, uma mensagem com chave substitui a anterior com a mesma chave
+        (ex: só interessa o anúncio mais recente da ponta); senão perde-se a mais antiga. """
+        if len(self.fila) >= MAX_FILA_VIZINHO:
+            anterior = None
+            if chave is not None:
+                anterior = next((item for item in self.fila if item[1] == chave), None)
+            if anterior is not None:
+                self.fila.remove(anterior)
+            else:
+                self.fila.popleft()
+            self.descartadas += 1
+        self.fila.append((envio, chave))
+
+    def descartar_fila(self):
+        self.descartadas += len(self.fila)
+        self.fila.clear()
+
+    def em_espera(self):
+        """ Segundos que ainda faltam para se poder voltar a ligar (0 se já pode ou se está ligado). """
+        if self.ligacao is not None and self.ligacao.aberta:
+            return 0.0
+        return max(0.0, self.proxima_tentativa - time.monotonic())
+
+    def registar_latencia(self, segundos):
+        if self.latencia is None:
+            self.latencia = segundos
+        else:
+            self.latencia += PESO_LATENCIA * (segundos - self.latencia)
+
+    def registar_falha(self):
+        self.falhas += 1
+        espera = min(ESPERA_MAXIMA, ESPERA_INICIAL * 2 ** (self.falhas - 1))
+        self.proxima_tentativa = time.monotonic() + espera
+
+    def prioridade(self):
+        """ Menor é melhor: vizinhos lentos ou que falham são servidos depois dos outros. """
+        return (self.latencia or 0.0) * (1 + self.falhas) + self.falhas
+
+    def estatisticas(self):
+        return {
+            "ligado": self.ligacao is not None and self.ligacao.aberta,
+            "legado": self.legado,
+            "na_fila": len(self.fila),
+            "enviadas": self.enviadas,
+            "descartadas": self.descartadas,
+            "falhas": self.falhas,
+            "latencia_ms": None if self.latencia is None else round(self.latencia * 1000, 3),
+        }
+
+
+class TransporteAsync:
+    """ Núcleo de rede do nó: um único event loop (numa thread própria) aceita ligações,
+    lê as mensagens, despacha-as e faz os envios, sem abrir uma thread por ligação ou por vizinho.
+    As outras threads (mineração, interface) entregam-lhe envios através de uma fila thread-safe.
+
+    Cada vizinho tem uma ligação persistente reutilizada por todas as mensagens. Os pedidos levam um
+    "id" e as respostas um "reply_to", para se saber a que pedido pertencem sem ficar à espera.
+
+    Cada ligação começa em JSON. A primeira mensagem que enviamos numa ligação nova leva também
+    "encodings"; um nó que também saiba ler o formato binário responde com um HELLO e, a partir daí,
+    os dois lados usam o binário nessa ligação. Um nó antigo ignora a chave e continua em JSON.
+
+    Os nós antigos (e os do outro grupo) leem uma só mensagem por ligação e fecham-na. Um vizinho
+    que não responde ao primeiro envio com um HELLO passa a receber cada mensagem numa ligação nova.
+
+    As mensagens dos 'tipos_em_thread' (as que validam blocos ou leem a corrente) e as respostas
+    aos pedidos são tratadas por ordem numa thread à parte, para não pararem as outras ligações. """
+
+    def __init__(self, host, porta, ao_receber, tamanho_maximo_trama=TAMANHO_MAXIMO_TRAMA,
+                 trabalhadores_envio=TRABALHADORES_ENVIO, codificacao_binaria=True, tipos_em_thread=()):
+        self.host = host
+        self.porta = porta
+        # ao_receber(mensagem, endereco) devolve a resposta (ou None); corre no event loop,
+        # exceto para os tipos em 'tipos_em_thread', que correm na thread de tratamento
+        self.ao_receber = ao_receber
+        self.tipos_em_thread = frozenset(tipos_em_thread)
+        self._tratamento = None  # Executor de uma só thread, criado ao iniciar
+        self.tamanho_maximo_trama = tamanho_maximo_trama
+        self.trabalhadores_envio = trabalhadores_envio
+        self.codificacao_binaria = codificacao_binaria
+
+        self.loop = None
+        self._thread = None
+        self._servidor = None
+        self._prontos = None    # Fila de prioridade dos vizinhos com mensagens por enviar
+        self._pronto = threading.Event()
+        self._erro_arranque = None
+
+        self._vizinhos = {}     # (host, porta) -> _Vizinho
+        self._ligacoes = set()  # Todas as ligações abertas (recebidas e de saída)
+        self._pedidos = {}      # id -> _Pedido
+        self._ids = itertools.count(1)
+        self._sequencia = itertools.count()  # Desempate na fila de prioridade
+        # Totais do tráfego (tramas inteiras, com o cabeçalho); só mexidos no event loop
+        self.bytes_recebidos = 0
+        self.bytes_enviados = 0
+
+    # --- CICLO DE VIDA ---
+
+    def iniciar(self):
+        """ Arranca o event loop e o servidor; só devolve quando já está a escutar. """
+        self._tratamento = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix=f"tratamento-{self.porta}")
+        self._thread = threading.Thread(target=self._correr_loop, name=f"rede-{self.porta}", daemon=True)
+        self._thread.start()
+        self._pronto.wait()
+        if self._erro_arranque is not None:
+            raise self._erro_arranque
+
+    def _correr_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._arrancar())
+        except Exception as e:
+            self._erro_arranque = e
+            self._pronto.set()
+            return
+        self._pronto.set()
+        self.loop.run_forever()
+
+        # Limpeza depois de parar(): cancela o que ficou pendente e fecha o loop
+        pendentes = asyncio.all_tasks(self.loop)
+        for tarefa in pendentes:
+            tarefa.cancel()
+        self.loop.run_until_complete(asyncio.gather(*pendentes, return_exceptions=True))
+        self.loop.close()
+
+    async def _arrancar(self):
+        self._prontos = asyncio.PriorityQueue()
+        self._servidor = await self.loop.create_server(
+            lambda: _Ligacao(self), self.host, self.porta, reuse_address=True
+        )
+        for _ in range(self.trabalhadores_envio):
+            asyncio.create_task(self._trabalhador_envio())
+        asyncio.create_task(self._fechar_inativas())
+
+    def parar(self):
+        """ Fecha o servidor e as ligações e termina o event loop. """
+        if self.loop is None or self.loop.is_closed():
+            return
+
+        def _parar():
+            self._servidor.close()
+            for ligacao in list(self._ligacoes):
+                ligacao.fechar()
+            self.loop.stop()
+
+        self.loop.call_soon_threadsafe(_parar)
+        self._thread.join(timeout=2)
+        self._tratamento.shutdown(wait=False, cancel_futures=True)
+
+    # --- RECEÇÃO ---
+
+    def _despachar(self, corpo, ligacao):
+        """ Descodifica uma mensagem: respostas esperadas vão para o pedido respetivo,
+        o resto é entregue ao nó e a resposta dele volta pela mesma ligação. """
+        try:
+            with rastreador.span("descodificar", "rede", bytes=len(corpo)):
+                mensagem = descodificar_mensagem(corpo, self.tamanho_maximo_trama)
+            if 'encodings' in mensagem:
+                self._negociar(mensagem, ligacao)
+                if mensagem.get('type') == 'HELLO':
+                    return
+            # Uma resposta só é aceite na ligação onde o pedido foi escrito: os ids são sequenciais
+            # e qualquer outro vizinho podia adivinhá-los
+            pedido = self._pedidos.get(mensagem.get('reply_to'))
+            if pedido is not None and pedido.ligacao is ligacao:
+                del self._pedidos[mensagem['reply_to']]
+                self._vizinhos[pedido.destino].registar_latencia(time.monotonic() - pedido.enviado_em)
+                # Quem espera pela resposta (ex: a sincronização) valida blocos no callback do Future
+                self._tratamento.submit(self._entregar_resposta, pedido.futuro, mensagem)
+                return
+            if mensagem.get('type') in self.tipos_em_thread:
+                ligacao.tratamento_iniciado()
+                tarefa = self.loop.run_in_executor(self._tratamento, self._tratar, mensagem, ligacao.endereco)
+                tarefa.add_done_callback(lambda t: self._ao_tratar(mensagem, ligacao, t))
+                return
+            resposta = self._tratar(mensagem, ligacao.endereco)
+        except Exception as e:
+            log.warning("⚠️ Erro ao receber/responder dados para %s: %s", ligacao.endereco, e)
+            ligacao.fechar()
+            return
+        self._responder(mensagem, ligacao, resposta)
+
+    def _tratar(self, mensagem, endereco):
+        with rastreador.span(str(mensagem.get('type')), "mensagem", perfilar=True):
+            return self.ao_receber(mensagem, endereco)
+
+    @staticmethod
+    def _entregar_resposta(futuro, mensagem):
+        if not futuro.done():
+            futuro.set_result(mensagem)
+
+    def _ao_tratar(self, mensagem, ligacao, tarefa):
+        """ De volta ao event loop, depois de a thread de tratamento acabar uma mensagem. """
+        ligacao.tratamento_terminado()
+        if tarefa.cancelled():
+            return
+        if tarefa.exception() is not None:
+            log.warning("⚠️ Erro ao receber/responder dados para %s: %s", ligacao.endereco, tarefa.exception())
+            ligacao.fechar()
+            return
+        self._responder(mensagem, ligacao, tarefa.result())
+
+    @staticmethod
+    def _responder(mensagem, ligacao, resposta):
+        """ A resposta volta pela mesma ligação, com o id do pedido a que responde. """
+        if resposta:
+            if 'id' in mensagem:
+                resposta = dict(resposta, reply_to=mensagem['id'])
+            ligacao.enviar(resposta)
+
+    def _negociar(self, mensagem, ligacao):
+        """ O vizinho disse que codificações lê: passa-se ao binário se ambos o suportarem
+        e, se foi ele a anunciar primeiro, responde-se com as nossas num HELLO. """
+        ligacao.binaria = self.codificacao_binaria and "binary" in (mensagem.get('encodings') or [])
+        ligacao.negociada = True
+        ligacao.negociacao.set()
+        if not ligacao.anunciada:
+            ligacao.anunciada = True
+            ligacao.enviar({"type": "HELLO", "encodings": self._codificacoes()})
+
+    def _codificacoes(self):
+        return CODIFICACOES if self.codificacao_binaria else ["json"]
+
+    def _ao_perder_ligacao(self, ligacao):
+        self._ligacoes.discard(ligacao)
+        for vizinho in self._vizinhos.values():
+            if vizinho.ligacao is ligacao:
+                vizinho.ligacao = None
+
+    async def _fechar_inativas(self):
+        """ Fecha periodicamente as ligações sem tráfego há mais de TEMPO_INATIVIDADE. """
+        while True:
+            await asyncio.sleep(TEMPO_INATIVIDADE / 4)
+            limite = time.monotonic() - TEMPO_INATIVIDADE
+            for ligacao in [l for l in self._ligacoes if l.ultimo_uso < limite]:
+                ligacao.fechar()
+
+    def estatisticas_vizinhos(self):
+        """ Fila, envios, descartes, falhas e latência de cada vizinho ("host:porta" -> dict). """
+        return {f"{h}:{p}": v.estatisticas() for (h, p), v in list(self._vizinhos.items())}
+
+    # --- ENVIO ---
+
+    def enviar(self, host, porta, mensagem, esperar_resposta=False):
+        """ Pede o envio de uma mensagem; pode ser chamado de qualquer thread e não bloqueia.
+        Com esperar_resposta devolve um concurrent.futures.Future com a resposta (ou TimeoutError);
+        sem ele, uma eventual resposta é entregue a ao_receber como qualquer outra mensagem. """
+        if self.loop is None or self.loop.is_closed():
+            return None
+        id_mensagem = next(self._ids)
+        envio = _Envio(dict(mensagem, id=id_mensagem), self.codificacao_binaria)
+        futuro = concurrent.futures.Future() if esperar_resposta else None
+        try:
+            self.loop.call_soon_threadsafe(self._enfileirar, [(host, int(porta))], envio, None, id_mensagem, futuro)
+        except RuntimeError:
+            return None  # O loop fechou entretanto: o transporte já parou
+        return futuro
+
+    def espalhar(self, destinos, mensagem, coalescer=None):
+        """ Envia a mesma mensagem a vários vizinhos; é serializada uma única vez por formato.
+        'coalescer' é a chave das mensagens que se podem substituir umas às outras numa fila cheia. """
+        if self.loop is None or self.loop.is_closed():
+            return
+        envio = _Envio(dict(mensagem, id=next(self._ids)), self.codificacao_binaria)
+        destinos = [(host, int(porta)) for host, porta in destinos]
+        try:
+            self.loop.call_soon_threadsafe(self._enfileirar, destinos, envio, coalescer)
+        except RuntimeError:
+            pass  # O loop fechou entretanto: o transporte já parou
+
+    def _enfileirar(self, destinos, envio, chave, id_mensagem=None, futuro=None):
+        for destino in destinos:
+            vizinho = self._vizinhos.setdefault(destino, _Vizinho())
+            if futuro is not None:
+                self._registar_pedido(id_mensagem, futuro, destino)
+            vizinho.enfileirar(envio, chave)
+            self._agendar(destino)
+
+    def _agendar(self, destino):
+        """ Põe o vizinho na fila de trabalho; se estiver em espera depois de falhar, as mensagens
+        ficam na fila dele e só é agendado quando a espera acabar. """
+        vizinho = self._vizinhos[destino]
+        if vizinho.agendado or vizinho.adiado or not vizinho.fila:
+            return
+        espera = vizinho.em_espera()
+        if espera > 0:
+            vizinho.adiado = True
+            self.loop.call_later(espera, self._retomar, destino)
+            return
+        vizinho.agendado = True
+        self._prontos.put_nowait((vizinho.prioridade(), next(self._sequencia), destino))
+
+    def _retomar(self, destino):
+        self._vizinhos[destino].adiado = False
+        self._agendar(destino)
+
+    def _registar_pedido(self, id_pedido, futuro, destino):
+        self._pedidos[id_pedido] = _Pedido(futuro, destino)
+
+        def _expirar():
+            if self._pedidos.pop(id_pedido, None) is not None and not futuro.done():
+                futuro.set_exception(TimeoutError(f"Sem resposta ao pedido {id_pedido}"))
+
+        self.loop.call_later(TIMEOUT_RESPOSTA, _expirar)
+
+    def _escrever(self, destino, vizinho, ligacao, envio, dados):
+        """ Escreve uma mensagem da fila e, se for um pedido, liga-o a esta ligação. """
+        ligacao.escrever(dados)
+        vizinho.enviadas += 1
+        pedido = self._pedidos.get(envio.mensagem.get('id'))
+        if pedido is not None and pedido.destino == destino:
+            pedido.ligacao = ligacao
+
+    async def _trabalhador_envio(self):
+        """ Serve os vizinhos com mensagens por enviar, os de melhor prioridade primeiro. """
+        while True:
+            _, _, destino = await self._prontos.get()
+            vizinho = self._vizinhos[destino]
+            try:
+                await self._servir(destino, vizinho)
+            except Exception as e:
+                log.warning("⚠️ Erro ao enviar para %s: %s", destino, e)
+                vizinho.descartar_fila()
+            vizinho.agendado = False
+            self._agendar(destino)
+
+    async def _servir(self, destino, vizinho):
+        """ Garante a ligação ao vizinho e escreve-lhe tudo o que está na fila.
+        Se não conseguir ligar, as mensagens ficam na fila até à próxima tentativa. """
+        if vizinho.legado:
+            await self._servir_legado(destino, vizinho)
+            return
+        if vizinho.ligacao is None or not vizinho.ligacao.aberta:
+            if vizinho.em_espera() > 0:
+                return
+            vizinho.ligacao = await self._abrir(destino, vizinho)
+            if vizinho.ligacao is None:
+                return
+
+        ligacao = vizinho.ligacao
+        if not ligacao.anunciada and vizinho.fila:
+            # As codificações vão na primeira mensagem (e não numa à parte): um nó antigo só lê uma por ligação
+            ligacao.anunciada = True
+            envio, _ = vizinho.fila.popleft()
+            self._escrever(destino, vizinho, ligacao,
+                           envio, codificar_mensagem(dict(envio.mensagem, encodings=self._codificacoes())))
+            if vizinho.legado is None:
+                # Um nó novo responde logo com um HELLO; um antigo lê esta mensagem e fecha a ligação
+                try:
+                    await asyncio.wait_for(ligacao.negociacao.wait(), TIMEOUT_LIGACAO)
+                except asyncio.TimeoutError:
+                    pass
+                vizinho.legado = not ligacao.negociada
+                if vizinho.legado:
+                    log.info("📼 %s:%s é um nó antigo: uma mensagem por ligação.", *destino)
+                    vizinho.ligacao = None  # Fica aberta só até chegar a resposta (se houver)
+                    await self._servir_legado(destino, vizinho)
+                    return
+        while vizinho.fila and ligacao.aberta:
+            envio, _ = vizinho.fila.popleft()
+            self._escrever(destino, vizinho, ligacao, envio, envio.dados(ligacao.binaria))
+
+        # Se o vizinho não está a ler, esta tarefa espera por ele (as outras continuam a servir os restantes)
+        inicio = time.monotonic()
+        try:
+            await asyncio.wait_for(ligacao.escoar(), TIMEOUT_LIGACAO)
+        except asyncio.TimeoutError:
+            vizinho.registar_falha()
+        else:
+            espera = time.monotonic() - inicio
+            if espera > 0.001:
+                vizinho.registar_latencia(espera)
+
+    async def _servir_legado(self, destino, vizinho):
+        """ Para nós antigos: cada mensagem vai em JSON numa ligação nova, e a seguinte só sai depois
+        de o vizinho a fechar (já com a resposta, se houver), tal como o enviar_direto original. """
+        while vizinho.fila and vizinho.em_espera() == 0:
+            ligacao = await self._abrir(destino, vizinho)
+            if ligacao is None:
+                return
+            if not vizinho.fila:
+                ligacao.fechar()
+                return
+            envio, _ = vizinho.fila.popleft()
+            ligacao.anunciada = True  # Sem codificações: fica em JSON
+            self._escrever(destino, vizinho, ligacao, envio, envio.dados(False))
+            try:
+                await asyncio.wait_for(ligacao.fechada.wait(), TIMEOUT_RESPOSTA)
+            except asyncio.TimeoutError:
+                ligacao.fechar()
+
+    async def _abrir(self, destino, vizinho):
+        """ Nova ligação ao vizinho, contando a falha (e a espera até voltar a tentar) se não der. """
+        inicio = time.monotonic()
+        ligacao = await self._ligar(destino)
+        if ligacao is None:
+            vizinho.registar_falha()
+            vizinho.legado = None  # Quando voltar pode já ser outra versão
+            return None
+        vizinho.falhas = 0
+        vizinho.registar_latencia(time.monotonic() - inicio)
+        return ligacao
+
+    async def _ligar(self, destino):
+        """ Abre a ligação persistente a um vizinho (None se estiver offline). """
+        host, porta = destino
+        try:
+            _, ligacao = await asyncio.wait_for(
+                self.loop.create_connection(lambda: _Ligacao(self, destino), host, porta),
+                TIMEOUT_LIGACAO
+            )
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return ligacao
@@ -0,0 +1,71 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class LoteTransacoes:
+    """ Junta as transações que vão chegando e entrega-as em lotes a 'processar(lista)'.
+    Um lote sai quando atinge 'tamanho_maximo' ou 'intervalo' segundos depois da primeira
+    transação que o abriu, para a validação e o reenvio serem feitos em bloco e não uma a uma.
+    O processamento corre numa thread própria, fora do event loop da rede. Se a fila de espera
+    passar de 'max_pendentes' (ex: uma enxurrada de um vizinho), o que chega é descartado. """
+
+    def __init__(self, processar, intervalo=0.05, tamanho_maximo=500, max_pendentes=20_000, nome="lotes-transacoes"):
+        self.processar = processar
+        self.intervalo = intervalo
+        self.tamanho_maximo = tamanho_maximo
+        self.max_pendentes = max_pendentes
+        self.nome = nome  # Nome da thread (aparece nos traces)
+
+        self._pendentes = []
+        self._condicao = threading.Condition()
+        self._ativo = False
+        self._thread = None
+        self.lotes_processados = 0
+        self.descartadas = 0  # Itens recusados por a fila estar cheia
+
+    def __len__(self):
+        return len(self._pendentes)
+
+    def iniciar(self):
+        self._ativo = True
+        self._thread = threading.Thread(target=self._ciclo, name=self.nome, daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        with self._condicao:
+            self._ativo = False
+            self._condicao.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def adicionar(self, item, prioritario=False):
+        """ Põe o item na fila; devolve False se foi descartado por a fila estar cheia
+        (os prioritários, ex: as transações criadas aqui, entram sempre). """
+        with self._condicao:
+            if not prioritario and len(self._pendentes) >= self.max_pendentes:
+                self.descartadas += 1
+                return False
+            self._pendentes.append(item)
+            if len(self._pendentes) == 1 or len(self._pendentes) >= self.tamanho_maximo:
+                self._condicao.notify_all()
+            return True
+
+    def _ciclo(self):
+        while True:
+            with self._condicao:
+                self._condicao.wait_for(lambda: self._pendentes or not self._ativo)
+                if not self._ativo:
+                    return
+                # Dá tempo a que o lote encha, sem atrasar a primeira transação mais do que o intervalo
+                self._condicao.wait_for(lambda: len(self._pendentes) >= self.tamanho_maximo or not self._ativo,
+                                        self.intervalo)
+                lote = self._pendentes[:self.tamanho_maximo]
+                del self._pendentes[:self.tamanho_maximo]
+
+            try:
+                self.processar(lote)
+            except Exception as e:
+                log.exception("⚠️ Erro ao processar lote de transações: %s", e)
+            self.lotes_processados += 1
@@ -0,0 +1,147 @@
+from array import array
+from transaction import Transacao
+
+# Bits da coluna 'tipos': o valor / a data eram inteiros (o id depende do tipo, por isso guarda-se)
+_VALOR_INTEIRO = 1
+_DATA_INTEIRA = 2
+# A transação não cabe nas colunas (id que não é um hash, valor que não é número...): está em 'irregulares'
+_IRREGULAR = 4
+
+
+class TransacoesConfirmadas:
+    """ Índice opcional das transações confirmadas da corrente principal, guardado em colunas:
+    cada campo é um array contínuo (ids como 32 bytes, endereços como índice numa tabela de
+    endereços, valores e datas como double), em vez de um objeto por transação.
+    Ocupa cerca de 61 bytes por transação e permite procurar uma transação pelo id ou o histórico
+    de um endereço sem manter os blocos em memória. Só se acrescentam blocos no fim e só se
+    cortam a partir de uma altura, tal como a corrente. """
+
+    def __init__(self):
+        self.ids = bytearray()            # 32 bytes por transação
+        self.remetentes = array('I')      # Índice em self.enderecos
+        self.destinatarios = array('I')
+        self.valores = array('d')
+        self.datas = array('d')
+        self.tipos = array('B')
+        self.inicio_bloco = array('Q')    # altura -> posição da primeira transação desse bloco
+
+        self.enderecos = []               # índice -> endereço
+        self._indice_endereco = {}        # endereço -> índice
+        self.irregulares = {}             # posição -> Transacao guardada tal como veio
+
+    def __len__(self):
+        return len(self.valores)
+
+    @property
+    def altura(self):
+        """ Número de blocos indexados. """
+        return len(self.inicio_bloco)
+
+    def _endereco(self, endereco):
+        indice = self._indice_endereco.get(endereco)
+        if indice is None:
+            indice = self._indice_endereco[endereco] = len(self.enderecos)
+            self.enderecos.append(endereco)
+        return indice
+
+    def acrescentar_bloco(self, bloco):
+        """ Junta as transações do bloco seguinte da corrente. """
+        if bloco.indice != self.altura:
+            raise ValueError(f"Esperado o bloco {self.altura}, recebido o {bloco.indice}")
+        self.inicio_bloco.append(len(self))
+        for tx in bloco.transacoes:
+            id_binario = _id_binario(tx.id)
+            if (id_binario is None or not _e_numero(tx.quantia) or not _e_numero(tx.data_hora)
+                    or not isinstance(tx.remetente, str) or not isinstance(tx.destinatario, str)):
+                self.irregulares[len(self)] = tx
+                self.ids += bytes(32)
+                for coluna in (self.remetentes, self.destinatarios, self.valores, self.datas):
+                    coluna.append(0)
+                self.tipos.append(_IRREGULAR)
+                continue
+            self.ids += id_binario
+            self.remetentes.append(self._endereco(tx.remetente))
+            self.destinatarios.append(self._endereco(tx.destinatario))
+            self.valores.append(tx.quantia)
+            self.datas.append(tx.data_hora)
+            self.tipos.append((_VALOR_INTEIRO if type(tx.quantia) is int else 0)
+                              | (_DATA_INTEIRA if type(tx.data_hora) is int else 0))
+
+    def truncar(self, altura):
+        """ Esquece os blocos a partir de 'altura' (ex: desfeitos numa reorganização). """
+        if altura >= self.altura:
+            return
+        fim = self.inicio_bloco[altura]
+        del self.ids[32 * fim:]
+        for coluna in (self.remetentes, self.destinatarios, self.valores, self.datas, self.tipos):
+            del coluna[fim:]
+        del self.inicio_bloco[altura:]
+        for posicao in [p for p in self.irregulares if p >= fim]:
+            del self.irregulares[posicao]
+
+    def transacao(self, posicao):
+        """ Reconstrói a Transacao guardada na posição, com os tipos originais (o id continua a bater certo). """
+        tipos = self.tipos[posicao]
+        if tipos & _IRREGULAR:
+            return self.irregulares[posicao]
+        valor, data = self.valores[posicao], self.datas[posicao]
+        return Transacao(
+            self.enderecos[self.remetentes[posicao]],
+            self.enderecos[self.destinatarios[posicao]],
+            int(valor) if tipos & _VALOR_INTEIRO else valor,
+            data_hora=int(data) if tipos & _DATA_INTEIRA else data,
+            id_transacao=self.ids[32 * posicao:32 * posicao + 32].hex()
+        )
+
+    def altura_da_posicao(self, posicao):
+        """ Altura do bloco que contém a transação nessa posição (pesquisa binária nos inícios). """
+        baixo, alto = 0, self.altura - 1
+        while baixo < alto:
+            meio = (baixo + alto + 1) // 2
+            if self.inicio_bloco[meio] <= posicao:
+                baixo = meio
+            else:
+                alto = meio - 1
+        return baixo
+
+    def procurar(self, tx_id):
+        """ (altura do bloco, Transacao) da transação confirmada com este id, ou None. """
+        alvo = _id_binario(tx_id)
+        if alvo is None:
+            for posicao, tx in self.irregulares.items():
+                if tx.id == tx_id:
+                    return self.altura_da_posicao(posicao), tx
+            return None
+        inicio = self.ids.find(alvo)
+        while inicio != -1:
+            # Só conta se estiver alinhado com o início de um id (e não for o espaço de uma irregular)
+            if inicio % 32 == 0 and not self.tipos[inicio // 32] & _IRREGULAR:
+                posicao = inicio // 32
+                return self.altura_da_posicao(posicao), self.transacao(posicao)
+            inicio = self.ids.find(alvo, inicio + 1)
+        return None
+
+    def historico(self, endereco):
+        """ Transações confirmadas em que o endereço envia ou recebe, pela ordem da corrente. """
+        indice = self._indice_endereco.get(endereco)
+        posicoes = [] if indice is None else [
+            posicao for posicao, (de, para) in enumerate(zip(self.remetentes, self.destinatarios))
+            if (de == indice or para == indice) and posicao not in self.irregulares
+        ]
+        posicoes += [p for p, tx in self.irregulares.items() if endereco in (tx.remetente, tx.destinatario)]
+        return [self.transacao(posicao) for posicao in sorted(posicoes)]
+
+
+def _id_binario(tx_id):
+    """ Os 32 bytes de um id em hexadecimal minúsculo (o que o hexdigest produz), ou None. """
+    if not isinstance(tx_id, str) or len(tx_id) != 64:
+        return None
+    try:
+        binario = bytes.fromhex(tx_id)
+    except ValueError:
+        return None
+    return binario if binario.hex() == tx_id else None
+
+
+def _e_numero(valor):
+    return type(valor) is float or (type(valor) is int and -2 ** 53 <= valor <= 2 ** 53)